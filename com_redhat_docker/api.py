@@ -0,0 +1,368 @@
+#pylint: disable=missing-docstring
+'''
+Minimal Docker Engine API access over the daemon's Unix socket
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import http.client
+import json
+import socket
+from urllib.parse import quote, urlencode
+
+__all__ = ["DOCKER_SOCKET", "DockerAPIError", "UnixHTTPConnection", "PullProgress", "DockerClient",
+           "ping", "images", "load", "prune"]
+
+DOCKER_SOCKET = "/var/run/docker.sock"
+
+# Size of the reads used to send request bodies
+BLOCKSIZE = 1024 * 1024
+
+class DockerAPIError(Exception):
+    """ The daemon returned an error for a request """
+    def __init__(self, message, status=None):
+        """ :param str message: The error
+            :param int status: HTTP status of the reply, None for errors in a stream
+        """
+        Exception.__init__(self, message)
+        self.status = status
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """ HTTP connection to a server listening on a Unix socket """
+    def __init__(self, socket_path, timeout=None):
+        """ :param str socket_path: Path to the Unix socket
+            :param float timeout: Socket timeout in seconds, or None to block
+        """
+        http.client.HTTPConnection.__init__(self, "localhost", timeout=timeout, blocksize=BLOCKSIZE)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+def _split_image(image):
+    """ Return the name and the tag or digest of an image reference, for /images/create """
+    if "@" in image:
+        return image.split("@", 1)
+    # A ':' after the last '/' separates the tag, one before it is a registry port
+    if image.rfind(":") > image.rfind("/"):
+        return image.rsplit(":", 1)
+    return (image, "latest")
+
+class PullProgress(object):
+    """ Progress of a pull, decoded from the daemon's messages
+
+    The byte counts only cover the layers the daemon has reported so far,
+    layers that already exist are counted in existing instead.
+    """
+    def __init__(self, image):
+        """ :param str image: Image reference being pulled """
+        self.image = image
+        self.status = None
+        self.digest = None
+        self.existing = 0
+        self._layers = {}
+
+    def update(self, msg):
+        """ Update the progress from a pull message
+
+        :param dict msg: Decoded message, eg. {"status": "Downloading", "id": ..., "progressDetail": ...}
+        """
+        status = msg.get("status", "")
+        layer = msg.get("id")
+        detail = msg.get("progressDetail") or {}
+        if status.startswith("Digest: "):
+            self.digest = status[8:]
+        elif status == "Already exists":
+            self.existing += 1
+        elif layer and status == "Downloading" and "total" in detail:
+            self._layers[layer] = [detail.get("current", 0), detail["total"]]
+        elif layer and status in ("Download complete", "Pull complete") and layer in self._layers:
+            self._layers[layer][0] = self._layers[layer][1]
+        if not layer:
+            self.status = status
+
+    @property
+    def layers(self):
+        """ Number of layers downloaded or being downloaded """
+        return len(self._layers)
+
+    @property
+    def downloaded(self):
+        """ Bytes downloaded so far """
+        return sum(current for current, _total in self._layers.values())
+
+    @property
+    def total(self):
+        """ Bytes to download for the layers reported so far """
+        return sum(total for _current, total in self._layers.values())
+
+class DockerClient(object):
+    """ Engine API client keeping one connection to the daemon open
+
+    The connection is reused for every request and reopened if the daemon
+    closes it while it is idle. A client must only be used by one thread at a
+    time, give each worker its own.
+    """
+    def __init__(self, socket_path=None, timeout=None):
+        """ :param str socket_path: Path to the daemon's Unix socket, DOCKER_SOCKET by default
+            :param float timeout: Socket timeout in seconds, or None to block
+        """
+        self.socket_path = socket_path or DOCKER_SOCKET
+        self._conn = UnixHTTPConnection(self.socket_path, timeout=timeout)
+        self._used = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Close the connection """
+        self._conn.close()
+        self._used = False
+
+    def _request(self, method, path, body=None, headers=None):
+        """ Send a request and return the response
+
+        A request without a streamed body is sent again once if the daemon
+        closed the kept connection before it was sent.
+        """
+        retry = self._used and (body is None or isinstance(body, bytes))
+        while True:
+            try:
+                self._conn.request(method, path, body=body, headers=headers or {})
+                resp = self._conn.getresponse()
+            except (ConnectionError, http.client.BadStatusLine):
+                self._conn.close()
+                if not retry:
+                    raise
+                retry = False
+                continue
+            self._used = True
+            return resp
+
+    def _check(self, resp, ok=(200,)):
+        """ Raise DockerAPIError, with the daemon's message, unless the status is ok """
+        if resp.status not in ok:
+            body = resp.read().decode("utf-8", "replace").strip()
+            try:
+                message = json.loads(body).get("message", body)
+            except (ValueError, AttributeError):
+                message = body
+            raise DockerAPIError("%s %s: %s" % (resp.status, resp.reason, message), resp.status)
+
+    def _json(self, method, path, payload=None, ok=(200,)):
+        """ Make a request and return its decoded JSON reply, None if it is empty """
+        body = None
+        headers = {}
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        resp = self._request(method, path, body, headers)
+        self._check(resp, ok)
+        data = resp.read()
+        return json.loads(data.decode("utf-8")) if data else None
+
+    def _stream(self, resp, progress):
+        """ Pass each message of a streamed JSON reply to progress, raising on errors """
+        try:
+            for line in resp:
+                line = line.strip()
+                if not line:
+                    continue
+                msg = json.loads(line.decode("utf-8"))
+                if "error" in msg:
+                    raise DockerAPIError(msg["error"])
+                progress(msg)
+        finally:
+            # Whatever is left is read so that the connection can be reused
+            resp.read()
+
+    def ping(self):
+        """ Check whether the daemon answers
+
+        :returns: True if /_ping returned 200
+        :rtype: bool
+        """
+        try:
+            resp = self._request("GET", "/_ping")
+            resp.read()
+            return resp.status == 200
+        except (OSError, http.client.HTTPException):
+            self._conn.close()
+            return False
+
+    def images(self):
+        """ List the images in the daemon's storage
+
+        :returns: The daemon's image summaries, with their RepoTags and RepoDigests
+        :rtype: list of dict
+        :raises: DockerAPIError if the daemon returns an error
+        """
+        return self._json("GET", "/images/json")
+
+    def inspect_image(self, image):
+        """ Return the daemon's details of an image
+
+        :param str image: Image reference or ID
+        :rtype: dict
+        :raises: DockerAPIError, with status 404 if there is no such image
+        """
+        return self._json("GET", "/images/%s/json" % quote(image, safe="/:@"))
+
+    def pull(self, image, progress=None):
+        """ Pull an image from its registry
+
+        :param str image: Image reference, eg. fedora:25 or busybox@sha256:...
+        :param progress: Function called with the PullProgress after each message
+        :returns: The final progress of the pull
+        :rtype: PullProgress
+        :raises: DockerAPIError if the pull fails
+
+        A reference without a tag pulls the latest tag, not every tag.
+        """
+        (name, tag) = _split_image(image)
+        state = PullProgress(image)
+
+        def _update(msg):
+            state.update(msg)
+            if progress:
+                progress(state)
+
+        resp = self._request("POST", "/images/create?" + urlencode({"fromImage": name, "tag": tag}))
+        self._check(resp)
+        self._stream(resp, _update)
+        return state
+
+    def load(self, body, length=None, progress=None):
+        """ Load an image archive into the daemon
+
+        :param body: File object or iterable of bytes with the tar archive
+        :param int length: Size of the archive, or None to send it chunked
+        :param progress: Function called with each decoded message
+        :returns: The daemon's messages
+        :rtype: list of dict
+        :raises: DockerAPIError if the daemon rejects the archive
+
+        The archive is streamed to the daemon as it is read, it is never held in
+        memory or copied.
+        """
+        messages = []
+
+        def _update(msg):
+            messages.append(msg)
+            if progress:
+                progress(msg)
+
+        headers = {"Content-Type": "application/x-tar"}
+        if length is not None:
+            headers["Content-Length"] = str(length)
+        resp = self._request("POST", "/images/load?quiet=1", body, headers)
+        self._check(resp)
+        self._stream(resp, _update)
+        return messages
+
+    def create_container(self, config, name=None):
+        """ Create a container
+
+        :param dict config: Container configuration, eg. {"Image": "busybox", "Cmd": ["true"]}
+        :param str name: Name for the container
+        :returns: ID of the new container
+        :rtype: str
+        :raises: DockerAPIError if the daemon returns an error
+        """
+        path = "/containers/create"
+        if name:
+            path += "?" + urlencode({"name": name})
+        return self._json("POST", path, config, ok=(201,))["Id"]
+
+    def inspect_container(self, container):
+        """ Return the daemon's details of a container
+
+        :param str container: Container name or ID
+        :rtype: dict
+        :raises: DockerAPIError, with status 404 if there is no such container
+        """
+        return self._json("GET", "/containers/%s/json" % quote(container))
+
+    def start_container(self, container):
+        """ Start a container, it is not an error if it is already running
+
+        :param str container: Container name or ID
+        :raises: DockerAPIError if the daemon returns an error
+        """
+        self._json("POST", "/containers/%s/start" % quote(container), ok=(204, 304))
+
+    def stop_container(self, container, timeout=None):
+        """ Stop a container, it is not an error if it is already stopped
+
+        :param str container: Container name or ID
+        :param int timeout: Seconds to wait before killing it, the container's own default if None
+        :raises: DockerAPIError if the daemon returns an error
+        """
+        path = "/containers/%s/stop" % quote(container)
+        if timeout is not None:
+            path += "?t=%d" % timeout
+        self._json("POST", path, ok=(204, 304))
+
+    def prune(self, kind, filters=None):
+        """ Remove the unused objects of a kind
+
+        :param str kind: containers, images, volumes or build
+        :param dict filters: Prune filters, eg. {"dangling": ["false"]}
+        :returns: The daemon's reply, with SpaceReclaimed in bytes
+        :rtype: dict
+        :raises: DockerAPIError if the daemon returns an error
+        """
+        path = "/%s/prune" % kind
+        if filters:
+            path += "?filters=" + quote(json.dumps(filters))
+        return self._json("POST", path)
+
+def ping(socket_path=DOCKER_SOCKET, timeout=1.0):
+    """ Check whether the daemon answers on its API socket
+
+    :param str socket_path: Path to the daemon's Unix socket
+    :param float timeout: Seconds to wait for the answer
+    :returns: True if /_ping returned 200
+    :rtype: bool
+    """
+    with DockerClient(socket_path, timeout) as client:
+        return client.ping()
+
+def images(socket_path=DOCKER_SOCKET):
+    """ List the images in the daemon's storage, see DockerClient.images """
+    with DockerClient(socket_path) as client:
+        return client.images()
+
+def load(body, socket_path=DOCKER_SOCKET, length=None):
+    """ Load an image archive into the daemon, see DockerClient.load """
+    with DockerClient(socket_path) as client:
+        return client.load(body, length)
+
+def prune(kind, socket_path=DOCKER_SOCKET, filters=None):
+    """ Remove the unused objects of a kind, see DockerClient.prune """
+    with DockerClient(socket_path) as client:
+        return client.prune(kind, filters)
@@ -0,0 +1,215 @@
+#pylint: disable=missing-docstring
+'''
+Offline image seeding from image archives
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+import tarfile
+import time
+
+from com_redhat_docker import api
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["LoadResult", "find_archives", "loaded_images", "load_archives", "estimate_archive_size", "archive_bytes"]
+
+# docker load accepts uncompressed, gzip, bzip2 and xz compressed archives
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+# images are the tags, or IDs of untagged images, the archive held
+LoadResult = namedtuple("LoadResult", ["path", "ok", "size", "elapsed", "images"])
+
+# What docker and podman print for each image they load, podman lists
+# several images on one line
+LOADED_RE = re.compile(r"^Loaded image(?:\(s\)|s)?(?: ID)?: (.+)$", re.MULTILINE)
+
+# Compressed layers are counted as this many times their size once they are
+# unpacked into the storage driver. Typical image layers compress 2-3x.
+COMPRESSION_RATIO = 3
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+def find_archives(path, layouts=True):
+    """ Find the image archives in a directory
+
+    :param str path: Directory holding the archives
+    :param bool layouts: Include OCI image layout directories
+    :returns: Paths of the image archives and OCI image layout directories
+    :rtype: list of str
+
+    The docker daemons the addon starts cannot load OCI image layouts, only
+    podman can, so the docker backend passes layouts=False.
+    """
+    archives = []
+    for name in sorted(os.listdir(path)):
+        full = os.path.join(path, name)
+        if os.path.isdir(full):
+            if not os.path.exists(os.path.join(full, "oci-layout")):
+                log.debug("Skipping %s, it is not an OCI image layout", full)
+            elif layouts:
+                archives.append(full)
+            else:
+                log.error("Skipping OCI image layout %s, docker cannot load it, use --backend=podman", full)
+        elif name.endswith(ARCHIVE_SUFFIXES):
+            archives.append(full)
+        else:
+            log.debug("Skipping %s, it is not an image archive", full)
+    return archives
+
+def _unpacked_size(size, head):
+    """ Return the estimated unpacked size of a blob given its first bytes """
+    if head.startswith(GZIP_MAGIC):
+        return size * COMPRESSION_RATIO
+    return size
+
+def _estimate_layout(path):
+    size = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            full = os.path.join(root, name)
+            with open(full, "rb") as fp:
+                size += _unpacked_size(os.fstat(fp.fileno()).st_size, fp.read(2))
+    return size
+
+def _estimate_tar(path):
+    size = 0
+    with tarfile.open(path, "r:") as tar:
+        for member in tar:
+            if member.isfile():
+                size += _unpacked_size(member.size, tar.extractfile(member).read(2))
+    return size
+
+def estimate_archive_size(path):
+    """ Estimate the space an image archive takes once it is loaded
+
+    :param str path: Path of an archive or OCI image layout directory
+    :returns: Estimated size in bytes
+    :rtype: int
+
+    Uncompressed archives and layouts are walked without reading the layer
+    data, gzip compressed blobs in them are counted at COMPRESSION_RATIO times
+    their size. Compressed archives are counted the same way as a whole.
+    """
+    if os.path.isdir(path):
+        return _estimate_layout(path)
+    if path.endswith(".tar"):
+        return _estimate_tar(path)
+    return os.path.getsize(path) * COMPRESSION_RATIO
+
+class _CountingReader(object):
+    """ File object wrapper counting the bytes read through it """
+    def __init__(self, fp, progress=None):
+        """ :param fp: File object to read
+            :param progress: Function called with the count after each read
+        """
+        self.fp = fp
+        self.count = 0
+        self.progress = progress
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        self.count += len(data)
+        if self.progress:
+            self.progress(self.count)
+        return data
+
+def loaded_images(output):
+    """ Return the images a load reported
+
+    :param str output: The output of docker or podman load
+    :returns: Tags, or IDs of untagged images
+    :rtype: list of str
+    """
+    return [i.strip() for line in LOADED_RE.findall(output) for i in line.split(",") if i.strip()]
+
+def _load_file(path, size, socket_path, progress):
+    """ Stream an archive file to the daemon, returning the images it loaded """
+    with open(path, "rb") as fp:
+        messages = api.load(_CountingReader(fp, progress), socket_path, length=size)
+    return loaded_images("".join(m.get("stream", "") for m in messages))
+
+def archive_bytes(path):
+    """ Return the bytes podman reads for an archive or OCI image layout
+
+    :param str path: Path of the archive or layout directory
+    :rtype: int
+
+    For a layout this is the size of its files, without the tar headers.
+    """
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(d, f)) for d, _dirs, files in os.walk(path) for f in files)
+    return os.path.getsize(path)
+
+def _load_one(path, socket_path, reporter):
+    """ Load an archive into the daemon
+
+    The result has the archive's size whether it loaded or not, so a failed
+    load still counts the bytes that were attempted.
+    """
+    start = time.monotonic()
+    size = 0
+    try:
+        size = os.path.getsize(path)
+        progress = (lambda count: reporter.read(path, count, size)) if reporter else None
+        images = _load_file(path, size, socket_path, progress)
+    except (OSError, api.DockerAPIError) as e:
+        result = LoadResult(path, False, size, time.monotonic() - start, [])
+        log.error("Loading %s failed after %.2fs: %s", path, result.elapsed, e)
+    else:
+        result = LoadResult(path, True, size, time.monotonic() - start, images)
+        log.info("Loaded %s: %s, %d bytes in %.2fs (%.1f MiB/s)", path, ", ".join(images) or "no images",
+                 size, result.elapsed, size / max(result.elapsed, 1e-6) / 1024**2)
+    if reporter:
+        reporter.done(path)
+    return result
+
+def load_archives(path, workers, socket_path=api.DOCKER_SOCKET, reporter=None):
+    """ Load all of the image archives in a directory into the daemon
+
+    :param str path: Directory holding the archives
+    :param int workers: Maximum number of archives to load at the same time
+    :param str socket_path: Path to the daemon's Unix socket
+    :param reporter: ProgressReporter for the loads, or None
+    :returns: One result per archive
+    :rtype: list of LoadResult
+
+    Each archive is streamed from its source straight to the daemon's API, so
+    nothing is staged in the installer's /tmp. OCI image layouts are skipped.
+    """
+    try:
+        archives = find_archives(path, layouts=False)
+    except OSError as e:
+        log.error("Cannot read image archive directory %s: %s", path, e)
+        return []
+    if not archives:
+        log.warning("No image archives found in %s", path)
+        return []
+
+    log.info("Loading %d image archives from %s with %d workers", len(archives), path, workers)
+    if reporter:
+        reporter.count = len(archives)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(lambda a: _load_one(a, socket_path, reporter), archives))
+    if reporter:
+        reporter.finish()
+    return results
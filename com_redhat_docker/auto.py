@@ -0,0 +1,124 @@
+#pylint: disable=missing-docstring
+'''
+Storage driver selection for --auto
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from collections import OrderedDict, namedtuple
+
+from blivet.devices import BTRFSDevice, BTRFSVolumeDevice
+from pykickstart.errors import KickstartParseError, formatErrorMsg
+
+from com_redhat_docker.i18n import _
+from com_redhat_docker.ks.docker import LVMStorage, OverlayStorage, Overlay2Storage, BTRFSStorage
+from com_redhat_docker.ks.docker import docker_root_device, xfs_ftype
+from com_redhat_docker.probe import probe_filesystem, probe_pool
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["AUTO_STORAGE", "Candidate", "storage_candidates", "choose_storage"]
+
+# Storage classes --auto chooses from, most preferred first. A docker-pool
+# is only there if it was made for docker, docker itself picks btrfs when it
+# is on btrfs, and overlay2 is better than overlay on the same filesystem.
+AUTO_STORAGE = [LVMStorage, BTRFSStorage, Overlay2Storage, OverlayStorage]
+
+# A storage class --auto could use, the device it would be on, and the VG
+# for devicemapper
+Candidate = namedtuple("Candidate", ["storage_class", "device", "vgname"])
+
+def storage_candidates(storage, root, backend="docker"):
+    """ Return the storage classes the layout supports, most preferred first
+
+    :param storage: Blivet storage object
+    :param str root: The image store, eg. /var/lib/docker
+    :param str backend: docker or podman, podman has no devicemapper
+    :rtype: list of Candidate
+    """
+    found = []
+    if backend == "docker":
+        for vg in storage.vgs:
+            pool = next((lv for lv in storage.lvs if lv.name == vg.name+"-docker-pool"), None)
+            if pool is not None:
+                found.append(Candidate(LVMStorage, pool, vg.name))
+                break
+
+    (_path, device) = docker_root_device(storage, root)
+    if device is not None:
+        fmt = device.format
+        if isinstance(device, BTRFSDevice):
+            found.append(Candidate(BTRFSStorage, device, None))
+        elif fmt.type == "ext4" or (fmt.type == "xfs" and not (fmt.exists and xfs_ftype(device) == "0")):
+            found.append(Candidate(Overlay2Storage, device, None))
+            found.append(Candidate(OverlayStorage, device, None))
+    return sorted(found, key=lambda c: AUTO_STORAGE.index(c.storage_class))
+
+def _probe(candidate, fstype):
+    """ Probe a candidate's existing storage, None if it doesn't exist yet or failed """
+    if candidate.storage_class is LVMStorage:
+        return probe_pool(candidate.vgname, fstype) if candidate.device.exists else None
+    device = candidate.device
+    if isinstance(device, BTRFSDevice) and not isinstance(device, BTRFSVolumeDevice):
+        device = device.volume
+    return probe_filesystem(device.path, device.format.type) if device.format.exists else None
+
+def choose_storage(storage, root, backend, fstype, probe=False):
+    """ Choose the storage class for --auto
+
+    :param storage: Blivet storage object
+    :param str root: The image store, eg. /var/lib/docker
+    :param str backend: docker or podman
+    :param str fstype: Filesystem docker puts on devicemapper thin devices
+    :param bool probe: Probe the candidates' existing storage
+    :returns: (Candidate, OrderedDict of bytes per second for each probed driver)
+    :raises: KickstartParseError if the layout supports none of them
+
+    The first candidate from storage_candidates is used. With probe the
+    candidates' existing storage is probed first and the fastest one that
+    could be measured is used instead, ties going to the preferred one.
+    Storage that is going to be created can't be probed, so when nothing
+    could be measured the preference order decides.
+    """
+    found = storage_candidates(storage, root, backend)
+    if not found:
+        raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker --auto found no storage for %s")) % root)
+    log.info("com_redhat_docker --auto candidates: %s",
+             ", ".join("%s on %s" % (c.storage_class.driver, c.device.name) for c in found))
+
+    rates = OrderedDict()
+    if not probe:
+        return (found[0], rates)
+
+    results = OrderedDict()
+    for c in found:
+        if c.device.name in results:
+            continue
+        result = _probe(c, fstype)
+        if result is None:
+            log.info("com_redhat_docker --auto could not probe %s", c.device.name)
+        else:
+            log.info("com_redhat_docker --auto probed %s: %d bytes in %.2fs, %d bytes/s",
+                     c.device.name, result.written, result.elapsed, result.rate)
+        results[c.device.name] = result
+    measured = [c for c in found if results[c.device.name]]
+    for c in measured:
+        rates[c.storage_class.driver] = int(results[c.device.name].rate)
+    if not measured:
+        return (found[0], rates)
+    return (max(measured, key=lambda c: results[c.device.name].rate), rates)
@@ -0,0 +1,82 @@
+#pylint: disable=missing-docstring
+'''
+Removal of unused docker objects after the addon script
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from collections import OrderedDict
+import re
+
+from com_redhat_docker import api
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["COMPACT_POLICIES", "compact", "fstrim"]
+
+# The --compact policies and the prune request for each, in the order they
+# are run. Containers go first so the images and volumes they used are freed.
+COMPACT_POLICIES = OrderedDict([("containers", ("containers", None)),
+                                ("dangling-images", ("images", {"dangling": ["true"]})),
+                                ("unused-images", ("images", {"dangling": ["false"]})),
+                                ("volumes", ("volumes", None)),
+                                ("build-cache", ("build", None))])
+
+def compact(policies, socket_path=api.DOCKER_SOCKET):
+    """ Remove the unused objects selected by the policies
+
+    :param list policies: Names from COMPACT_POLICIES
+    :param str socket_path: Path to the daemon's Unix socket
+    :returns: Total bytes reclaimed
+    :rtype: int
+
+    A failed prune is logged and the rest are still run.
+    """
+    total = 0
+    for name, (kind, filters) in COMPACT_POLICIES.items():
+        if name not in policies:
+            continue
+        try:
+            reply = api.prune(kind, socket_path, filters)
+        except (OSError, api.DockerAPIError) as e:
+            log.error("Pruning %s failed: %s", name, e)
+            continue
+        reclaimed = reply.get("SpaceReclaimed") or 0
+        deleted = sum(len(v or []) for k, v in reply.items() if k.endswith("Deleted"))
+        log.info("Pruned %s: %d removed, %d bytes reclaimed", name, deleted, reclaimed)
+        total += reclaimed
+    return total
+
+# fstrim -v reports "<mountpoint>: <human size> (<bytes> bytes) trimmed"
+FSTRIM_RE = re.compile(r"\((\d+) bytes\) trimmed")
+
+def fstrim(path):
+    """ Discard the unused blocks of the filesystem holding path
+
+    :param str path: Path on the filesystem
+    :returns: Bytes trimmed, or None if fstrim failed or didn't say
+    """
+    from pyanaconda.iutil import execWithCapture
+
+    output = execWithCapture("fstrim", ["-v", path]) or ""
+    match = FSTRIM_RE.search(output)
+    if not match:
+        log.info("fstrim of %s: %s", path, output.strip())
+        return None
+    log.info("fstrim discarded %s bytes on the filesystem holding %s", match.group(1), path)
+    return int(match.group(1))
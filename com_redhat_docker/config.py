@@ -0,0 +1,83 @@
+#pylint: disable=missing-docstring
+'''
+docker daemon.json handling
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from collections import OrderedDict
+import json
+import os
+import tempfile
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["DAEMON_JSON", "merge_daemon_json"]
+
+DAEMON_JSON = "/etc/docker/daemon.json"
+
+def _read(path):
+    """ Return the settings in a daemon.json, or an empty dict if there are none """
+    try:
+        with open(path) as fp:
+            settings = json.load(fp, object_pairs_hook=OrderedDict)
+    except FileNotFoundError:
+        return OrderedDict()
+    except ValueError as e:
+        log.error("Replacing %s, it is not valid JSON: %s", path, e)
+        return OrderedDict()
+    if not isinstance(settings, dict):
+        log.error("Replacing %s, it is not a JSON object", path)
+        return OrderedDict()
+    return settings
+
+def merge_daemon_json(path, settings):
+    """ Merge settings into a daemon.json, replacing it atomically
+
+    :param str path: Path of the daemon.json
+    :param dict settings: Settings to add or replace
+    :returns: The merged settings
+    :rtype: OrderedDict
+
+    Dict values, such as log-opts, are merged with the existing ones. The new
+    file is written next to the old one and renamed over it, so the daemon
+    never sees a partial file.
+    """
+    merged = _read(path)
+    for key, value in settings.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key].update(value)
+        else:
+            merged[key] = value
+
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok=True)
+    (fd, tmp) = tempfile.mkstemp(".tmp", ".daemon.json-", dirname)
+    try:
+        with os.fdopen(fd, "w") as fp:
+            json.dump(merged, fp, indent=4)
+            fp.write("\n")
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    log.info("Wrote %s: %s", path, json.dumps(merged, sort_keys=True))
+    return merged
@@ -0,0 +1,180 @@
+#pylint: disable=missing-docstring
+'''
+Install-time docker daemon lifecycle
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import subprocess
+import time
+
+from pyanaconda.iutil import execWithRedirect, getSysroot
+from pyanaconda.iutil import startProgram
+
+from com_redhat_docker import api
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["BindMounts", "DockerDaemon", "BIND_MOUNTS"]
+
+# Target directories bind mounted into the installer environment, in mount order
+BIND_MOUNTS = ["/var/lib/docker", "/etc/docker"]
+
+# Readiness polling starts at READY_POLL_MIN seconds and doubles up to READY_POLL_MAX
+READY_POLL_MIN = 0.05
+READY_POLL_MAX = 1.0
+READY_TIMEOUT = 60
+
+# Seconds to wait for the daemon to exit after SIGTERM before killing it. The
+# daemon unmounts its layers and syncs the thin-pool/btrfs metadata on the way out.
+STOP_TIMEOUT = 60
+
+class BindMounts(object):
+    """ Bind mounts of target directories over the installer's """
+    def __init__(self, paths):
+        """ :param list paths: Directories to mount, in mount order """
+        self.paths = paths
+        self._mounted = []
+
+    def mount(self):
+        """ Bind mount the target's directories over the installer's
+
+        The target's directories are created if the package that owns them
+        hasn't been installed yet.
+        """
+        for path in self.paths:
+            os.makedirs(getSysroot()+path, exist_ok=True)
+            rc = execWithRedirect("mount", ["-o", "bind", getSysroot()+path, path])
+            if rc == 0:
+                self._mounted.append(path)
+            else:
+                log.error("Failed to bind mount %s%s on %s", getSysroot(), path, path)
+
+    def umount(self):
+        """ Remove the bind mounts made by mount, in reverse order """
+        while self._mounted:
+            path = self._mounted.pop()
+            if execWithRedirect("umount", [path]) != 0:
+                log.error("Failed to unmount %s", path)
+
+class DockerDaemon(object):
+    """ Bind mounts the target's docker directories and runs the docker daemon
+
+    The daemon is only handed to the script once its API socket answers, and it
+    is stopped with SIGTERM so that it can flush its storage metadata before the
+    bind mounts are removed.
+    """
+    def __init__(self, cmd, logfile, socket_path=None,
+                 ready_timeout=READY_TIMEOUT, stop_timeout=STOP_TIMEOUT):
+        """ :param list cmd: docker daemon command and arguments
+            :param logfile: Path to write the daemon's output to, or a file object
+                            with a fileno such as a logs.LogPipe
+            :param str socket_path: Path to the daemon's API socket, api.DOCKER_SOCKET by default
+            :param float ready_timeout: Seconds to wait for the daemon to answer
+            :param float stop_timeout: Seconds to wait for the daemon to exit
+        """
+        self.cmd = cmd
+        self.logfile = logfile
+        self.socket_path = socket_path or api.DOCKER_SOCKET
+        self.ready_timeout = ready_timeout
+        self.stop_timeout = stop_timeout
+        self.startup_time = None
+        self._proc = None
+        self._log_fp = None
+        self._mounts = BindMounts(BIND_MOUNTS)
+
+    @property
+    def pid(self):
+        """ Process ID of the daemon, None if it has not been started """
+        return self._proc.pid if self._proc is not None else None
+
+    @property
+    def running(self):
+        """ True if the daemon process has been started and has not exited """
+        return self._proc is not None and self._proc.poll() is None
+
+    def mount(self):
+        """ Bind mount the target's docker directories over the installer's """
+        self._mounts.mount()
+
+    def umount(self):
+        """ Remove the bind mounts made by mount, in reverse order """
+        self._mounts.umount()
+
+    def start(self):
+        """ Start the daemon and wait until it answers on its API socket
+
+        :returns: True if the daemon is ready
+        :rtype: bool
+
+        The time from starting the process to the first successful ping is
+        stored in startup_time.
+        """
+        log.debug("Starting docker daemon: %s", " ".join(self.cmd))
+        start = time.monotonic()
+        if isinstance(self.logfile, str):
+            self._log_fp = open(self.logfile, "w")
+            stdout = self._log_fp
+        else:
+            stdout = self.logfile
+        self._proc = startProgram(self.cmd, stdout=stdout, reset_lang=True)
+
+        delay = READY_POLL_MIN
+        deadline = start + self.ready_timeout
+        with api.DockerClient(self.socket_path, timeout=1.0) as client:
+            while True:
+                if client.ping():
+                    self.startup_time = time.monotonic() - start
+                    log.info("docker daemon ready after %.2fs", self.startup_time)
+                    return True
+
+                if self._proc.poll() is not None:
+                    log.error("docker daemon exited with status %s before it was ready, see %s",
+                              self._proc.returncode, getattr(self.logfile, "name", self.logfile))
+                    return False
+
+                now = time.monotonic()
+                if now >= deadline:
+                    log.error("docker daemon did not answer on %s within %ss",
+                              self.socket_path, self.ready_timeout)
+                    return False
+
+                time.sleep(min(delay, deadline - now))
+                delay = min(delay * 2, READY_POLL_MAX)
+
+    def stop(self):
+        """ Stop the daemon with SIGTERM, killing it only if it does not exit in time """
+        if self._proc is None:
+            return
+
+        if self._proc.poll() is None:
+            log.debug("Shutting down docker daemon")
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=self.stop_timeout)
+            except subprocess.TimeoutExpired:
+                log.error("docker daemon did not exit within %ss, killing it", self.stop_timeout)
+                self._proc.kill()
+                self._proc.wait()
+
+        log.debug("docker daemon exited with status %s", self._proc.returncode)
+        self._proc = None
+        if self._log_fp:
+            self._log_fp.close()
+            self._log_fp = None
@@ -0,0 +1,102 @@
+#pylint: disable=missing-docstring
+'''
+Image pre-population while the payload is being installed
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import shutil
+import threading
+import time
+
+from pyanaconda.iutil import execWithRedirect, getSysroot
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["EarlyStart"]
+
+# Seconds between checks for the target's storage and docker binary
+POLL_INTERVAL = 1.0
+
+class EarlyStart(object):
+    """ Run a function in a thread as soon as docker can run against the target
+
+    The thread waits until the filesystem holding the target's /var/lib/docker
+    is mounted and a docker binary is available, either the installer's own
+    or the one installed on the target, and then calls the function with the
+    path of the binary.
+    """
+    def __init__(self, mountpoint, func, poll=None):
+        """ :param str mountpoint: Target mountpoint of the filesystem holding /var/lib/docker
+            :param func: Function to call with the path of the docker binary
+            :param float poll: Seconds between checks, POLL_INTERVAL by default
+        """
+        self.mountpoint = mountpoint
+        self.func = func
+        self.poll = poll or POLL_INTERVAL
+        self.started = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Start waiting in the background """
+        log.info("Starting docker as soon as %s is mounted on the target", self.mountpoint)
+        self._thread = threading.Thread(target=self._run, name="docker-early-start", daemon=True)
+        self._thread.start()
+
+    def _docker(self):
+        """ Return the path of a docker binary to run, or None if there isn't one yet """
+        if execWithRedirect("mountpoint", ["-q", os.path.normpath(getSysroot()+self.mountpoint)]) != 0:
+            return None
+        docker = shutil.which("docker")
+        if docker:
+            return docker
+        docker = getSysroot()+"/usr/bin/docker"
+        if os.access(docker, os.X_OK):
+            return docker
+        return None
+
+    def _run(self):
+        wait_start = time.monotonic()
+        while not self._cancel.is_set():
+            docker = self._docker()
+            if docker:
+                break
+            self._cancel.wait(self.poll)
+        else:
+            return
+
+        self.started = time.monotonic()
+        log.info("Target storage ready after %.2fs, starting %s early", self.started - wait_start, docker)
+        try:
+            self.func(docker)
+        except Exception as e:  # pylint: disable=broad-except
+            log.exception("Early docker start failed")
+            self.error = e
+
+    def finish(self):
+        """ Stop waiting and wait for the function to return
+
+        :returns: True if the function was run
+        :rtype: bool
+        """
+        self._cancel.set()
+        self._thread.join()
+        return self.started is not None
@@ -0,0 +1,552 @@
+#pylint: disable=missing-docstring
+'''
+Parsing and validation of the addon's kickstart header
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+# anaconda imports ks/docker.py at startup whether the kickstart uses the
+# addon or not, the header is only parsed when it does, so the option parser
+# and everything it checks the options against live here.
+from collections import OrderedDict
+import re
+
+from blivet.formats import get_format
+from blivet.size import Size
+from pykickstart.options import KSOptionParser
+from pykickstart.errors import KickstartParseError, formatErrorMsg
+
+from com_redhat_docker.compact import COMPACT_POLICIES
+from com_redhat_docker.i18n import _
+from com_redhat_docker.ks.docker import LVMStorage, OverlayStorage, Overlay2Storage, BTRFSStorage
+from com_redhat_docker.ks.docker import BACKEND_ROOTS, DEFAULT_PARALLEL_LOADS, DEFAULT_PARALLEL_PULLS
+from com_redhat_docker.ks.docker import POOL_METADATA_MAX, POOL_METADATA_MIN
+from com_redhat_docker.sched import IONICE_CLASSES
+from com_redhat_docker.snapshot import SNAPSHOT_DRIVERS
+from com_redhat_docker.timing import PhaseTimer
+
+__all__ = ["handle_header"]
+
+# Smallest --log-cap, so a rotated log still holds a useful amount of output
+LOG_CAP_MIN = 1024**2
+
+# Chunk sizes LVM accepts for a thin-pool
+POOL_CHUNK_MIN = 64 * 1024
+POOL_CHUNK_MAX = 1024**3
+
+# Sizes as accepted by docker's storage options, eg. 10G or 512MB
+DOCKER_SIZE_RE = re.compile(r"^[0-9]+(\.[0-9]+)?[kKmMgGtT]?[bB]?$")
+
+# btrfs compress= values, with the levels the kernel accepts
+BTRFS_COMPRESS_RE = re.compile(r"^(no|lzo|zlib(:[1-9])?|zstd(:([1-9]|1[0-5]))?)$")
+
+# daemon.json settings managed by the addon, and the daemon flags that conflict with them
+DAEMON_JSON_FLAGS = OrderedDict([("max-concurrent-downloads", ["--max-concurrent-downloads"]),
+                                 ("max-concurrent-uploads", ["--max-concurrent-uploads"]),
+                                 ("log-driver", ["--log-driver"]),
+                                 ("log-opts", ["--log-opt"]),
+                                 ("live-restore", ["--live-restore"]),
+                                 ("shutdown-timeout", ["--shutdown-timeout"]),
+                                 ("registry-mirrors", ["--registry-mirror"]),
+                                 ("insecure-registries", ["--insecure-registry"])])
+
+# --registry-mirror URLs and --insecure-registry host[:port] or CIDR values
+MIRROR_URL_RE = re.compile(r"^https?://[A-Za-z0-9.-]+(:[0-9]+)?/?$")
+INSECURE_REGISTRY_RE = re.compile(r"^[A-Za-z0-9.-]+(:[0-9]+|/[0-9]+)?$")
+
+# --cpu-quota values, a percentage of one CPU
+CPU_QUOTA_RE = re.compile(r"^[1-9][0-9]*%$")
+
+def handle_header(addon, lineno, args):
+    """ Parse the kickstart addon header and set the addon's options
+
+    :param addon: The DockerData the header belongs to
+    :param lineno: Line number
+    :param args: arguments from %addon line
+    :raises: KickstartParseError if an option is invalid
+    """
+    op = KSOptionParser()
+    op.add_option("--vgname",
+                  help="Name of the VG that contains a thinpool named docker-pool")
+    op.add_option("--fstype", default=addon.fstype,
+                  help="Type of filesystem for docker to use with the docker-pool")
+    op.add_option("--overlay", action="store_true",
+                  help="Use the overlay driver")
+    op.add_option("--overlay2", action="store_true",
+                  help="Use the overlay2 driver")
+    op.add_option("--overlay2-size",
+                  help="Maximum size of a container's writable layer with overlay2, eg. 10G")
+    op.add_option("--btrfs", action="store_true",
+                  help="Use the BTRFS driver")
+    op.add_option("--auto", action="store_true", default=False,
+                  help="Choose the driver from the installation's storage layout")
+    op.add_option("--auto-probe", action="store_true", default=False,
+                  help="Measure the throughput of the existing storage to choose the driver, requires --auto")
+    op.add_option("--btrfs-subvol", action="store_true", default=False,
+                  help="Create a subvolume for /var/lib/docker if it doesn't have one")
+    op.add_option("--btrfs-compress",
+                  help="Compression of the BTRFS volume holding /var/lib/docker, eg. lzo, zlib:3 or zstd:1")
+    op.add_option("--btrfs-noatime", action="store_true", default=False,
+                  help="Mount /var/lib/docker with noatime")
+    op.add_option("--btrfs-space-cache-v2", action="store_true", default=False,
+                  help="Mount the BTRFS volume holding /var/lib/docker with space_cache=v2")
+    op.add_option("--btrfs-nodatacow", action="store_true", default=False,
+                  help="Turn off copy-on-write for /var/lib/docker with chattr +C")
+    op.add_option("--backend", choices=list(BACKEND_ROOTS), default=addon.backend,
+                  help="Populate the target with the docker daemon or with podman, one of %s" % ", ".join(BACKEND_ROOTS))
+    op.add_option("--save-args", action="store_true", default=False,
+                  help="Save all extra args to the OPTIONS variable in /etc/sysconfig/docker")
+    op.add_option("--pull", action="append", default=[],
+                  help="Image(s) to pull before running the commands, may be comma separated or repeated")
+    op.add_option("--image-size", action="append", default=[],
+                  help="Size of a pulled image once it is unpacked, eg. fedora:25=250MiB, may be repeated")
+    op.add_option("--parallel-pulls", type="int", default=DEFAULT_PARALLEL_PULLS,
+                  help="Maximum number of images to pull at the same time")
+    op.add_option("--load-dir",
+                  help="Directory of docker save archives or OCI image layouts to load")
+    op.add_option("--parallel-loads", type="int", default=DEFAULT_PARALLEL_LOADS,
+                  help="Maximum number of image archives to load at the same time")
+    op.add_option("--trace-commands", action="store_true", default=False,
+                  help="Time each command of the section and report the slowest ones")
+    op.add_option("--early-start", action="store_true", default=False,
+                  help="Load and pull the images while the packages are being installed")
+    op.add_option("--reuse", action="store_true", default=False,
+                  help="Keep the images already in a preserved /var/lib/docker, only pull the missing ones")
+    op.add_option("--max-concurrent-downloads", type="int",
+                  help="Maximum number of layers the daemon downloads at the same time")
+    op.add_option("--max-concurrent-uploads", type="int",
+                  help="Maximum number of layers the daemon uploads at the same time")
+    op.add_option("--container-log-max-size",
+                  help="Size of a container's json-file log before it is rotated, eg. 10m")
+    op.add_option("--container-log-max-file", type="int",
+                  help="Number of json-file logs kept for each container")
+    op.add_option("--live-restore", action="store_true", default=False,
+                  help="Keep containers running while the daemon is restarted")
+    op.add_option("--shutdown-timeout", type="int",
+                  help="Seconds the daemon waits for containers to stop when it shuts down")
+    op.add_option("--registry-mirror", action="append", default=[],
+                  help="Registry mirror URL for Docker Hub images, may be repeated")
+    op.add_option("--insecure-registry", action="append", default=[],
+                  help="Registry host[:port] or CIDR to use without TLS verification, may be repeated")
+    op.add_option("--persist-mirrors", action="store_true", default=False,
+                  help="Keep the registry mirrors and insecure registries on the installed system")
+    op.add_option("--compact",
+                  help="Comma separated unused docker objects to remove after the commands, "
+                       "from %s" % ", ".join(COMPACT_POLICIES))
+    op.add_option("--snapshot-capture",
+                  help="Directory to save a snapshot of the populated /var/lib/docker to")
+    op.add_option("--snapshot-restore",
+                  help="Snapshot to restore /var/lib/docker from, instead of running the commands")
+    op.add_option("--nice", type="int",
+                  help="Niceness of the docker daemon and commands, -20 to 19")
+    op.add_option("--ionice-class", choices=IONICE_CLASSES,
+                  help="I/O scheduling class of the docker daemon and commands, one of %s" % ", ".join(IONICE_CLASSES))
+    op.add_option("--ionice-level", type="int",
+                  help="I/O priority of the docker daemon and commands within their class, 0 to 7")
+    op.add_option("--cpu-weight", type="int",
+                  help="CPU weight of the docker daemon's cgroup, 1 to 10000")
+    op.add_option("--io-weight", type="int",
+                  help="I/O weight of the docker daemon's cgroup, 1 to 10000")
+    op.add_option("--cpu-quota",
+                  help="CPU time limit of the docker daemon's cgroup, eg. 200% for two CPUs")
+    op.add_option("--log-cap",
+                  help="Size of the daemon and script logs before they are rotated, eg. 64MiB")
+    op.add_option("--log-rotate", type="int",
+                  help="Number of rotated daemon and script logs to keep")
+    op.add_option("--log-compress", action="store_true", default=False,
+                  help="gzip the daemon and script logs as they are written")
+    op.add_option("--metrics-file",
+                  help="Path of the Prometheus textfile with the addon's metrics on the target, "
+                       "in node_exporter's textfile collector directory")
+    op.add_option("--create-pool", action="store_true", default=False,
+                  help="Create the docker-pool thinpool if it is missing, resize it with --pool-size")
+    op.add_option("--pool-size", type="int",
+                  help="Size of the docker-pool as a percentage of the VG's free space")
+    op.add_option("--pool-chunk-size",
+                  help="Chunk size of a docker-pool created by the addon")
+    op.add_option("--pool-metadata-size",
+                  help="Metadata size of a docker-pool created by the addon")
+    op.add_option("--pool-zero", choices=["y", "n"],
+                  help="Zero the docker-pool's newly provisioned blocks")
+    op.add_option("--pool-autoextend-threshold", type="int",
+                  help="Percentage of docker-pool use that triggers an autoextend")
+    op.add_option("--pool-autoextend-percent", type="int",
+                  help="Percentage to grow the docker-pool by when it is autoextended")
+    op.add_option("--dm-deferred-removal", action="store_true", default=False,
+                  help="Use deferred removal of devicemapper devices")
+    op.add_option("--dm-deferred-deletion", action="store_true", default=False,
+                  help="Use deferred deletion of devicemapper thin devices, requires --dm-deferred-removal")
+    op.add_option("--dm-blkdiscard", choices=["true", "false"],
+                  help="Discard the blocks of devicemapper devices when they are removed")
+    op.add_option("--dm-basesize",
+                  help="Size of the devicemapper base device, eg. 20G")
+    op.add_option("--dm-mountopt",
+                  help="Mount options for the devicemapper devices, eg. nodiscard")
+    op.add_option("--dm-min-free-space",
+                  help="Minimum free space in the pool for new devices, eg. 10%")
+    (opts, extra) = op.parse_args(args=args, lineno=lineno)
+
+    if sum(1 for v in [opts.overlay, opts.overlay2, opts.btrfs, opts.vgname, opts.auto] if bool(v)) != 1:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker must choose one of --overlay, --overlay2, --btrfs, --vgname, or --auto")))
+    if opts.auto_probe and not opts.auto:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --auto-probe requires --auto")))
+
+    if opts.parallel_pulls < 1:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --parallel-pulls must be at least 1")))
+    if opts.parallel_loads < 1:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --parallel-loads must be at least 1")))
+
+    if opts.log_cap is not None:
+        try:
+            cap = Size(opts.log_cap)
+        except ValueError:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --log-cap of %s is invalid")) % opts.log_cap)
+        if cap < LOG_CAP_MIN:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --log-cap must be at least 1MiB")))
+    compact_policies = [p for p in (opts.compact or "").split(",") if p]
+    for policy in compact_policies:
+        if policy not in COMPACT_POLICIES:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --compact policy %s is invalid")) % policy)
+    if opts.compact is not None and not compact_policies:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --compact needs at least one policy")))
+    if opts.log_rotate is not None and opts.log_rotate < 0:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --log-rotate cannot be negative")))
+    if opts.metrics_file is not None and not (opts.metrics_file.startswith("/") and opts.metrics_file.endswith(".prom")):
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --metrics-file must be an absolute path ending in .prom")))
+
+    _handle_daemon_options(addon, lineno, opts, extra)
+    _handle_sched_options(addon, lineno, opts)
+    _handle_snapshot_options(addon, lineno, opts)
+    _handle_backend_options(addon, lineno, opts, extra)
+
+    addon.enabled = True
+    addon.timer = PhaseTimer()
+    addon.extra_args = extra
+    addon.save_args = opts.save_args
+    addon.images = [i for arg in opts.pull for i in arg.split(",") if i]
+    _handle_image_sizes(addon, lineno, opts)
+    addon.parallel_pulls = opts.parallel_pulls
+    addon.load_dir = opts.load_dir
+    addon.parallel_loads = opts.parallel_loads
+    addon.trace_commands = opts.trace_commands
+    addon.compact = compact_policies
+    addon.early_start = opts.early_start
+    addon.reuse = opts.reuse
+    addon.auto = opts.auto
+    addon.auto_probe = opts.auto_probe
+    addon.log_cap = opts.log_cap
+    addon.log_rotate = opts.log_rotate
+    addon.log_compress = opts.log_compress
+    addon.metrics_file = opts.metrics_file
+
+    if opts.overlay2_size is not None:
+        if not opts.overlay2:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --overlay2-size requires --overlay2")))
+        if not DOCKER_SIZE_RE.match(opts.overlay2_size):
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --overlay2-size of %s is invalid")) % opts.overlay2_size)
+
+    btrfs_opts = [opts.btrfs_subvol, opts.btrfs_compress, opts.btrfs_noatime,
+                  opts.btrfs_space_cache_v2, opts.btrfs_nodatacow]
+    if any(btrfs_opts):
+        if not opts.btrfs:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --btrfs-* options require --btrfs")))
+        if opts.btrfs_compress and not BTRFS_COMPRESS_RE.match(opts.btrfs_compress):
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --btrfs-compress of %s is invalid")) % opts.btrfs_compress)
+        if opts.btrfs_compress and opts.btrfs_compress != "no" and opts.btrfs_nodatacow:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --btrfs-nodatacow disables --btrfs-compress")))
+
+    if opts.overlay:
+        addon.storage = OverlayStorage(addon)
+    elif opts.overlay2:
+        addon.overlay2_size = opts.overlay2_size
+        addon.storage = Overlay2Storage(addon)
+    elif opts.btrfs:
+        addon.btrfs_subvol = opts.btrfs_subvol
+        addon.btrfs_compress = opts.btrfs_compress
+        addon.btrfs_noatime = opts.btrfs_noatime
+        addon.btrfs_space_cache_v2 = opts.btrfs_space_cache_v2
+        addon.btrfs_nodatacow = opts.btrfs_nodatacow
+        addon.storage = BTRFSStorage(addon)
+    elif opts.vgname:
+        addon.vgname = opts.vgname
+        addon.storage = LVMStorage(addon)
+
+    # --auto may choose devicemapper, which puts --fstype on its thin devices
+    if opts.vgname or opts.auto:
+        fmt = get_format(opts.fstype)
+        if not fmt or fmt.type is None:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker fstype of %s is invalid.")) % opts.fstype)
+        addon.fstype = opts.fstype
+
+    pool_opts = [opts.create_pool, opts.pool_size, opts.pool_chunk_size, opts.pool_metadata_size,
+                 opts.pool_zero, opts.pool_autoextend_threshold, opts.pool_autoextend_percent]
+    if any(v is not None and v is not False for v in pool_opts):
+        _handle_pool_options(addon, lineno, opts)
+
+    dm_opts = [opts.dm_deferred_removal, opts.dm_deferred_deletion, opts.dm_blkdiscard,
+               opts.dm_basesize, opts.dm_mountopt, opts.dm_min_free_space]
+    if any(v is not None and v is not False for v in dm_opts):
+        _handle_dm_options(addon, lineno, opts)
+
+def _handle_daemon_options(addon, lineno, opts, extra):
+    """ Validate and store the daemon.json options
+
+    :param lineno: Line number
+    :param opts: parsed %addon options
+    :param list extra: the extra daemon arguments
+    """
+    for name, value in [("--max-concurrent-downloads", opts.max_concurrent_downloads),
+                        ("--max-concurrent-uploads", opts.max_concurrent_uploads),
+                        ("--container-log-max-file", opts.container_log_max_file)]:
+        if value is not None and value < 1:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker %s must be at least 1")) % name)
+    if opts.shutdown_timeout is not None and opts.shutdown_timeout < 0:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --shutdown-timeout cannot be negative")))
+    if opts.container_log_max_size is not None and not DOCKER_SIZE_RE.match(opts.container_log_max_size):
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --container-log-max-size of %s is invalid")) % opts.container_log_max_size)
+
+    addon.max_concurrent_downloads = opts.max_concurrent_downloads
+    addon.max_concurrent_uploads = opts.max_concurrent_uploads
+    addon.container_log_max_size = opts.container_log_max_size
+    addon.container_log_max_file = opts.container_log_max_file
+    addon.live_restore = opts.live_restore
+    addon.shutdown_timeout = opts.shutdown_timeout
+
+    for mirror in opts.registry_mirror:
+        if not MIRROR_URL_RE.match(mirror):
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --registry-mirror of %s is invalid")) % mirror)
+    for registry in opts.insecure_registry:
+        if not INSECURE_REGISTRY_RE.match(registry):
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --insecure-registry of %s is invalid")) % registry)
+    if opts.persist_mirrors and not (opts.registry_mirror or opts.insecure_registry):
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --persist-mirrors requires --registry-mirror or --insecure-registry")))
+    addon.registry_mirrors = [m.rstrip("/") for m in opts.registry_mirror]
+    addon.insecure_registries = opts.insecure_registry
+    addon.persist_mirrors = opts.persist_mirrors
+
+    # The daemon refuses to start when a setting is both a flag and in daemon.json
+    for key in addon.daemon_json:
+        for flag in DAEMON_JSON_FLAGS[key]:
+            if any(a == flag or a.startswith(flag+"=") for a in extra):
+                raise KickstartParseError(formatErrorMsg(lineno,
+                                                         msg=_("%%addon com_redhat_docker %s conflicts with the daemon.json %s setting")) % (flag, key))
+
+def _handle_snapshot_options(addon, lineno, opts):
+    """ Check and set the --snapshot-* options
+
+    :param lineno: Line number
+    :param opts: Parsed options
+    """
+    if not opts.snapshot_capture and not opts.snapshot_restore:
+        return
+    if opts.snapshot_capture and opts.snapshot_restore:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --snapshot-capture and --snapshot-restore cannot be used together")))
+    if not any(getattr(opts, d) for d in SNAPSHOT_DRIVERS):
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker snapshots are only supported with --overlay and --overlay2")))
+    if opts.snapshot_restore:
+        conflicts = [name for name, value in [("--pull", opts.pull), ("--load-dir", opts.load_dir),
+                                              ("--early-start", opts.early_start), ("--reuse", opts.reuse),
+                                              ("--compact", opts.compact)] if value]
+        if conflicts:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --snapshot-restore cannot be used with %s")) % ", ".join(conflicts))
+
+    addon.snapshot_capture = opts.snapshot_capture
+    addon.snapshot_restore = opts.snapshot_restore
+
+def _handle_backend_options(addon, lineno, opts, extra):
+    """ Check and set the --backend option
+
+    :param lineno: Line number
+    :param opts: Parsed options
+    :param list extra: Extra arguments for the docker daemon
+
+    podman has no daemon and no devicemapper driver, so the options for
+    the daemon, its storage and its preserved store cannot be used with it.
+    """
+    if opts.backend == "docker":
+        return
+    if opts.vgname:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --backend=podman cannot be used with --vgname")))
+    conflicts = [name for name, value in [("--early-start", opts.early_start), ("--reuse", opts.reuse),
+                                          ("--compact", opts.compact),
+                                          ("--snapshot-capture", opts.snapshot_capture),
+                                          ("--snapshot-restore", opts.snapshot_restore),
+                                          ("--save-args", opts.save_args), ("daemon arguments", extra),
+                                          ("daemon.json options", addon.daemon_json),
+                                          ("--registry-mirror", opts.registry_mirror),
+                                          ("--insecure-registry", opts.insecure_registry),
+                                          ("--persist-mirrors", opts.persist_mirrors),
+                                          ("--cpu-weight", opts.cpu_weight is not None),
+                                          ("--io-weight", opts.io_weight is not None),
+                                          ("--cpu-quota", opts.cpu_quota)] if value]
+    if conflicts:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --backend=podman cannot be used with %s")) % ", ".join(conflicts))
+
+    addon.backend = opts.backend
+
+def _handle_sched_options(addon, lineno, opts):
+    """ Check and set the CPU and I/O scheduling options
+
+    :param lineno: Line number
+    :param opts: Parsed options
+    """
+    if opts.nice is not None and not -20 <= opts.nice <= 19:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --nice must be between -20 and 19")))
+    if opts.ionice_level is not None:
+        if not 0 <= opts.ionice_level <= 7:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --ionice-level must be between 0 and 7")))
+        if opts.ionice_class == "idle":
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --ionice-level cannot be used with the idle class")))
+    for name, weight in [("--cpu-weight", opts.cpu_weight), ("--io-weight", opts.io_weight)]:
+        if weight is not None and not 1 <= weight <= 10000:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker %s must be between 1 and 10000")) % name)
+    if opts.cpu_quota is not None and not CPU_QUOTA_RE.match(opts.cpu_quota):
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --cpu-quota of %s is invalid")) % opts.cpu_quota)
+
+    addon.nice = opts.nice
+    addon.ionice_class = opts.ionice_class
+    addon.ionice_level = opts.ionice_level
+    addon.cpu_weight = opts.cpu_weight
+    addon.io_weight = opts.io_weight
+    addon.cpu_quota = opts.cpu_quota
+
+def _handle_image_sizes(addon, lineno, opts):
+    """ Validate and store the --image-size options
+
+    :param lineno: Line number
+    :param opts: parsed %addon options
+    """
+    for arg in opts.image_size:
+        (image, _sep, size) = arg.rpartition("=")
+        if image not in addon.images:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --image-size for %s needs a --pull of it")) % image)
+        try:
+            Size(size)
+        except ValueError:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --image-size of %s is invalid")) % arg)
+        addon.image_sizes[image] = size
+
+def _handle_dm_options(addon, lineno, opts):
+    """ Validate and store the devicemapper storage options
+
+    :param lineno: Line number
+    :param opts: parsed %addon options
+    """
+    if not opts.vgname:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker devicemapper options require --vgname")))
+    if opts.dm_deferred_deletion and not opts.dm_deferred_removal:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --dm-deferred-deletion requires --dm-deferred-removal")))
+    if opts.dm_basesize and not DOCKER_SIZE_RE.match(opts.dm_basesize):
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --dm-basesize of %s is invalid")) % opts.dm_basesize)
+    if opts.dm_mountopt is not None and not re.match(r"^[A-Za-z0-9_=,.-]+$", opts.dm_mountopt):
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --dm-mountopt of %s is invalid")) % opts.dm_mountopt)
+    if opts.dm_min_free_space is not None:
+        match = re.match(r"^([0-9]+)%$", opts.dm_min_free_space)
+        if not match or int(match.group(1)) > 99:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --dm-min-free-space must be a percentage between 0% and 99%")))
+
+    addon.dm_deferred_removal = opts.dm_deferred_removal
+    addon.dm_deferred_deletion = opts.dm_deferred_deletion
+    addon.dm_blkdiscard = None if opts.dm_blkdiscard is None else opts.dm_blkdiscard == "true"
+    addon.dm_basesize = opts.dm_basesize
+    addon.dm_mountopt = opts.dm_mountopt
+    addon.dm_min_free_space = opts.dm_min_free_space
+
+def _handle_pool_options(addon, lineno, opts):
+    """ Validate and store the docker-pool options
+
+    :param lineno: Line number
+    :param opts: parsed %addon options
+    """
+    if not opts.vgname:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker docker-pool options require --vgname")))
+    if (opts.pool_size or opts.pool_chunk_size or opts.pool_metadata_size) and not opts.create_pool:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --pool-size, --pool-chunk-size and --pool-metadata-size require --create-pool")))
+
+    for name, value in [("--pool-size", opts.pool_size),
+                        ("--pool-autoextend-threshold", opts.pool_autoextend_threshold),
+                        ("--pool-autoextend-percent", opts.pool_autoextend_percent)]:
+        if value is not None and not 0 < value <= 100:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker %s must be a percentage between 1 and 100")) % name)
+
+    for name, value in [("--pool-chunk-size", opts.pool_chunk_size),
+                        ("--pool-metadata-size", opts.pool_metadata_size)]:
+        try:
+            if value is not None:
+                Size(value)
+        except ValueError:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker %s of %s is invalid")) % (name, value))
+
+    if opts.pool_chunk_size:
+        chunk = Size(opts.pool_chunk_size)
+        if not POOL_CHUNK_MIN <= chunk <= POOL_CHUNK_MAX or chunk % POOL_CHUNK_MIN:
+            raise KickstartParseError(formatErrorMsg(lineno,
+                                                     msg=_("%%addon com_redhat_docker --pool-chunk-size must be a multiple of 64KiB up to 1GiB")))
+    if opts.pool_metadata_size and not POOL_METADATA_MIN // 32 <= Size(opts.pool_metadata_size) <= POOL_METADATA_MAX:
+        raise KickstartParseError(formatErrorMsg(lineno,
+                                                 msg=_("%%addon com_redhat_docker --pool-metadata-size must be between 2MiB and 16GiB")))
+
+    addon.create_pool = opts.create_pool
+    addon.pool_size = opts.pool_size
+    addon.pool_chunk_size = opts.pool_chunk_size
+    addon.pool_metadata_size = opts.pool_metadata_size
+    addon.pool_zero = None if opts.pool_zero is None else opts.pool_zero == "y"
+    addon.pool_autoextend_threshold = opts.pool_autoextend_threshold
+    addon.pool_autoextend_percent = opts.pool_autoextend_percent
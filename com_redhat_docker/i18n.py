@@ -25,5 +25,5 @@ __all__ = ["_", "N_"]
 
 import gettext
 
-_ = lambda x: gettext.ldgettext("docker-anaconda-addon", x)
+_ = lambda x: gettext.dgettext("docker-anaconda-addon", x)
 N_ = lambda x: x
@@ -0,0 +1,117 @@
+#pylint: disable=missing-docstring
+'''
+Parallel image pre-population
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import time
+
+from com_redhat_docker import api
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["PullResult", "repository", "schedule_images", "pull_images"]
+
+# error is None for a successful pull, size is the number of bytes downloaded
+PullResult = namedtuple("PullResult", ["image", "error", "elapsed", "size"])
+
+def repository(image):
+    """ Return the repository part of an image reference
+
+    :param str image: Image reference, eg. registry:5000/fedora:25 or busybox@sha256:...
+    :returns: The reference without its tag or digest
+    :rtype: str
+    """
+    name = image.split("@", 1)[0]
+    # A ':' after the last '/' separates the tag, one before it is a registry port
+    slash = name.rfind("/")
+    colon = name.rfind(":")
+    if colon > slash:
+        name = name[:colon]
+    return name
+
+def schedule_images(images):
+    """ Split the images into groups that are each pulled by a single worker
+
+    :param list images: Image references, in kickstart order
+    :returns: Lists of images, largest group first
+    :rtype: list of lists
+
+    Tags of the same repository almost always share their base layers, so they
+    are pulled one after the other by the same worker. The first pull fetches
+    the shared layers and the rest find them already present. Layers shared
+    between different repositories that are in flight at the same time are
+    only downloaded once by the daemon itself.
+    """
+    groups = OrderedDict()
+    for image in images:
+        group = groups.setdefault(repository(image), [])
+        if image not in group:
+            group.append(image)
+    return sorted(groups.values(), key=len, reverse=True)
+
+def _pull_group(group, socket_path, reporter):
+    results = []
+    with api.DockerClient(socket_path) as client:
+        for image in group:
+            start = time.monotonic()
+            try:
+                progress = client.pull(image, reporter.pull if reporter else None)
+            except (OSError, ValueError, http.client.HTTPException, api.DockerAPIError) as e:
+                result = PullResult(image, str(e), time.monotonic() - start, 0)
+                log.error("Pulling %s failed after %.2fs: %s", image, result.elapsed, e)
+            else:
+                result = PullResult(image, None, time.monotonic() - start, progress.downloaded)
+                log.info("Pulled %s in %.2fs: %d layers, %d bytes downloaded, %d layers already present",
+                         image, result.elapsed, progress.layers, result.size, progress.existing)
+            results.append(result)
+            if reporter:
+                reporter.done(image)
+    return results
+
+def pull_images(images, workers, socket_path=None, reporter=None):
+    """ Pull the images into the running daemon with a pool of workers
+
+    :param list images: Image references to pull
+    :param int workers: Maximum number of concurrent pulls
+    :param str socket_path: Path to the daemon's Unix socket, api.DOCKER_SOCKET by default
+    :param reporter: ProgressReporter for the pulls, or None
+    :returns: One result per image, in the order they were passed
+    :rtype: list of PullResult
+
+    Each worker pulls its images over its own connection to the daemon.
+    """
+    groups = schedule_images(images)
+    if not groups:
+        return []
+
+    workers = max(1, min(workers, len(groups)))
+    log.info("Pulling %d images with %d workers", sum(len(g) for g in groups), workers)
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        done = {r.image: r for results in pool.map(lambda g: _pull_group(g, socket_path, reporter), groups) for r in results}
+    log.info("Pulled images in %.2fs, %d failed", time.monotonic() - start,
+             sum(1 for r in done.values() if r.error))
+    if reporter:
+        reporter.finish()
+
+    return [done[image] for image in OrderedDict.fromkeys(images)]
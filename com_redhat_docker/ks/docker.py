@@ -21,18 +21,17 @@ Docker Anaconda Kickstart Addon
 #
 # Red Hat Author(s): Brian C. Lane <bcl@redhat.com>
 #
+# anaconda imports every addon at startup whether the kickstart uses it or
+# not. Only what DockerData needs to exist is imported here, the header is
+# parsed by com_redhat_docker.header, and blivet, the rest of pyanaconda and
+# the helper modules are imported where they are used, once the addon has
+# been enabled.
+from collections import OrderedDict
 import os
-import shutil
-import blivet.formats
-from blivet.devices import BTRFSDevice
+import re
 
 from pyanaconda.addons import AddonData
-from pyanaconda.iutil import execWithRedirect, getSysroot
-from pyanaconda.iutil import startProgram
-from pyanaconda.kickstart import AnacondaKSScript
-from pyanaconda.simpleconfig import SimpleConfigFile
 
-from pykickstart.options import KSOptionParser
 from pykickstart.errors import KickstartParseError, formatErrorMsg
 
 from com_redhat_docker.i18n import _
@@ -42,7 +41,60 @@ log = logging.getLogger("anaconda")
 
 __all__ = ["DockerData"]
 
+DEFAULT_PARALLEL_PULLS = 4
+DEFAULT_PARALLEL_LOADS = 2
+
+# Where the logs and the timing report are written on the target system
+LOG_DIR = "/var/log/anaconda/"
+
+# Thin-pool defaults used when the addon creates the pool. The data size is a
+# percentage of the VG's free space, like docker-storage-setup's 40%FREE.
+DEFAULT_POOL_SIZE = 40
+DEFAULT_POOL_CHUNK_SIZE = "512 KiB"
+DEFAULT_POOL_AUTOEXTEND_THRESHOLD = 60
+DEFAULT_POOL_AUTOEXTEND_PERCENT = 20
+POOL_METADATA_MIN = 64 * 1024**2
+POOL_METADATA_MAX = 16 * 1024**3
+
+# Mountpoints that may hold /var/lib/docker, nearest first
+DOCKER_ROOT_PATHS = ["/var/lib/docker", "/var/lib", "/var", "/"]
+
+# Where each --backend keeps its images
+BACKEND_ROOTS = OrderedDict([("docker", "/var/lib/docker"), ("podman", "/var/lib/containers")])
+
+XFS_FTYPE_RE = re.compile(r"ftype=(\d)")
+
+def xfs_ftype(device):
+    """ Return the ftype of an existing XFS filesystem
+
+    :param device: blivet device with the XFS format
+    :returns: "0", "1" or None if xfs_info didn't say
+    """
+    from pyanaconda.iutil import execWithCapture
+
+    info = execWithCapture("xfs_info", [device.path]) or ""
+    match = XFS_FTYPE_RE.search(info)
+    return match.group(1) if match else None
+
+# Extra space required on top of the estimated image sizes, as a percentage
+CAPACITY_MARGIN = 10
+
+def docker_root_device(storage, root=DOCKER_ROOT_PATHS[0]):
+    """ Return the mountpoint and device of the filesystem holding /var/lib/docker
+
+    :param storage: Blivet storage object
+    :param str root: The image store, eg. /var/lib/containers for podman
+    :returns: (mountpoint, device) or (None, None)
+    """
+    for path in [root] + DOCKER_ROOT_PATHS[1:]:
+        device = storage.mountpoints.get(path)
+        if device:
+            return (path, device)
+    return (None, None)
+
 class LVMStorage(object):
+    driver = "devicemapper"
+
     def __init__(self, addon):
         self.addon = addon
 
@@ -63,7 +115,76 @@ class LVMStorage(object):
     @property
     def addon_str(self):
         """ Return the addon string and storage driver options """
-        return '%%addon %s --vgname="%s" --fstype="%s"' % (self.addon.name, self.addon.vgname, self.addon.fstype)
+        addon_str = '%%addon %s --vgname="%s" --fstype="%s"' % (self.addon.name, self.addon.vgname, self.addon.fstype)
+        if self.addon.create_pool:
+            addon_str += " --create-pool"
+        if self.addon.pool_size:
+            addon_str += " --pool-size=%d" % self.addon.pool_size
+        if self.addon.pool_chunk_size:
+            addon_str += ' --pool-chunk-size="%s"' % self.addon.pool_chunk_size
+        if self.addon.pool_metadata_size:
+            addon_str += ' --pool-metadata-size="%s"' % self.addon.pool_metadata_size
+        if self.addon.pool_zero is not None:
+            addon_str += " --pool-zero=%s" % ("y" if self.addon.pool_zero else "n")
+        if self.addon.pool_autoextend_threshold:
+            addon_str += " --pool-autoextend-threshold=%d" % self.addon.pool_autoextend_threshold
+        if self.addon.pool_autoextend_percent:
+            addon_str += " --pool-autoextend-percent=%d" % self.addon.pool_autoextend_percent
+        if self.addon.dm_deferred_removal:
+            addon_str += " --dm-deferred-removal"
+        if self.addon.dm_deferred_deletion:
+            addon_str += " --dm-deferred-deletion"
+        if self.addon.dm_blkdiscard is not None:
+            addon_str += " --dm-blkdiscard=%s" % ("true" if self.addon.dm_blkdiscard else "false")
+        if self.addon.dm_basesize:
+            addon_str += ' --dm-basesize="%s"' % self.addon.dm_basesize
+        if self.addon.dm_mountopt:
+            addon_str += ' --dm-mountopt="%s"' % self.addon.dm_mountopt
+        if self.addon.dm_min_free_space:
+            addon_str += ' --dm-min-free-space="%s"' % self.addon.dm_min_free_space
+        return addon_str
+
+    @property
+    def storage_opts(self):
+        """ Return the devicemapper --storage-opt values
+
+        The same options are used for the install-time daemon and written to
+        /etc/sysconfig/docker-storage.
+        """
+        opts = [self.dm_fs, self.pool_name]
+        if self.addon.dm_deferred_removal:
+            opts.append("dm.use_deferred_removal=true")
+        if self.addon.dm_deferred_deletion:
+            opts.append("dm.use_deferred_deletion=true")
+        if self.addon.dm_blkdiscard is not None:
+            opts.append("dm.blkdiscard=%s" % ("true" if self.addon.dm_blkdiscard else "false"))
+        if self.addon.dm_basesize:
+            opts.append("dm.basesize=%s" % self.addon.dm_basesize)
+        if self.addon.dm_mountopt:
+            opts.append("dm.mountopt=%s" % self.addon.dm_mountopt)
+        if self.addon.dm_min_free_space:
+            opts.append("dm.min_free_space=%s" % self.addon.dm_min_free_space)
+        return opts
+
+    @property
+    def containers_storage(self):
+        """ Return the podman storage.conf driver and options, None as devicemapper isn't supported """
+        return None
+
+    @property
+    def pool_zero(self):
+        """ Return whether the pool zeroes new blocks, or None to leave the LVM default """
+        if self.addon.pool_zero is None and self.addon.create_pool:
+            return False
+        return self.addon.pool_zero
+
+    @property
+    def autoextend(self):
+        """ Return the (threshold, percent) of the pool's autoextend settings, or None """
+        if not (self.addon.create_pool or self.addon.pool_autoextend_threshold or self.addon.pool_autoextend_percent):
+            return None
+        return (self.addon.pool_autoextend_threshold or DEFAULT_POOL_AUTOEXTEND_THRESHOLD,
+                self.addon.pool_autoextend_percent or DEFAULT_POOL_AUTOEXTEND_PERCENT)
 
     def check_setup(self, storage, ksdata, instClass):
         """ Check storage to make sure the selected VG has a thinpool and it is named docker-pool
@@ -73,14 +194,134 @@ class LVMStorage(object):
         :param instClass: Anaconda installclass object
 
         If there is an error, raise the appropriate Kickstart error.
+
+        With --create-pool a missing pool is created, and an existing one is
+        grown when --pool-size is passed. devicemapper keeps the metadata of
+        the pool's images in /var/lib/docker, so --reuse of an existing pool
+        needs the filesystem holding it to be kept too.
         """
-        if self.addon.vgname not in (vg.name for vg in storage.vgs):
+        vg = next((vg for vg in storage.vgs if vg.name == self.addon.vgname), None)
+        if vg is None:
             raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker is missing VG named %s")) % self.addon.vgname)
 
         # Make sure the VG has a docker-pool LV
-        if self.addon.vgname+"-docker-pool" not in (lv.name for lv in storage.lvs):
+        pool = next((lv for lv in storage.lvs if lv.name == self.addon.vgname+"-docker-pool"), None)
+        if self.addon.create_pool:
+            self._setup_pool(storage, vg, pool)
+        elif pool is None:
             raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker is missing a LV named docker-pool")))
 
+        if self.addon.reuse and pool is not None and pool.exists and not self.preserved(storage):
+            raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker --reuse needs the filesystem holding /var/lib/docker to be kept with docker-pool")))
+
+    def capacity(self, storage):
+        """ Return the space docker can use for images
+
+        :param storage: Blivet storage object
+        :returns: (size, description) or None if it isn't known
+        """
+        from blivet.size import Size
+
+        pool = next((lv for lv in storage.lvs if lv.name == self.addon.vgname+"-docker-pool"), None)
+        if pool is None:
+            return None
+        size = pool.size
+        if self.addon.dm_min_free_space:
+            size = Size(int(size) * (100 - int(self.addon.dm_min_free_space.rstrip("%"))) // 100)
+        return (size, "thin-pool %s" % pool.name)
+
+    def preserved(self, storage):
+        """ Return True if the docker-pool and the filesystem holding /var/lib/docker are kept
+
+        :param storage: Blivet storage object
+
+        The pool alone is no use, the metadata of its images is in /var/lib/docker.
+        """
+        pool = next((lv for lv in storage.lvs if lv.name == self.addon.vgname+"-docker-pool"), None)
+        (_path, device) = docker_root_device(storage, self.addon.root)
+        return pool is not None and pool.exists and device is not None and device.format.exists
+
+    def _setup_pool(self, storage, vg, pool):
+        """ Create or grow the docker-pool thin-pool
+
+        :param storage: Blivet storage object
+        :param vg: The VG holding the pool
+        :param pool: The existing docker-pool LV or None
+
+        --pool-size is the share of the VG for the pool's data and metadata
+        together. LVM can't shrink a thin-pool, so an existing pool is only
+        ever grown.
+        """
+        from blivet.size import Size
+
+        available = vg.free_space + (pool.size + pool.metadata_size if pool else 0)
+        size = Size(int(available) * (self.addon.pool_size or DEFAULT_POOL_SIZE) // 100)
+
+        if pool:
+            if self.addon.pool_chunk_size or self.addon.pool_metadata_size:
+                log.warning("docker-pool already exists in %s, ignoring the chunk and metadata size options", vg.name)
+            if not self.addon.pool_size:
+                return
+            data = size - pool.metadata_size
+            if data <= pool.size:
+                log.warning("docker-pool in %s is already %s, not shrinking it to %s", vg.name, pool.size, data)
+                return
+            log.info("Growing docker-pool in %s from %s to %s", vg.name, pool.size, data)
+            storage.resize_device(pool, data)
+            return
+
+        # The metadata comes out of the same free space. Size it generously,
+        # the pool can't autoextend its metadata while the installer runs.
+        if self.addon.pool_metadata_size:
+            metadata = Size(self.addon.pool_metadata_size)
+        else:
+            metadata = min(max(Size(int(size) // 100), Size(POOL_METADATA_MIN)), Size(POOL_METADATA_MAX))
+        if size <= metadata:
+            raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker VG %s is too small for docker-pool")) % vg.name)
+        data = size - metadata
+        chunk = Size(self.addon.pool_chunk_size or DEFAULT_POOL_CHUNK_SIZE)
+
+        log.info("Creating docker-pool in %s: data %s, metadata %s, chunk size %s",
+                 vg.name, data, metadata, chunk)
+        pool = storage.new_lv(name="docker-pool", parents=[vg], size=data, thin_pool=True,
+                              metadata_size=metadata, chunk_size=chunk)
+        storage.create_device(pool)
+
+    def prepare(self, storage, ksdata, instClass, users):
+        """ Prepare the storage before the daemon starts
+
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+        :param users: Anaconda users object
+
+        Sets whether the pool zeroes newly provisioned blocks. blivet can't
+        pass this when it creates the pool.
+        """
+        from pyanaconda.iutil import execWithRedirect
+
+        pool = "%s/docker-pool" % self.addon.vgname
+        if self.pool_zero is not None:
+            if execWithRedirect("lvchange", ["--zero", "y" if self.pool_zero else "n", pool]) != 0:
+                log.error("Failed to set zeroing on %s", pool)
+
+    def discard(self, storage, ksdata, instClass, users):
+        """ Discard the space freed by removing docker objects
+
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+        :param users: Anaconda users object
+        :returns: Bytes discarded, or None if it isn't known
+
+        The thin devices of removed images and containers are returned to
+        the pool by docker, and with dm.blkdiscard (docker's default) their
+        blocks are discarded first. There is no filesystem to trim.
+        """
+        if self.addon.dm_blkdiscard is False:
+            log.warning("--dm-blkdiscard=false, the blocks freed in docker-pool are not discarded")
+        return None
+
     def docker_cmd(self, storage, ksdata, instClass, users):
         """ Return the docker command's storage arguments
 
@@ -89,7 +330,10 @@ class LVMStorage(object):
         :param instClass: Anaconda installclass object
         :param users: Anaconda users object
         """
-        return ["--storage-driver", "devicemapper", "--storage-opt", self.dm_fs, "--storage-opt", self.pool_name]
+        cmd = ["--storage-driver", self.driver]
+        for opt in self.storage_opts:
+            cmd += ["--storage-opt", opt]
+        return cmd
 
     def write_configs(self, storage, ksdata, instClass, users):
         """ Write configuration file(s)
@@ -99,12 +343,20 @@ class LVMStorage(object):
         :param instClass: Anaconda installclass object
         :param users: Anaconda users object
         """
+        from blivet.size import Size
+        from pyanaconda.iutil import getSysroot
+
         with open(getSysroot()+"/etc/sysconfig/docker-storage", "w") as fp:
-            fp.write('DOCKER_STORAGE_OPTIONS="--storage-driver devicemapper '
-                     '--storage-opt %s --storage-opt %s"\n' % (self.dm_fs, self.pool_name))
+            fp.write('DOCKER_STORAGE_OPTIONS="--storage-driver devicemapper %s"\n' %
+                     " ".join("--storage-opt %s" % opt for opt in self.storage_opts))
 
         with open(getSysroot()+"/etc/sysconfig/docker-storage-setup", "a") as fp:
             fp.write("VG=%s\n" % self.addon.vgname)
+            if self.addon.create_pool:
+                fp.write("CHUNK_SIZE=%dK\n" % (Size(self.addon.pool_chunk_size or DEFAULT_POOL_CHUNK_SIZE) // 1024))
+            if self.autoextend:
+                fp.write("AUTO_EXTEND_POOL=yes\n")
+                fp.write("POOL_AUTOEXTEND_THRESHOLD=%d\nPOOL_AUTOEXTEND_PERCENT=%d\n" % self.autoextend)
 
     def options(self, options):
         """ Modify the docker config file OPTION value
@@ -116,6 +368,8 @@ class LVMStorage(object):
         return options
 
 class OverlayStorage(object):
+    driver = "overlay"
+
     def __init__(self, addon):
         self.addon = addon
 
@@ -124,10 +378,60 @@ class OverlayStorage(object):
         """ Return the addon string and storage driver options """
         return '%%addon %s --overlay' % self.addon.name
 
+    @property
+    def storage_opts(self):
+        """ Return the driver's --storage-opt values """
+        return []
+
+    @property
+    def containers_storage(self):
+        """ Return the podman storage.conf driver and options """
+        return ("overlay", OrderedDict())
+
     def check_setup(self, storage, ksdata, instClass):
         """ Nothing to check for overlay """
         return
 
+    def capacity(self, storage):
+        """ Return the space docker can use for images
+
+        :param storage: Blivet storage object
+        :returns: (size, description) or None if it isn't known
+
+        This is the size of the whole filesystem holding /var/lib/docker, it
+        may also hold the rest of the installation.
+        """
+        (path, device) = docker_root_device(storage, self.addon.root)
+        if device is None:
+            return None
+        return (device.size, "%s filesystem on %s" % (path, device.name))
+
+    def preserved(self, storage):
+        """ Return True if the filesystem holding /var/lib/docker is kept from a previous installation
+
+        :param storage: Blivet storage object
+        """
+        (_path, device) = docker_root_device(storage, self.addon.root)
+        return device is not None and device.format.exists
+
+    def prepare(self, storage, ksdata, instClass, users):
+        """ Nothing to prepare for overlay """
+        return
+
+    def discard(self, storage, ksdata, instClass, users):
+        """ Discard the space freed by removing docker objects
+
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+        :param users: Anaconda users object
+        :returns: Bytes discarded, or None if it isn't known
+        """
+        from pyanaconda.iutil import getSysroot
+        from com_redhat_docker.compact import fstrim
+
+        return fstrim(getSysroot()+self.addon.root)
+
     def docker_cmd(self, storage, ksdata, instClass, users):
         """ Return the docker command's storage arguments
 
@@ -136,7 +440,10 @@ class OverlayStorage(object):
         :param instClass: Anaconda installclass object
         :param users: Anaconda users object
         """
-        return ["--storage-driver", "overlay"]
+        cmd = ["--storage-driver", self.driver]
+        for opt in self.storage_opts:
+            cmd += ["--storage-opt", opt]
+        return cmd
 
     def write_configs(self, storage, ksdata, instClass, users):
         """ Write configuration file(s)
@@ -145,9 +452,19 @@ class OverlayStorage(object):
         :param ksdata: Kickstart data object
         :param instClass: Anaconda installclass object
         :param users: Anaconda users object
+
+        docker-storage-setup is told about the driver so that it doesn't
+        replace docker-storage with its devicemapper default on first boot.
         """
+        from pyanaconda.iutil import getSysroot
+
         with open(getSysroot()+"/etc/sysconfig/docker-storage", "w") as fp:
-            fp.write('DOCKER_STORAGE_OPTIONS="--storage-driver overlay"\n')
+            fp.write('DOCKER_STORAGE_OPTIONS="%s"\n' %
+                     " ".join(["--storage-driver", self.driver] +
+                              ["--storage-opt %s" % opt for opt in self.storage_opts]))
+
+        with open(getSysroot()+"/etc/sysconfig/docker-storage-setup", "a") as fp:
+            fp.write("STORAGE_DRIVER=%s\n" % self.driver)
 
     def options(self, options):
         """ Modify the docker config file OPTION value
@@ -156,27 +473,243 @@ class OverlayStorage(object):
 
         overlayfs doesn't work with --selinux-enabled, so remove it
         """
-        log.info("Removing --selinux-enabled from docker OPTIONS for overlay driver")
+        log.info("Removing --selinux-enabled from docker OPTIONS for %s driver", self.driver)
         return options.replace("--selinux-enabled", "")
 
+class Overlay2Storage(OverlayStorage):
+    driver = "overlay2"
+
+    @property
+    def addon_str(self):
+        """ Return the addon string and storage driver options """
+        addon_str = '%%addon %s --overlay2' % self.addon.name
+        if self.addon.overlay2_size:
+            addon_str += ' --overlay2-size="%s"' % self.addon.overlay2_size
+        return addon_str
+
+    @property
+    def storage_opts(self):
+        """ Return the driver's --storage-opt values """
+        if self.addon.overlay2_size:
+            return ["overlay2.size=%s" % self.addon.overlay2_size]
+        return []
+
+    @property
+    def containers_storage(self):
+        """ Return the podman storage.conf driver and options """
+        options = OrderedDict()
+        if self.addon.overlay2_size:
+            options["size"] = self.addon.overlay2_size
+        return ("overlay", options)
+
+    def check_setup(self, storage, ksdata, instClass):
+        """ Check that /var/lib/docker is on a filesystem overlay2 works well with
+
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+
+        overlay2 needs d_type support from the backing filesystem. ext4 always
+        has it, XFS only when it is made with ftype=1. Anything else is an
+        error. --overlay2-size needs project quotas, so it needs XFS on its
+        own mountpoint that can be mounted with pquota.
+        """
+        (path, device) = docker_root_device(storage, self.addon.root)
+        if device is None:
+            raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker there is no filesystem for %s")) % self.addon.root)
+
+        fmt = device.format
+        if fmt.type == "xfs":
+            self._check_xfs_ftype(device)
+        elif fmt.type != "ext4":
+            raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker overlay2 needs %s on XFS or ext4, not %s")) % (self.addon.root, fmt.type))
+
+        if self.addon.overlay2_size:
+            if fmt.type != "xfs" or path == "/":
+                raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker --overlay2-size needs %s on a separate XFS filesystem")) % self.addon.root)
+            options = fmt.options or "defaults"
+            if not set(options.split(",")) & set(["pquota", "prjquota"]):
+                fmt.options = options + ",pquota"
+
+        log.info("com_redhat_docker overlay2 backed by %s on %s (%s, mount options %s)",
+                 fmt.type, path, device.name, fmt.options)
+
+    def _check_xfs_ftype(self, device):
+        """ Make sure the XFS holding /var/lib/docker has ftype=1
+
+        :param device: blivet device with the XFS format
+        """
+        fmt = device.format
+        if not fmt.exists:
+            # Make sure mkfs doesn't fall back to ftype=0 with older xfsprogs
+            create_options = getattr(fmt, "create_options", None) or ""
+            if "ftype" not in create_options:
+                fmt.create_options = (create_options + " -n ftype=1").strip()
+            return
+
+        ftype = xfs_ftype(device)
+        if ftype is None:
+            log.warning("com_redhat_docker could not read the ftype of %s", device.path)
+        elif ftype != "1":
+            raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker XFS on %s has ftype=0 and can't be used with overlay2")) % device.path)
+
 class BTRFSStorage(object):
+    driver = "btrfs"
+
     def __init__(self, addon):
         self.addon = addon
 
     @property
     def addon_str(self):
         """ Return the addon string and storage driver options """
-        return '%%addon %s --btrfs' % self.addon.name
+        addon_str = '%%addon %s --btrfs' % self.addon.name
+        if self.addon.btrfs_subvol:
+            addon_str += " --btrfs-subvol"
+        if self.addon.btrfs_compress:
+            addon_str += " --btrfs-compress=%s" % self.addon.btrfs_compress
+        if self.addon.btrfs_noatime:
+            addon_str += " --btrfs-noatime"
+        if self.addon.btrfs_space_cache_v2:
+            addon_str += " --btrfs-space-cache-v2"
+        if self.addon.btrfs_nodatacow:
+            addon_str += " --btrfs-nodatacow"
+        return addon_str
+
+    @property
+    def containers_storage(self):
+        """ Return the podman storage.conf driver and options """
+        return ("btrfs", OrderedDict())
+
+    @property
+    def mount_options(self):
+        """ Return the mount options set by the --btrfs-* arguments
+
+        --btrfs-nodatacow is not a mount option here, nodatacow would apply to
+        the whole filesystem. prepare sets the No_COW attribute on
+        /var/lib/docker instead.
+        """
+        options = []
+        if self.addon.btrfs_compress:
+            options.append("compress=%s" % self.addon.btrfs_compress)
+        if self.addon.btrfs_noatime:
+            options.append("noatime")
+        if self.addon.btrfs_space_cache_v2:
+            options.append("space_cache=v2")
+        return options
 
     def check_setup(self, storage, ksdata, instClass):
-        """ Check to make sure /var/lib/docker is on a BTRFS filesystem"""
-        for path in ["/var/lib/docker", "/var/lib", "/var", "/"]:
+        """ Check to make sure /var/lib/docker is on a BTRFS filesystem
+
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+
+        With --btrfs-subvol a subvolume is created for /var/lib/docker when it
+        doesn't have its own. The mount options are set on the subvolume or
+        volume that holds /var/lib/docker, and are written to its fstab entry.
+        compress and space_cache are set by the first mount of the volume, so
+        they apply to all of it, subvolume or not.
+        """
+        from blivet.devices import BTRFSDevice, BTRFSVolumeDevice
+
+        root = self.addon.root
+        for path in [root] + DOCKER_ROOT_PATHS[1:]:
             device = storage.mountpoints.get(path)
             if isinstance(device, BTRFSDevice):
                 log.debug("com_redhat_docker found BTRFS at %s", path)
-                return
+                break
+        else:
+            raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker %s is not on a BTRFS volume")) % root)
+
+        volume = device if isinstance(device, BTRFSVolumeDevice) else device.volume
+        if self.addon.btrfs_subvol and path != root:
+            name = os.path.basename(root)
+            log.info("Creating a %s subvolume on %s for %s", name, volume.name, root)
+            device = storage.new_btrfs_sub_volume(name=name, parents=[volume], mountpoint=root)
+            storage.create_device(device)
+            path = root
+
+        if self.mount_options:
+            if self.addon.btrfs_compress or self.addon.btrfs_space_cache_v2:
+                log.warning("com_redhat_docker btrfs compress and space_cache apply to the whole volume %s, not only %s",
+                            volume.name, root)
+            if self.addon.btrfs_noatime and path != root:
+                log.warning("com_redhat_docker btrfs noatime also applies to everything else on %s", path)
+            keys = set(o.split("=")[0] for o in self.mount_options)
+            options = [o for o in (device.format.options or "defaults").split(",")
+                       if o != "defaults" and o.split("=")[0] not in keys]
+            device.format.options = ",".join(options + self.mount_options)
+
+        log.info("com_redhat_docker btrfs layout: %s on %s %s mounted at %s, volume %s, mount options %s",
+                 root, "volume" if device is volume else "subvolume", device.name, path, volume.name,
+                 device.format.options)
+
+    def capacity(self, storage):
+        """ Return the space docker can use for images
+
+        :param storage: Blivet storage object
+        :returns: (size, description) or None if it isn't known
+
+        This is the size of the BTRFS volume, which is shared by all of its
+        subvolumes.
+        """
+        from blivet.devices import BTRFSDevice, BTRFSVolumeDevice
+
+        for path in [self.addon.root] + DOCKER_ROOT_PATHS[1:]:
+            device = storage.mountpoints.get(path)
+            if isinstance(device, BTRFSDevice):
+                volume = device if isinstance(device, BTRFSVolumeDevice) else device.volume
+                return (volume.size, "BTRFS volume %s" % volume.name)
+        return None
+
+    def preserved(self, storage):
+        """ Return True if the BTRFS volume or subvolume holding /var/lib/docker is kept
 
-        raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker /var/lib/docker is not on a BTRFS volume")))
+        :param storage: Blivet storage object
+        """
+        from blivet.devices import BTRFSDevice
+
+        (_path, device) = docker_root_device(storage, self.addon.root)
+        return isinstance(device, BTRFSDevice) and device.exists
+
+    def prepare(self, storage, ksdata, instClass, users):
+        """ Log the mount that will hold /var/lib/docker and set its No_COW attribute
+
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+        :param users: Anaconda users object
+
+        With --btrfs-nodatacow /var/lib/docker is made No_COW with chattr +C
+        before the daemon writes to it. Everything created in it inherits the
+        attribute, files that are already there keep copy-on-write.
+        """
+        from pyanaconda.iutil import execWithCapture, execWithRedirect, getSysroot
+
+        mount = execWithCapture("findmnt", ["-n", "-o", "SOURCE,FSTYPE,OPTIONS",
+                                            "--target", getSysroot()+self.addon.root])
+        log.info("com_redhat_docker %s is mounted from %s", self.addon.root, (mount or "").strip())
+
+        if self.addon.btrfs_nodatacow:
+            if execWithRedirect("chattr", ["+C", getSysroot()+self.addon.root]) != 0:
+                log.error("Failed to turn off copy-on-write for %s", self.addon.root)
+
+    def discard(self, storage, ksdata, instClass, users):
+        """ Discard the space freed by removing docker objects
+
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+        :param users: Anaconda users object
+        :returns: Bytes discarded, or None if it isn't known
+
+        The space of deleted subvolumes is freed in the background, so some of
+        it may only be discarded by a later fstrim.
+        """
+        from pyanaconda.iutil import getSysroot
+        from com_redhat_docker.compact import fstrim
+
+        return fstrim(getSysroot()+self.addon.root)
 
     def docker_cmd(self, storage, ksdata, instClass, users):
         """ Return the docker command's storage arguments
@@ -186,7 +719,7 @@ class BTRFSStorage(object):
         :param instClass: Anaconda installclass object
         :param users: Anaconda users object
         """
-        return ["--storage-driver", "btrfs"]
+        return ["--storage-driver", self.driver]
 
     def write_configs(self, storage, ksdata, instClass, users):
         """ Write configuration file(s)
@@ -196,6 +729,8 @@ class BTRFSStorage(object):
         :param instClass: Anaconda installclass object
         :param users: Anaconda users object
         """
+        from pyanaconda.iutil import getSysroot
+
         with open(getSysroot()+"/etc/sysconfig/docker-storage", "w") as fp:
             fp.write('DOCKER_STORAGE_OPTIONS="--storage-driver btrfs"\n')
 
@@ -217,26 +752,165 @@ class DockerData(AddonData):
         # Called very early in anaconda setup
         AddonData.__init__(self, name)
 
-        # This is set to one of the storage classes in handle_header
+        # This is set to one of the storage classes in handle_header, or in
+        # setup with --auto
         self.storage = None
+        self.auto = False
+        self.auto_probe = False
+        self.backend = "docker"
         self.vgname = None
         self.fstype = "xfs"
         self.enabled = False
         self.extra_args = []
         self.save_args = False
+        self.images = []
+        self.image_sizes = OrderedDict()
+        self.parallel_pulls = DEFAULT_PARALLEL_PULLS
+        self.load_dir = None
+        self.parallel_loads = DEFAULT_PARALLEL_LOADS
+        self.trace_commands = False
+        self.early_start = False
+        self.reuse = False
+        self.max_concurrent_downloads = None
+        self.max_concurrent_uploads = None
+        self.container_log_max_size = None
+        self.container_log_max_file = None
+        self.live_restore = False
+        self.shutdown_timeout = None
+        self.registry_mirrors = []
+        self.insecure_registries = []
+        self.persist_mirrors = False
+        self.compact = []
+        self.snapshot_capture = None
+        self.snapshot_restore = None
+        self.nice = None
+        self.ionice_class = None
+        self.ionice_level = None
+        self.cpu_weight = None
+        self.io_weight = None
+        self.cpu_quota = None
+        self.log_cap = None
+        self.log_rotate = None
+        self.log_compress = False
+        self.metrics_file = None
+        self.create_pool = False
+        self.pool_size = None
+        self.pool_chunk_size = None
+        self.pool_metadata_size = None
+        self.pool_zero = None
+        self.pool_autoextend_threshold = None
+        self.pool_autoextend_percent = None
+        self.dm_deferred_removal = False
+        self.dm_deferred_deletion = False
+        self.dm_blkdiscard = None
+        self.dm_basesize = None
+        self.dm_mountopt = None
+        self.dm_min_free_space = None
+        self.overlay2_size = None
+        self.btrfs_subvol = False
+        self.btrfs_compress = None
+        self.btrfs_noatime = False
+        self.btrfs_space_cache_v2 = False
+        self.btrfs_nodatacow = False
+        # Set in handle_header, when the addon is used
+        self.timer = None
+        self._early = None
+        self._daemon = None
+        self._daemon_log = None
+        self._snapshot = {}
+        self._auto_rates = OrderedDict()
+        self._pull_results = []
+        self._load_results = []
+        self._script_status = None
 
     def __str__(self):
         if not self.enabled:
             return ""
 
-        addon_str = self.storage.addon_str
-
+        if self.storage is None:
+            addon_str = "%%addon %s --auto" % self.name
+            if self.fstype != "xfs":
+                addon_str += ' --fstype="%s"' % self.fstype
+            if self.auto_probe:
+                addon_str += " --auto-probe"
+        else:
+            addon_str = self.storage.addon_str
+
+        if self.backend != "docker":
+            addon_str += " --backend=%s" % self.backend
         if self.save_args:
             addon_str += " --save-args"
+        for image in self.images:
+            addon_str += ' --pull="%s"' % image
+        for image, size in self.image_sizes.items():
+            addon_str += ' --image-size="%s=%s"' % (image, size)
+        if self.parallel_pulls != DEFAULT_PARALLEL_PULLS:
+            addon_str += " --parallel-pulls=%d" % self.parallel_pulls
+        if self.load_dir:
+            addon_str += ' --load-dir="%s"' % self.load_dir
+        if self.parallel_loads != DEFAULT_PARALLEL_LOADS:
+            addon_str += " --parallel-loads=%d" % self.parallel_loads
+        if self.trace_commands:
+            addon_str += " --trace-commands"
+        if self.early_start:
+            addon_str += " --early-start"
+        if self.reuse:
+            addon_str += " --reuse"
+        if self.max_concurrent_downloads:
+            addon_str += " --max-concurrent-downloads=%d" % self.max_concurrent_downloads
+        if self.max_concurrent_uploads:
+            addon_str += " --max-concurrent-uploads=%d" % self.max_concurrent_uploads
+        if self.container_log_max_size:
+            addon_str += ' --container-log-max-size="%s"' % self.container_log_max_size
+        if self.container_log_max_file:
+            addon_str += " --container-log-max-file=%d" % self.container_log_max_file
+        if self.live_restore:
+            addon_str += " --live-restore"
+        if self.shutdown_timeout is not None:
+            addon_str += " --shutdown-timeout=%d" % self.shutdown_timeout
+        for mirror in self.registry_mirrors:
+            addon_str += ' --registry-mirror="%s"' % mirror
+        for registry in self.insecure_registries:
+            addon_str += ' --insecure-registry="%s"' % registry
+        if self.persist_mirrors:
+            addon_str += " --persist-mirrors"
+        if self.compact:
+            addon_str += " --compact=%s" % ",".join(self.compact)
+        if self.snapshot_capture:
+            addon_str += ' --snapshot-capture="%s"' % self.snapshot_capture
+        if self.snapshot_restore:
+            addon_str += ' --snapshot-restore="%s"' % self.snapshot_restore
+        if self.nice is not None:
+            addon_str += " --nice=%d" % self.nice
+        if self.ionice_class:
+            addon_str += " --ionice-class=%s" % self.ionice_class
+        if self.ionice_level is not None:
+            addon_str += " --ionice-level=%d" % self.ionice_level
+        if self.cpu_weight is not None:
+            addon_str += " --cpu-weight=%d" % self.cpu_weight
+        if self.io_weight is not None:
+            addon_str += " --io-weight=%d" % self.io_weight
+        if self.cpu_quota:
+            addon_str += ' --cpu-quota="%s"' % self.cpu_quota
+        if self.log_cap:
+            addon_str += ' --log-cap="%s"' % self.log_cap
+        if self.log_rotate is not None:
+            addon_str += " --log-rotate=%d" % self.log_rotate
+        if self.log_compress:
+            addon_str += " --log-compress"
+        if self.metrics_file:
+            addon_str += ' --metrics-file="%s"' % self.metrics_file
         if self.extra_args:
             addon_str += " -- %s" % " ".join(self.extra_args)
         addon_str += "\n%s\n%%end\n" % self.content.strip()
 
+        # Once --auto has chosen, the concrete options are written out so that
+        # the kickstart makes the same choice again
+        if self.auto and self.storage is not None:
+            rates = ", ".join("%s %d bytes/s" % (d, r) for d, r in self._auto_rates.items())
+            addon_str = "# com_redhat_docker --auto chose %s%s\n" % \
+                        (self.storage.driver, " (probed %s)" % rates if rates else "") + addon_str
+
         return addon_str
 
     def setup(self, storage, ksdata, instClass, payload):
@@ -252,74 +926,128 @@ class DockerData(AddonData):
         if not self.enabled:
             return
 
-        if "docker" not in ksdata.packages.packageList:
-            raise KickstartParseError(formatErrorMsg(0, msg=_("%%package section is missing docker")))
+        with self.timer.phase("setup"):
+            if self.backend not in ksdata.packages.packageList:
+                raise KickstartParseError(formatErrorMsg(0, msg=_("%%package section is missing %s")) % self.backend)
 
-        self.storage.check_setup(storage, ksdata, instClass)
+            if self.storage is None:
+                with self.timer.phase("auto_select"):
+                    self._select_storage(storage)
 
-    def handle_header(self, lineno, args):
-        """ Handle the kickstart addon header
+            with self.timer.phase("check_setup"):
+                self.storage.check_setup(storage, ksdata, instClass)
 
-        :param lineno: Line number
-        :param args: arguments from %addon line
+            if self.snapshot_restore:
+                self._check_snapshot()
+
+            with self.timer.phase("check_capacity"):
+                self._check_capacity(storage)
+
+            if self.reuse and not self.storage.preserved(storage):
+                log.warning("com_redhat_docker --reuse: docker's storage is new, there are no images to reuse")
+
+            if self.early_start:
+                from com_redhat_docker.early import EarlyStart
+
+                (path, _device) = docker_root_device(storage, self.root)
+                self._early = EarlyStart(path or "/",
+                                         lambda docker: self._populate(docker, storage, ksdata, instClass, None, early=True))
+                self._early.start()
+
+    def _select_storage(self, storage):
+        """ Choose the storage class for --auto
+
+        :param storage: Blivet storage object
         """
-        # This gets called after __init__, very early in the installation.
-        op = KSOptionParser()
-        op.add_option("--vgname",
-                      help="Name of the VG that contains a thinpool named docker-pool")
-        op.add_option("--fstype",
-                      help="Type of filesystem for docker to use with the docker-pool")
-        op.add_option("--overlay", action="store_true",
-                      help="Use the overlay driver")
-        op.add_option("--btrfs", action="store_true",
-                      help="Use the BTRFS driver")
-        op.add_option("--save-args", action="store_true", default=False,
-                      help="Save all extra args to the OPTIONS variable in /etc/sysconfig/docker")
-        (opts, extra) = op.parse_args(args=args, lineno=lineno)
-
-        if sum(1 for v in [opts.overlay, opts.btrfs, opts.vgname] if bool(v)) != 1:
-            raise KickstartParseError(formatErrorMsg(lineno,
-                                                     msg=_("%%addon com_redhat_docker must choose one of --overlay, --btrfs, or --vgname")))
-
-        self.enabled = True
-        self.extra_args = extra
-        self.save_args = opts.save_args
-
-        if opts.overlay:
-            self.storage = OverlayStorage(self)
-        elif opts.btrfs:
-            self.storage = BTRFSStorage(self)
-        elif opts.vgname:
-            fmt = blivet.formats.get_format(opts.fstype)
-            if not fmt or fmt.type is None:
-                raise KickstartParseError(formatErrorMsg(lineno,
-                                                         msg=_("%%addon com_redhat_docker fstype of %s is invalid.")) % opts.fstype)
-
-            self.vgname = opts.vgname
-            self.fstype = opts.fstype
-            self.storage = LVMStorage(self)
+        from com_redhat_docker.auto import choose_storage
 
-    def execute(self, storage, ksdata, instClass, users, payload):
-        """ Execute the addon
+        (choice, self._auto_rates) = choose_storage(storage, self.root, self.backend, self.fstype, self.auto_probe)
+        for driver, rate in self._auto_rates.items():
+            self.timer.record("auto_probe_%s" % driver, rate)
+        if choice.storage_class is LVMStorage:
+            self.vgname = choice.vgname
+        self.storage = choice.storage_class(self)
+        self.timer.record("auto_driver", self.storage.driver)
+        log.info("com_redhat_docker --auto chose %s on %s", self.storage.driver, choice.device.name)
+
+    def _check_capacity(self, storage):
+        """ Make sure the images will fit in docker's storage
 
         :param storage: Blivet storage object
-        :param ksdata: Kickstart data object
-        :param instClass: Anaconda installclass object
-        :param users: Anaconda users object
-        :param payload: object managing packages and environment groups
-                        for the installation
+
+        The space needed is estimated from the --image-size of the pulled images,
+        the archives in --load-dir and the size of a --snapshot-restore snapshot.
+        Images without a size are not counted.
         """
-        if not self.enabled:
+        import tarfile
+        from blivet.size import Size
+        from com_redhat_docker.archives import estimate_archive_size, find_archives
+
+        needed = Size(0)
+        for image in self.images:
+            if image in self.image_sizes:
+                needed += Size(self.image_sizes[image])
+            else:
+                log.warning("com_redhat_docker has no --image-size for %s, it is not counted in the space needed", image)
+        if self.snapshot_restore and self._snapshot.get("unpacked_bytes"):
+            needed += Size(self._snapshot["unpacked_bytes"])
+        if self.load_dir:
+            try:
+                for archive in find_archives(self.load_dir, layouts=self.backend == "podman"):
+                    needed += Size(estimate_archive_size(archive))
+            except (OSError, tarfile.TarError) as e:
+                log.warning("com_redhat_docker could not estimate the size of the archives in %s: %s", self.load_dir, e)
+        if not needed:
             return
 
-        log.info("Executing docker addon")
-        # This gets called after installation, before initramfs regeneration and kickstart %post scripts.
-        execWithRedirect("mount", ["-o", "bind", getSysroot()+"/var/lib/docker", "/var/lib/docker"])
-        execWithRedirect("mount", ["-o", "bind", getSysroot()+"/etc/docker", "/etc/docker"])
+        available = self.storage.capacity(storage)
+        if available is None:
+            log.warning("com_redhat_docker cannot tell how much space there is for %s of images", needed)
+            return
+
+        (size, where) = available
+        needed = Size(int(needed) * (100 + CAPACITY_MARGIN) // 100)
+        log.info("com_redhat_docker images need about %s, %s has %s", needed, where, size)
+        if needed > size:
+            raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker images need about %s but %s only has %s")) % (needed, where, size))
+
+    def _check_snapshot(self):
+        """ Make sure the --snapshot-restore snapshot is there and is for the storage driver """
+        from com_redhat_docker.snapshot import read_manifest, SnapshotError
+
+        try:
+            self._snapshot = read_manifest(self.snapshot_restore)
+        except SnapshotError as e:
+            raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker --snapshot-restore: %s")) % e)
+        if not os.path.isfile(self.snapshot_restore):
+            raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker --snapshot-restore %s is missing")) % self.snapshot_restore)
+        if self._snapshot["driver"] != self.storage.driver:
+            raise KickstartParseError(formatErrorMsg(0, msg=_("%%addon com_redhat_docker --snapshot-restore %s is for the %s driver, not %s")) %
+                                      (self.snapshot_restore, self._snapshot["driver"], self.storage.driver))
+
+    def _populate(self, docker, storage, ksdata, instClass, users, early=False):
+        """ Start the daemon, then load and pull the images
+
+        :param str docker: The docker binary to run
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+        :param users: Anaconda users object, None when run early
+        :param bool early: Run while the packages are installed, by --early-start
 
-        # Start up the docker daemon
-        log.debug("Starting docker daemon")
-        docker_cmd = ["docker", "daemon"]
+        The daemon is left running for the script, execute stops it.
+        """
+        from pyanaconda.iutil import getSysroot
+        from com_redhat_docker.archives import load_archives
+        from com_redhat_docker.daemon import DockerDaemon
+        from com_redhat_docker.images import pull_images
+        from com_redhat_docker.logs import LogPipe
+        from concurrent.futures import ThreadPoolExecutor
+        from com_redhat_docker.progress import ProgressReporter
+        from com_redhat_docker.reuse import stored_drivers
+        from com_redhat_docker.sched import effective
+
+        docker_cmd = self.scheduling.prefix() + [docker, "daemon"]
         if ksdata.selinux.selinux:
             docker_cmd += ["--selinux-enabled"]
 
@@ -327,35 +1055,466 @@ class DockerData(AddonData):
         docker_cmd += self.storage.docker_cmd(storage, ksdata, instClass, users)
 
         docker_cmd += ["--ip-forward=false", "--iptables=false"]
+        docker_cmd += self.mirror_args
         docker_cmd += self.extra_args
-        docker_proc = startProgram(docker_cmd, stdout=open("/tmp/docker-daemon.log", "w"), reset_lang=True)
 
-        log.debug("Running docker commands")
-        script = AnacondaKSScript(self.content, inChroot=False, logfile="/tmp/docker-addon.log")
-        script.run("/")
+        # /etc/docker is bind mounted, so the install-time daemon reads the
+        # same daemon.json as the installed system.
+        self._write_daemon_json()
+
+        # The logs are streamed to the target as they are written, nothing
+        # but a small tail of each is kept in the installer's memory.
+        self._daemon_log = LogPipe(self._log_sink(getSysroot()+LOG_DIR+"docker-daemon.log"))
+        self._daemon = DockerDaemon(docker_cmd, self._daemon_log)
+        with self.timer.phase("mount"):
+            self._daemon.mount()
+        if self.reuse:
+            drivers = stored_drivers(getSysroot()+"/var/lib/docker")
+            if drivers and self.storage.driver not in drivers:
+                log.warning("com_redhat_docker --reuse: /var/lib/docker has %s images, they cannot be used with the %s driver",
+                            ", ".join(drivers), self.storage.driver)
+            elif self.storage.driver == "devicemapper" and "devicemapper" not in drivers \
+                    and self.storage.preserved(storage):
+                log.error("com_redhat_docker --reuse: docker-pool is kept but /var/lib/docker/image/devicemapper "
+                          "is missing, the images in the pool cannot be used")
+        with self.timer.phase("prepare"):
+            self.storage.prepare(storage, ksdata, instClass, users)
+        # Run early, the installer's own progress messages are left alone
+        if not early:
+            from pyanaconda.progress import progress_message
+            progress_message(_("Starting the docker daemon"))
+        with self.timer.phase("daemon_start"):
+            if not self._daemon.start():
+                log.error("docker daemon output:\n%s", self._daemon_log.sink.tail())
+        if self._daemon.running and self.scheduling.used:
+            log.info("docker daemon scheduling: requested %s; effective %s",
+                     self.scheduling, effective(self._daemon.pid))
+        self.timer.record("daemon_startup_latency", self._daemon.startup_time)
+
+        if self.load_dir:
+            with self.timer.phase("load"):
+                self._load_results = load_archives(self.load_dir, self.parallel_loads, self._daemon.socket_path,
+                                                   ProgressReporter(_("Loading docker images"), 0, ui=not early))
+        images = self.images
+        if images and self.reuse:
+            with self.timer.phase("inventory"):
+                images = self._missing_images()
+        if images:
+            lookup = None
+            if self.registry_mirrors:
+                # The mirrors are asked for the images while they are pulled, an
+                # unreachable mirror doesn't hold up the pulls
+                lookup = ThreadPoolExecutor(max_workers=1)
+                sources = lookup.submit(self._lookup_sources, images)
+            try:
+                with self.timer.phase("pull"):
+                    self._pull_results = pull_images(images, self.parallel_pulls, self._daemon.socket_path,
+                                                     ProgressReporter(_("Pulling docker images"), len(set(images)),
+                                                                      ui=not early))
+                if lookup:
+                    self._report_sources(sources, self._pull_results)
+            finally:
+                if lookup:
+                    lookup.shutdown()
+
+    def _write_daemon_json(self):
+        """ Merge the daemon.json settings from the header into the target's daemon.json """
+        from pyanaconda.iutil import getSysroot
+        from com_redhat_docker.config import DAEMON_JSON, merge_daemon_json
+
+        if not self.daemon_json:
+            return
+        with self.timer.phase("daemon_json"):
+            try:
+                merge_daemon_json(getSysroot()+DAEMON_JSON, self.daemon_json)
+            except (IOError, ValueError) as e:
+                log.error("Error updating %s: %s", DAEMON_JSON, e)
+
+    def _stop_daemon(self):
+        """ Stop the daemon started by _populate, unmount its directories and close its log """
+        if not self._daemon:
+            return
+        with self.timer.phase("daemon_stop"):
+            self._daemon.stop()
+        with self.timer.phase("umount"):
+            self._daemon.umount()
+        with self.timer.phase("close_logs"):
+            self._daemon_log.close()
+        self._daemon = None
+
+    def _missing_images(self):
+        """ Return the --pull images the daemon doesn't already have
+
+        The reused and pulled images are logged and recorded. If the daemon
+        cannot be asked for its images they are all pulled.
+        """
+        from com_redhat_docker import api
+        from com_redhat_docker.reuse import inventory, split_present
+
+        try:
+            present = inventory(self._daemon.socket_path)
+        except (OSError, ValueError, api.DockerAPIError) as e:
+            log.error("Listing the existing docker images failed, pulling all of them: %s", e)
+            present = set()
+        (reused, missing) = split_present(self.images, present)
+        self.timer.record("reused_images", len(reused))
+        self.timer.record("pulled_images", len(missing))
+        log.info("docker images: %d reused (%s), %d to pull (%s)",
+                 len(reused), ", ".join(reused) or "none", len(missing), ", ".join(missing) or "none")
+        return missing
+
+    def _restore_snapshot(self):
+        """ Restore the target's /var/lib/docker from the --snapshot-restore snapshot
+
+        :returns: True if it was restored, False if the daemon has to be run as usual
+        :rtype: bool
+        """
+        from pyanaconda.iutil import getSysroot
+        from com_redhat_docker.snapshot import restore, SnapshotError
+
+        try:
+            stats = restore(self.snapshot_restore, getSysroot()+"/var/lib/docker")
+        except (OSError, SnapshotError) as e:
+            log.error("Restoring the docker snapshot failed, running the docker commands instead: %s", e)
+            return False
+        self.timer.record("snapshot_restore_bytes", stats["compressed_bytes"])
+        self.timer.record("snapshot_restore_rate", stats["compressed_bytes"] / max(stats["elapsed"], 1e-6))
+        return True
+
+    def _capture_snapshot(self):
+        """ Save the target's /var/lib/docker to the --snapshot-capture directory """
+        from pyanaconda.iutil import getSysroot
+        from com_redhat_docker.snapshot import capture, SnapshotError
+
+        try:
+            manifest = capture(getSysroot()+"/var/lib/docker", self.snapshot_capture, self.storage.driver)
+        except (OSError, SnapshotError) as e:
+            log.error("Capturing the docker snapshot failed: %s", e)
+            return
+        self.timer.record("snapshot_capture_bytes", manifest["compressed_bytes"])
+        log.info("docker snapshot for --snapshot-restore: %s", manifest["path"])
+
+    def _run_script(self, logdir):
+        """ Run the commands in the section
+
+        :param str logdir: Directory on the target for the logs
+        """
+        from pyanaconda.progress import progress_message
+        from com_redhat_docker.logs import LogFifo
+        from com_redhat_docker.trace import TracedScript
+
+        progress_message(_("Running the docker addon commands"))
+        with self.timer.phase("script"):
+            script_log = LogFifo(self._log_sink(logdir+"docker-addon.log"), "/tmp/docker-addon.log")
+            try:
+                if self.trace_commands:
+                    script = TracedScript(self.content, script_log.path, self.scheduling.priority_prefix())
+                    rc = script.run()
+                    script.write_report(logdir+"docker-addon-commands.log")
+                else:
+                    rc = self._run_shell(script_log.path)
+            finally:
+                script_log.close()
+            self._script_status = rc
+            if rc:
+                log.error("docker addon script output:\n%s", script_log.sink.tail())
+
+    def _run_shell(self, logfile):
+        """ Run the commands in the section with /bin/sh
+
+        :param str logfile: Path to write the output to
+        :returns: The exit status of the commands
+        :rtype: int
+
+        This is how anaconda runs a %post --nochroot script, but
+        AnacondaKSScript.run doesn't return the status so it is run here.
+        """
+        import tempfile
+        from pyanaconda.iutil import execWithRedirect
+
+        (fd, path) = tempfile.mkstemp("", "ks-script-", "/tmp")
+        os.write(fd, (self.scheduling.script_prelude() + self.content).encode("utf-8"))
+        os.close(fd)
+        os.chmod(path, 0o700)
+        try:
+            with open(logfile, "w") as fp:
+                rc = execWithRedirect("/bin/sh", [path], stdout=fp)
+        finally:
+            os.unlink(path)
+
+        if rc != 0:
+            log.error("Error code %s running the docker addon script", rc)
+        return rc
+
+    def _run_podman(self, storage, ksdata, instClass, users, logdir):
+        """ Seed the target's containers-storage with podman and run the commands
+
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+        :param users: Anaconda users object
+        :param str logdir: Directory on the target for the logs
+        """
+        from pyanaconda.iutil import getSysroot
+        from com_redhat_docker.podman import Podman, STORAGE_CONF, write_storage_conf
+        from com_redhat_docker.progress import ProgressReporter
+
+        podman = Podman(self.scheduling.priority_prefix())
+        (driver, options) = self.storage.containers_storage
+        try:
+            with self.timer.phase("mount"):
+                podman.mount()
+            with self.timer.phase("storage_conf"):
+                write_storage_conf(getSysroot()+STORAGE_CONF, driver, options)
+            with self.timer.phase("prepare"):
+                self.storage.prepare(storage, ksdata, instClass, users)
+            if self.load_dir:
+                with self.timer.phase("load"):
+                    self._load_results = podman.load_archives(self.load_dir, self.parallel_loads,
+                                                              ProgressReporter(_("Loading container images"), 0))
+            if self.images:
+                with self.timer.phase("pull"):
+                    self._pull_results = podman.pull_images(self.images, self.parallel_pulls,
+                                                            ProgressReporter(_("Pulling container images"),
+                                                                             len(set(self.images))))
+
+            log.debug("Running podman commands")
+            self._run_script(logdir)
+        finally:
+            with self.timer.phase("umount"):
+                podman.umount()
+
+    def _write_docker_configs(self, storage, ksdata, instClass, users):
+        """ Write the storage configs and rewrite the OPTIONS in /etc/sysconfig/docker
 
-        # Kill the docker process
-        log.debug("Shutting down docker daemon")
-        docker_proc.kill()
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+        :param users: Anaconda users object
+        """
+        from pyanaconda.iutil import getSysroot
+        from pyanaconda.simpleconfig import SimpleConfigFile
 
         log.debug("Writing docker configs")
-        self.storage.write_configs(storage, ksdata, instClass, users)
+        with self.timer.phase("write_configs"):
+            self.storage.write_configs(storage, ksdata, instClass, users)
 
         # Rewrite the OPTIONS entry with the extra args and/or storage specific changes
+        with self.timer.phase("options"):
+            try:
+                docker_cfg = SimpleConfigFile(getSysroot()+"/etc/sysconfig/docker")
+                docker_cfg.read()
+                options = self.storage.options(docker_cfg.get("OPTIONS"))
+                if "log-driver" in self.daemon_json:
+                    log.info("Removing --log-driver from docker OPTIONS, it is set in daemon.json")
+                    options = re.sub(r"--log-driver(=|\s+)\S+", "", options)
+                if self.save_args:
+                    log.info("Adding extra args to docker OPTIONS")
+                    options += " " + " ".join(self.extra_args)
+                docker_cfg.set(("OPTIONS", options))
+                docker_cfg.write()
+            except IOError as e:
+                log.error("Error updating OPTIONS in /etc/sysconfig/docker: %s", e)
+
+    def _write_metrics(self, storage):
+        """ Write the install-time metrics to a Prometheus textfile on the target
+
+        :param storage: Blivet storage object
+        """
+        from pyanaconda.iutil import getSysroot
+        from com_redhat_docker.metrics import METRICS_FILE, install_metrics, thin_pool_usage
+
+        pool_usage = thin_pool_usage(self.vgname) if isinstance(self.storage, LVMStorage) else None
+        metrics = install_metrics(self.timer, self.storage.driver, self.backend,
+                                  self._pull_results, self._load_results, pool_usage, self._script_status)
+        try:
+            metrics.write(getSysroot()+(self.metrics_file or METRICS_FILE))
+        except IOError as e:
+            log.error("Error writing docker addon metrics: %s", e)
+
+    def _compact(self, storage, ksdata, instClass, users):
+        """ Remove unused docker objects and discard the space they used
+
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+        :param users: Anaconda users object
+        """
+        from com_redhat_docker.compact import compact
+
+        reclaimed = compact(self.compact, self._daemon.socket_path)
+        discarded = self.storage.discard(storage, ksdata, instClass, users)
+        self.timer.record("compact_reclaimed_bytes", reclaimed)
+        self.timer.record("compact_discarded_bytes", discarded)
+        log.info("docker compaction reclaimed %d bytes", reclaimed)
+
+    def _lookup_sources(self, images):
+        """ Return the PullSource of each image, timed as the mirror_lookup phase
+
+        :param list images: Image references being pulled
+        """
+        from com_redhat_docker.mirrors import pull_sources
+
+        with self.timer.phase("mirror_lookup"):
+            return pull_sources(images, self.registry_mirrors, self.parallel_pulls)
+
+    def _report_sources(self, sources, results):
+        """ Log and record how much of the pulls came from the mirrors
+
+        :param sources: Future of the PullSource list from _lookup_sources
+        :param list results: PullResult for each pulled image
+
+        The lookup only feeds the metrics, if it failed nothing is recorded.
+        """
+        from com_redhat_docker.mirrors import source_totals
+
+        try:
+            totals = source_totals(sources.result(), results)
+        except Exception as e:  # pylint: disable=broad-except
+            log.error("Looking up the images on the registry mirrors failed: %s", e)
+            return
+        for name, value in totals._asdict().items():
+            self.timer.record(name, value)
+        log.info("docker pulls: %d images, %d bytes from registry mirrors; %d images, %d bytes from upstream registries",
+                 *totals)
+
+    def _log_sink(self, path):
+        """ Return a LogSink for path using the --log-* options
+
+        :param str path: Path of the log on the target system
+        """
+        from blivet.size import Size
+        from com_redhat_docker.logs import LogSink, DEFAULT_LOG_CAP, DEFAULT_LOG_ROTATE
+
+        cap = int(Size(self.log_cap)) if self.log_cap else DEFAULT_LOG_CAP
+        rotate = DEFAULT_LOG_ROTATE if self.log_rotate is None else self.log_rotate
+        return LogSink(path, cap, rotate, self.log_compress)
+
+    def handle_header(self, lineno, args):
+        """ Handle the kickstart addon header
+
+        :param lineno: Line number
+        :param args: arguments from %addon line
+        """
+        # This gets called after __init__, very early in the installation.
+        from com_redhat_docker.header import handle_header
+
+        handle_header(self, lineno, args)
+
+    @property
+    def daemon_json(self):
+        """ Return the daemon.json settings from the header options
+
+        :rtype: OrderedDict
+        """
+        settings = OrderedDict()
+        if self.max_concurrent_downloads:
+            settings["max-concurrent-downloads"] = self.max_concurrent_downloads
+        if self.max_concurrent_uploads:
+            settings["max-concurrent-uploads"] = self.max_concurrent_uploads
+        if self.container_log_max_size or self.container_log_max_file:
+            settings["log-driver"] = "json-file"
+            settings["log-opts"] = OrderedDict()
+            if self.container_log_max_size:
+                settings["log-opts"]["max-size"] = self.container_log_max_size
+            if self.container_log_max_file:
+                settings["log-opts"]["max-file"] = str(self.container_log_max_file)
+        if self.live_restore:
+            settings["live-restore"] = True
+        if self.shutdown_timeout is not None:
+            settings["shutdown-timeout"] = self.shutdown_timeout
+        if self.persist_mirrors and self.registry_mirrors:
+            settings["registry-mirrors"] = self.registry_mirrors
+        if self.persist_mirrors and self.insecure_registries:
+            settings["insecure-registries"] = self.insecure_registries
+        return settings
+
+    @property
+    def root(self):
+        """ Return the target path of the backend's storage """
+        return BACKEND_ROOTS[self.backend]
+
+    @property
+    def scheduling(self):
+        """ Return the Scheduling for the daemon and script """
+        from com_redhat_docker.sched import Scheduling
+
+        return Scheduling(self.nice, self.ionice_class, self.ionice_level,
+                          self.cpu_weight, self.io_weight, self.cpu_quota)
+
+    @property
+    def mirror_args(self):
+        """ Return the daemon arguments for mirrors that are only used during installation """
+        if self.persist_mirrors:
+            return []
+        return ["--registry-mirror=%s" % m for m in self.registry_mirrors] + \
+               ["--insecure-registry=%s" % r for r in self.insecure_registries]
+
+    def execute(self, storage, ksdata, instClass, users, payload):
+        """ Execute the addon
+
+        :param storage: Blivet storage object
+        :param ksdata: Kickstart data object
+        :param instClass: Anaconda installclass object
+        :param users: Anaconda users object
+        :param payload: object managing packages and environment groups
+                        for the installation
+        """
+        if not self.enabled:
+            return
+
+        log.info("Executing docker addon")
+        # This gets called after installation, before initramfs regeneration and kickstart %post scripts.
+        import time
+        from pyanaconda.iutil import getSysroot
+
+        logdir = getSysroot()+LOG_DIR
+        restored = False
+        if self.backend == "docker" and self.snapshot_restore:
+            with self.timer.phase("snapshot_restore"):
+                restored = self._restore_snapshot()
+
+        if self.backend == "podman":
+            self._run_podman(storage, ksdata, instClass, users, logdir)
+        elif restored:
+            self._write_daemon_json()
+            if self.content.strip():
+                log.info("Not running the docker commands, /var/lib/docker was restored from %s", self.snapshot_restore)
+        else:
+            try:
+                if self._early and self._early.finish():
+                    self.timer.record("early_start_lead", time.monotonic() - self._early.started)
+                    if self._early.error or not (self._daemon and self._daemon.running):
+                        log.error("Loading and pulling the images early failed, starting docker again: %s",
+                                  self._early.error or "the daemon is not running")
+                        self._stop_daemon()
+                        # The new daemon's log would replace the only record of the failure
+                        if self._daemon_log:
+                            self._daemon_log.sink.move(logdir+"docker-daemon-early.log")
+                        self._populate("docker", storage, ksdata, instClass, users)
+                else:
+                    self._populate("docker", storage, ksdata, instClass, users)
+
+                log.debug("Running docker commands")
+                self._run_script(logdir)
+
+                if self.compact:
+                    with self.timer.phase("compact"):
+                        self._compact(storage, ksdata, instClass, users)
+            finally:
+                self._stop_daemon()
+
+            if self.snapshot_capture:
+                with self.timer.phase("snapshot_capture"):
+                    self._capture_snapshot()
+
+        if self.backend == "docker":
+            self._write_docker_configs(storage, ksdata, instClass, users)
+
+        log.info(self.timer.summary())
         try:
-            docker_cfg = SimpleConfigFile(getSysroot()+"/etc/sysconfig/docker")
-            docker_cfg.read()
-            options = self.storage.options(docker_cfg.get("OPTIONS"))
-            if self.save_args:
-                log.info("Adding extra args to docker OPTIONS")
-                options += " " + " ".join(self.extra_args)
-            docker_cfg.set(("OPTIONS", options))
-            docker_cfg.write()
+            self.timer.write(logdir+"docker-addon-timing.json")
         except IOError as e:
-            log.error("Error updating OPTIONS in /etc/sysconfig/docker: %s", e)
+            log.error("Error writing docker addon timing: %s", e)
 
-        # Copy the log files to the system
-        dstdir = "/var/log/anaconda/"
-        os.makedirs(dstdir, exist_ok=True)
-        for l in ["docker-daemon.log", "docker-addon.log"]:
-            shutil.copy2("/tmp/"+l, dstdir+l)
+        self._write_metrics(storage)
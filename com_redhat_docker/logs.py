@@ -0,0 +1,240 @@
+#pylint: disable=missing-docstring
+'''
+Size capped log streaming to the target system
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import errno
+import gzip
+import os
+import threading
+import time
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["LogSink", "LogPipe", "LogFifo", "DEFAULT_LOG_CAP", "DEFAULT_LOG_ROTATE"]
+
+# Bytes of output written to a log before it is rotated, and rotated logs kept
+DEFAULT_LOG_CAP = 64 * 1024**2
+DEFAULT_LOG_ROTATE = 2
+
+# Bytes of the most recent output kept in memory for error messages
+RING_SIZE = 16 * 1024
+
+READ_SIZE = 64 * 1024
+
+# Seconds to wait for the writers of a pipe to go away when it is closed
+CLOSE_TIMEOUT = 10
+
+class LogSink(object):
+    """ A log file with a size cap, rotation and optional gzip compression
+
+    The cap applies to the uncompressed output. When it is reached the log is
+    renamed to log.1, log.1 to log.2 and so on, keeping rotate old logs. Only
+    the last RING_SIZE bytes are held in memory, for tail.
+    """
+    def __init__(self, path, cap=DEFAULT_LOG_CAP, rotate=DEFAULT_LOG_ROTATE, compress=False,
+                 ring_size=RING_SIZE):
+        """ :param str path: Path of the log, .gz is appended when compressing
+            :param int cap: Bytes to write before rotating, or None for no cap
+            :param int rotate: Number of rotated logs to keep
+            :param bool compress: gzip the log as it is written
+            :param int ring_size: Bytes of recent output to keep in memory
+        """
+        self.base = path
+        self.cap = cap
+        self.rotate = rotate
+        self.compress = compress
+        self.ring_size = ring_size
+        self.written = 0
+        self.rotations = 0
+        self._ring = bytearray()
+        self._fp = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        """ Path of the current log """
+        return self._name(0)
+
+    def _name(self, n):
+        return self.base + (".%d" % n if n else "") + (".gz" if self.compress else "")
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.base), exist_ok=True)
+        if self.compress:
+            self._fp = gzip.open(self.path, "wb", compresslevel=1)
+        else:
+            self._fp = open(self.path, "wb")
+        self._size = 0
+
+    def _rotate(self):
+        self._fp.close()
+        self._fp = None
+        if self.rotate:
+            for n in range(self.rotate - 1, -1, -1):
+                if os.path.exists(self._name(n)):
+                    os.replace(self._name(n), self._name(n + 1))
+        self.rotations += 1
+
+    def write(self, data):
+        """ Write output to the log
+
+        :param bytes data: The output
+        """
+        with self._lock:
+            self._ring += data
+            del self._ring[:-self.ring_size]
+            self.written += len(data)
+            while data:
+                if self._fp is None:
+                    self._open()
+                elif self.cap and self._size >= self.cap:
+                    self._rotate()
+                    continue
+                chunk = data[:self.cap - self._size] if self.cap else data
+                self._fp.write(chunk)
+                self._size += len(chunk)
+                data = data[len(chunk):]
+
+    def move(self, path):
+        """ Move the closed log and its rotated logs
+
+        :param str path: The new path of the log, as passed to LogSink
+        """
+        old = [self._name(n) for n in range(self.rotate + 1)]
+        self.base = path
+        for n, name in enumerate(old):
+            if os.path.exists(name):
+                os.replace(name, self._name(n))
+
+    def tail(self):
+        """ Return the most recent output
+
+        :rtype: str
+        """
+        with self._lock:
+            return self._ring.decode("utf-8", "replace")
+
+    def close(self):
+        """ Close the log, creating it if nothing was written """
+        with self._lock:
+            if self._fp is None:
+                self._open()
+            self._fp.close()
+            self._fp = None
+
+class _LogPump(object):
+    """ Copies the output read from a file descriptor to a LogSink in a thread """
+    def __init__(self, sink):
+        """ :param LogSink sink: Where to write the output """
+        self.sink = sink
+        self.name = sink.path
+        self._thread = None
+
+    def _start(self, target, *args):
+        self._thread = threading.Thread(target=target, args=args, daemon=True)
+        self._thread.start()
+
+    def _copy(self, fd):
+        try:
+            while True:
+                data = os.read(fd, READ_SIZE)
+                if not data:
+                    break
+                self.sink.write(data)
+        except OSError as e:
+            log.error("Error writing %s: %s", self.sink.path, e)
+        finally:
+            os.close(fd)
+
+    def _join(self, timeout):
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            log.warning("Output is still being written to %s, giving up on it", self.sink.path)
+        else:
+            self.sink.close()
+
+class LogPipe(_LogPump):
+    """ A pipe for a process's stdout, streamed to a LogSink
+
+    Pass the LogPipe as the stdout of the process and close it once the
+    process has exited.
+    """
+    def __init__(self, sink):
+        _LogPump.__init__(self, sink)
+        rfd, self._wfd = os.pipe()
+        self._start(self._copy, rfd)
+
+    def fileno(self):
+        """ The writing end of the pipe """
+        return self._wfd
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """ Close the writing end and wait for the output to be written
+
+        :param float timeout: Seconds to wait for other writers to close the pipe
+        """
+        if self._wfd is not None:
+            os.close(self._wfd)
+            self._wfd = None
+            self._join(timeout)
+
+class LogFifo(_LogPump):
+    """ A named pipe streamed to a LogSink, for programs that open a log by name
+
+    Everything written by the programs that open the fifo up to close is
+    written to the sink.
+    """
+    def __init__(self, sink, path):
+        """ :param LogSink sink: Where to write the output
+            :param str path: Path of the fifo to create
+        """
+        _LogPump.__init__(self, sink)
+        self.path = path
+        self._opened = threading.Event()
+        if os.path.lexists(path):
+            os.unlink(path)
+        os.mkfifo(path, 0o600)
+        self._start(self._open_and_copy)
+
+    def _open_and_copy(self):
+        fd = os.open(self.path, os.O_RDONLY)
+        self._opened.set()
+        self._copy(fd)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """ Wait for the output to be written and remove the fifo
+
+        :param float timeout: Seconds to wait for the writers to close the fifo
+        """
+        if self._thread is None:
+            return
+        # Nothing ever opened the fifo, open it so the reader sees an empty log
+        while self._thread.is_alive() and not self._opened.is_set():
+            try:
+                os.close(os.open(self.path, os.O_WRONLY | os.O_NONBLOCK))
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    raise
+                time.sleep(0.01)
+        self._join(timeout)
+        self._thread = None
+        os.unlink(self.path)
@@ -0,0 +1,176 @@
+#pylint: disable=missing-docstring
+'''
+Prometheus textfile export of the install-time metrics
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from collections import OrderedDict
+import os
+import tempfile
+import time
+
+from pyanaconda.iutil import execWithCapture
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["METRICS_FILE", "METRIC_PREFIX", "Metrics", "thin_pool_usage", "install_metrics"]
+
+# Where the metrics are written on the target unless --metrics-file is passed
+METRICS_FILE = "/var/log/anaconda/docker-addon.prom"
+
+METRIC_PREFIX = "docker_anaconda_addon_"
+
+def _escape(value):
+    """ Escape a label value for the text exposition format """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+class Metrics(object):
+    """ Gauges written in the Prometheus text exposition format
+
+    The file is meant for node_exporter's textfile collector, so every metric
+    is a gauge describing the installation, and samples of the same metric
+    are written together under one HELP and TYPE line.
+    """
+    def __init__(self, prefix=METRIC_PREFIX):
+        """ :param str prefix: Prefix of every metric name """
+        self.prefix = prefix
+        self._metrics = OrderedDict()
+
+    def add(self, name, help_text, value, labels=None):
+        """ Add a sample
+
+        :param str name: Metric name, without the prefix
+        :param str help_text: Description of the metric
+        :param value: The value, a sample with None is skipped
+        :param dict labels: Label names and values
+        """
+        if value is None:
+            return
+        (_help, samples) = self._metrics.setdefault(self.prefix + name, (help_text, []))
+        samples.append((labels or {}, value))
+
+    def text(self):
+        """ Return the metrics in the text exposition format
+
+        :rtype: str
+        """
+        lines = []
+        for name, (help_text, samples) in self._metrics.items():
+            lines.append("# HELP %s %s" % (name, help_text.replace("\\", "\\\\").replace("\n", "\\n")))
+            lines.append("# TYPE %s gauge" % name)
+            for labels, value in samples:
+                if labels:
+                    label_str = ",".join('%s="%s"' % (k, _escape(v)) for k, v in labels.items())
+                    lines.append("%s{%s} %s" % (name, label_str, _format(value)))
+                else:
+                    lines.append("%s %s" % (name, _format(value)))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """ Write the metrics, replacing the file atomically
+
+        :param str path: Path of the .prom file
+
+        The collector may read the file at any time, so it is written next to
+        the old one and renamed over it.
+        """
+        dirname = os.path.dirname(path)
+        os.makedirs(dirname, exist_ok=True)
+        (fd, tmp) = tempfile.mkstemp(".tmp", ".docker-addon-", dirname)
+        try:
+            with os.fdopen(fd, "w") as fp:
+                fp.write(self.text())
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        log.info("Wrote %d metrics to %s", len(self._metrics), path)
+
+def thin_pool_usage(vgname):
+    """ Return a docker-pool's usage as reported by lvs
+
+    :param str vgname: Name of the VG holding the docker-pool
+    :returns: data and metadata usage ratios and sizes in bytes, or None if lvs failed
+    :rtype: OrderedDict or None
+    """
+    output = execWithCapture("lvs", ["--noheadings", "--nosuffix", "--units", "b",
+                                     "-o", "data_percent,metadata_percent,lv_size,lv_metadata_size",
+                                     "%s/docker-pool" % vgname])
+    try:
+        # lvs uses the locale's decimal separator
+        values = [float(f.replace(",", ".")) for f in (output or "").split()]
+    except ValueError:
+        values = []
+    if len(values) != 4:
+        log.warning("Could not read the usage of %s/docker-pool: %s", vgname, (output or "").strip())
+        return None
+    return OrderedDict([("data_ratio", values[0] / 100), ("metadata_ratio", values[1] / 100),
+                        ("data_bytes", int(values[2])), ("metadata_bytes", int(values[3]))])
+
+def install_metrics(timer, driver, backend, pulls, loads, pool_usage, script_status):
+    """ Return the metrics of an installation
+
+    :param timer: The addon's PhaseTimer
+    :param str driver: Storage driver
+    :param str backend: docker or podman
+    :param list pulls: PullResult of each pulled image
+    :param list loads: LoadResult of each loaded archive, an archive may hold several images
+    :param dict pool_usage: docker-pool usage from thin_pool_usage, or None
+    :param int script_status: Exit status of the section, or None if it wasn't run
+    :rtype: Metrics
+    """
+    metrics = Metrics()
+    metrics.add("info", "Storage driver and backend used by the addon", 1,
+                OrderedDict([("driver", driver), ("backend", backend)]))
+    metrics.add("timestamp_seconds", "When the addon finished, in seconds since the epoch", time.time())
+    for phase, secs in timer.phases.items():
+        metrics.add("phase_duration_seconds", "Time spent in each phase of the addon", secs, {"phase": phase})
+    metrics.add("daemon_startup_latency_seconds", "Time the docker daemon took to answer",
+                timer.values.get("daemon_startup_latency"))
+
+    images_help = "Number of images pulled, loaded or reused"
+    metrics.add("images", images_help, sum(1 for r in pulls if not r.error), {"source": "pull"})
+    metrics.add("images", images_help, sum(len(r.images) for r in loads if r.ok), {"source": "load"})
+    metrics.add("images", images_help, timer.values.get("reused_images"), {"source": "reuse"})
+    metrics.add("image_failures", "Number of images that could not be pulled and archives that could not be loaded",
+                sum(1 for r in pulls if r.error) + sum(1 for r in loads if not r.ok))
+    for result in pulls:
+        if not result.error:
+            metrics.add("image_pulled_bytes", "Bytes downloaded for each pulled image", result.size,
+                        {"image": result.image})
+
+    if pool_usage:
+        metrics.add("thin_pool_data_usage_ratio", "Used fraction of the docker-pool's data",
+                    pool_usage["data_ratio"])
+        metrics.add("thin_pool_metadata_usage_ratio", "Used fraction of the docker-pool's metadata",
+                    pool_usage["metadata_ratio"])
+        metrics.add("thin_pool_data_size_bytes", "Size of the docker-pool's data", pool_usage["data_bytes"])
+        metrics.add("thin_pool_metadata_size_bytes", "Size of the docker-pool's metadata",
+                    pool_usage["metadata_bytes"])
+
+    metrics.add("script_exit_status", "Exit status of the commands in the section", script_status)
+    return metrics
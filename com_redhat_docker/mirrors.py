@@ -0,0 +1,166 @@
+#pylint: disable=missing-docstring
+'''
+Registry mirror accounting for install-time pulls
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+from urllib.parse import urlsplit
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["PullSource", "SourceTotals", "split_reference", "manifest_size", "pull_sources", "source_totals"]
+
+# Where an image is expected to be pulled from, and its size on the mirror if known
+PullSource = namedtuple("PullSource", ["image", "mirror", "size"])
+
+# Images pulled and bytes downloaded from the mirrors and the upstream registries
+SourceTotals = namedtuple("SourceTotals", ["mirror_images", "mirror_bytes", "upstream_images", "upstream_bytes"])
+
+# Seconds to wait for a mirror to answer
+MIRROR_TIMEOUT = 5
+
+MANIFEST_TYPES = ["application/vnd.docker.distribution.manifest.v2+json",
+                  "application/vnd.docker.distribution.manifest.list.v2+json",
+                  "application/vnd.oci.image.manifest.v1+json",
+                  "application/vnd.oci.image.index.v1+json"]
+
+def split_reference(image):
+    """ Split an image reference into its registry, repository and tag or digest
+
+    :param str image: Image reference, eg. fedora:25 or registry.example.com/app@sha256:...
+    :returns: (registry, repository, reference), registry is None for Docker Hub
+    :rtype: tuple
+    """
+    registry = None
+    name = image
+    first = image.split("/", 1)[0]
+    if "/" in image and ("." in first or ":" in first or first == "localhost"):
+        (registry, name) = image.split("/", 1)
+    if "@" in name:
+        (name, reference) = name.split("@", 1)
+    elif ":" in name.rsplit("/", 1)[-1]:
+        (name, reference) = name.rsplit(":", 1)
+    else:
+        reference = "latest"
+    if registry is None and "/" not in name:
+        name = "library/" + name
+    return (registry, name, reference)
+
+def _get_manifest(conn, repository, reference):
+    conn.request("GET", "/v2/%s/manifests/%s" % (repository, reference),
+                 headers={"Accept": ", ".join(MANIFEST_TYPES)})
+    resp = conn.getresponse()
+    body = resp.read()
+    if resp.status != 200:
+        return None
+    return json.loads(body.decode("utf-8"))
+
+def manifest_size(mirror, image, timeout=MIRROR_TIMEOUT):
+    """ Return the download size of an image on a mirror
+
+    :param str mirror: Mirror URL, eg. http://localhost:5000
+    :param str image: Docker Hub image reference
+    :param float timeout: Seconds to wait for the mirror
+    :returns: Size of the config and layers in bytes, or None if the mirror doesn't have it
+    :rtype: int or None
+
+    Only the manifest is fetched, for a manifest list the linux/amd64 image
+    is used. A reply that isn't a manifest is treated as the mirror not
+    having the image.
+    """
+    (_registry, repository, reference) = split_reference(image)
+    url = urlsplit(mirror)
+    if url.scheme == "https":
+        conn = http.client.HTTPSConnection(url.netloc, timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection(url.netloc, timeout=timeout)
+    try:
+        manifest = _get_manifest(conn, repository, reference)
+        if isinstance(manifest, dict) and "manifests" in manifest:
+            entry = next((m for m in manifest["manifests"]
+                          if m.get("platform", {}).get("architecture") == "amd64"
+                          and m.get("platform", {}).get("os") == "linux"), None)
+            if entry is None:
+                return None
+            manifest = _get_manifest(conn, repository, entry["digest"])
+        if not isinstance(manifest, dict):
+            return None
+        return int(manifest.get("config", {}).get("size", 0)) + \
+            sum(int(l.get("size", 0)) for l in manifest.get("layers", []))
+    except (OSError, ValueError, TypeError, AttributeError, KeyError, http.client.HTTPException) as e:
+        log.debug("Could not get %s from mirror %s: %s", image, mirror, e)
+        return None
+    finally:
+        conn.close()
+
+def _pull_source(image, mirrors):
+    if split_reference(image)[0] is not None:
+        # docker only uses the mirrors for Docker Hub images
+        return PullSource(image, None, None)
+    for mirror in mirrors:
+        size = manifest_size(mirror, image)
+        if size is not None:
+            return PullSource(image, mirror, size)
+    return PullSource(image, None, None)
+
+def pull_sources(images, mirrors, workers=4):
+    """ Work out which images the daemon will get from the mirrors
+
+    :param list images: Image references to be pulled
+    :param list mirrors: Mirror URLs, in the order the daemon tries them
+    :param int workers: Maximum number of mirrors queries at the same time
+    :returns: One PullSource per image, mirror is None for upstream pulls
+    :rtype: list of PullSource
+
+    The daemon tries the mirrors in order and falls back to the upstream
+    registry, an image is counted as coming from the first mirror with a
+    manifest for it.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        sources = list(pool.map(lambda i: _pull_source(i, mirrors), images))
+    for source in sources:
+        if source.mirror:
+            log.info("%s is on %s (%d bytes)", source.image, source.mirror, source.size)
+        else:
+            log.info("%s is not on the mirrors, it is pulled from its upstream registry", source.image)
+    return sources
+
+def source_totals(sources, results):
+    """ Attribute the bytes the pulls downloaded to the mirrors or the upstream registries
+
+    :param list sources: PullSource for each image
+    :param list results: PullResult for each image
+    :rtype: SourceTotals
+
+    The sizes are what the daemon downloaded, layers it already had are not
+    counted. Failed pulls are left out.
+    """
+    mirrors = {s.image: s.mirror for s in sources}
+    totals = [0, 0, 0, 0]
+    for result in results:
+        if result.error:
+            continue
+        idx = 0 if mirrors.get(result.image) else 2
+        totals[idx] += 1
+        totals[idx+1] += result.size
+    return SourceTotals(*totals)
@@ -0,0 +1,251 @@
+#pylint: disable=missing-docstring
+'''
+Daemonless image seeding with podman
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import re
+import subprocess
+import time
+
+from pyanaconda.iutil import execWithRedirect, startProgram
+
+from com_redhat_docker.archives import LoadResult, archive_bytes, find_archives, loaded_images
+from com_redhat_docker.daemon import BindMounts
+from com_redhat_docker.images import PullResult, schedule_images
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["BIND_MOUNTS", "STORAGE_CONF", "storage_conf", "merge_storage_conf", "write_storage_conf", "Podman"]
+
+# Target directories bind mounted into the installer environment, in mount order
+BIND_MOUNTS = ["/var/lib/containers", "/etc/containers"]
+
+STORAGE_CONF = "/etc/containers/storage.conf"
+GRAPH_ROOT = "/var/lib/containers/storage"
+RUN_ROOT = "/run/containers/storage"
+
+def storage_conf(driver, options):
+    """ Return the contents of a containers-storage storage.conf
+
+    :param str driver: containers-storage driver, eg. overlay
+    :param dict options: The driver's options, eg. {"size": "10G"}
+    :rtype: str
+    """
+    # JSON strings are valid TOML basic strings
+    lines = ["# Written by the docker anaconda addon",
+             "[storage]",
+             "driver = %s" % json.dumps(driver),
+             "runroot = %s" % json.dumps(RUN_ROOT),
+             "graphroot = %s" % json.dumps(GRAPH_ROOT)]
+    if options:
+        lines += ["", "[storage.options.%s]" % driver]
+        lines += ["%s = %s" % (k, json.dumps(v)) for k, v in options.items()]
+    return "\n".join(lines) + "\n"
+
+# A TOML table header, eg. [storage.options.overlay]
+TABLE_RE = re.compile(r"^\s*\[\s*([A-Za-z0-9_.-]+)\s*\]\s*(#.*)?$")
+# The key of a TOML key = value line
+KEY_RE = re.compile(r"^\s*([A-Za-z0-9_-]+)\s*=\s*(.*)$")
+
+def merge_storage_conf(text, driver, options):
+    """ Return a storage.conf with the driver, graphroot and driver options set
+
+    :param str text: The existing storage.conf
+    :param str driver: containers-storage driver, eg. overlay
+    :param dict options: The driver's options
+    :rtype: str
+
+    Only those keys are replaced, they are written at the top of their table
+    and the table is added if it is missing. Everything else, comments
+    included, is kept as it is.
+    """
+    tables = OrderedDict([("storage", OrderedDict([("driver", driver), ("graphroot", GRAPH_ROOT)])),
+                          ("storage.options.%s" % driver, options)])
+    lines = []
+    table = None
+    skip = 0
+    for line in text.splitlines():
+        if skip:
+            # The rest of a multi-line array that is being replaced
+            skip += line.count("[") - line.count("]")
+            continue
+        match = TABLE_RE.match(line)
+        if match:
+            table = match.group(1)
+            lines.append(line)
+            lines += ["%s = %s" % (k, json.dumps(v)) for k, v in tables.pop(table, {}).items()]
+            continue
+        match = KEY_RE.match(line)
+        if match and table in ("storage", "storage.options.%s" % driver) and \
+                match.group(1) in (["driver", "graphroot"] if table == "storage" else options):
+            skip = match.group(2).count("[") - match.group(2).count("]")
+            continue
+        lines.append(line)
+    for table, values in tables.items():
+        if values:
+            lines += ["", "[%s]" % table] + ["%s = %s" % (k, json.dumps(v)) for k, v in values.items()]
+    return "\n".join(lines) + "\n"
+
+def write_storage_conf(path, driver, options):
+    """ Set the driver and its options in a storage.conf
+
+    :param str path: Path of the storage.conf
+    :param str driver: containers-storage driver, eg. overlay
+    :param dict options: The driver's options
+
+    The storage.conf from containers-common is updated with merge_storage_conf
+    so its other settings are kept, one is written if there isn't any.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with open(path) as fp:
+            text = merge_storage_conf(fp.read(), driver, options)
+        log.info("Updating %s", path)
+    except FileNotFoundError:
+        text = storage_conf(driver, options)
+    with open(path, "w") as fp:
+        fp.write(text)
+    log.info("Wrote %s: driver %s, options %s", path, driver, dict(options))
+
+class Podman(object):
+    """ Runs podman against the target's containers-storage
+
+    There is no daemon, the target's /var/lib/containers and /etc/containers
+    are bind mounted so that podman, and the podman commands in the section,
+    use the target's storage and storage.conf.
+    """
+    def __init__(self, prefix=None):
+        """ :param list prefix: Command to run podman under, eg. ["nice", "-n", "10"] """
+        self.prefix = prefix or []
+        self._mounts = BindMounts(BIND_MOUNTS)
+
+    def mount(self):
+        """ Bind mount the target's containers directories over the installer's """
+        self._mounts.mount()
+
+    def umount(self):
+        """ Remove the bind mounts made by mount, in reverse order """
+        self._mounts.umount()
+
+    def _run(self, args):
+        cmd = self.prefix + ["podman"] + args
+        return execWithRedirect(cmd[0], cmd[1:])
+
+    def _capture(self, args):
+        """ Run podman, returning its exit status and output """
+        cmd = self.prefix + ["podman"] + args
+        proc = startProgram(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = proc.communicate()[0].decode("utf-8", "replace")
+        for line in output.splitlines():
+            log.debug("podman: %s", line)
+        return (proc.returncode, output)
+
+    def _pull_group(self, group, reporter):
+        results = []
+        for image in group:
+            start = time.monotonic()
+            rc = self._run(["pull", "--quiet", image])
+            if rc == 0:
+                result = PullResult(image, None, time.monotonic() - start, None)
+                log.info("Pulled %s in %.2fs", image, result.elapsed)
+            else:
+                result = PullResult(image, "podman pull exited with %s" % rc, time.monotonic() - start, None)
+                log.error("Pulling %s failed with status %s after %.2fs", image, rc, result.elapsed)
+            results.append(result)
+            if reporter:
+                reporter.done(image)
+        return results
+
+    def pull_images(self, images, workers, reporter=None):
+        """ Pull the images into the target's storage with a pool of workers
+
+        :param list images: Image references to pull
+        :param int workers: Maximum number of concurrent pulls
+        :param reporter: ProgressReporter for the pulls, or None
+
+        podman's own progress output isn't meant to be parsed, only finished
+        pulls are reported.
+        :returns: One result per image, in the order they were passed
+        :rtype: list of PullResult
+        """
+        groups = schedule_images(images)
+        if not groups:
+            return []
+
+        workers = max(1, min(workers, len(groups)))
+        log.info("Pulling %d images with podman and %d workers", sum(len(g) for g in groups), workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            done = {r.image: r for results in pool.map(lambda g: self._pull_group(g, reporter), groups)
+                    for r in results}
+        if reporter:
+            reporter.finish()
+        return [done[image] for image in OrderedDict.fromkeys(images)]
+
+    def _load_one(self, path, reporter):
+        start = time.monotonic()
+        if os.path.isdir(path):
+            # A layout holds one image, pulled by its path
+            rc = self._run(["pull", "--quiet", "oci:" + path])
+            images = ["oci:" + path]
+        else:
+            (rc, output) = self._capture(["load", "--quiet", "--input", path])
+            images = loaded_images(output)
+        size = archive_bytes(path)
+        result = LoadResult(path, rc == 0, size, time.monotonic() - start, images if rc == 0 else [])
+        if result.ok:
+            log.info("Loaded %s: %s, %d bytes in %.2fs", path, ", ".join(images) or "no images", size,
+                     result.elapsed)
+        else:
+            log.error("Loading %s failed with status %s after %.2fs", path, rc, result.elapsed)
+        if reporter:
+            reporter.read(path, size, size)
+            reporter.done(path)
+        return result
+
+    def load_archives(self, path, workers, reporter=None):
+        """ Load the image archives and OCI layouts in a directory
+
+        :param str path: Directory holding the archives
+        :param int workers: Maximum number of archives to load at the same time
+        :param reporter: ProgressReporter for the loads, or None
+        :returns: One result per archive
+        :rtype: list of LoadResult
+        """
+        try:
+            archives = find_archives(path)
+        except OSError as e:
+            log.error("Cannot read image archive directory %s: %s", path, e)
+            return []
+        if not archives:
+            log.warning("No image archives found in %s", path)
+            return []
+
+        log.info("Loading %d image archives from %s with podman and %d workers", len(archives), path, workers)
+        if reporter:
+            reporter.count = len(archives)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            results = list(pool.map(lambda a: self._load_one(a, reporter), archives))
+        if reporter:
+            reporter.finish()
+        return results
@@ -0,0 +1,142 @@
+#pylint: disable=missing-docstring
+'''
+Bounded write throughput probes of existing storage for --auto
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from collections import namedtuple
+import os
+import shutil
+import tempfile
+import time
+
+from pyanaconda.iutil import execWithRedirect
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["ProbeResult", "probe", "probe_filesystem", "probe_pool"]
+
+# Bytes written to one file, then the number and size of the small files
+# written like an extracted image layer
+PROBE_SIZE = 64 * 1024**2
+PROBE_CHUNK = 1024**2
+PROBE_FILES = 512
+PROBE_FILE_SIZE = 16 * 1024
+
+# Seconds a probe may write for before it is cut short
+PROBE_TIMEOUT = 10.0
+
+# Thin LV created in a docker-pool to probe it, and its virtual size
+POOL_PROBE_LV = "docker-addon-probe"
+POOL_PROBE_SIZE = "1G"
+
+# Bytes written, seconds taken and bytes per second
+ProbeResult = namedtuple("ProbeResult", ["written", "elapsed", "rate"])
+
+def probe(path, size=None, files=None, timeout=None):
+    """ Time writing a large file and many small files under a directory
+
+    :param str path: Directory on the storage to probe
+    :param int size: Bytes to write to the large file, PROBE_SIZE by default
+    :param int files: Number of small files to write, PROBE_FILES by default
+    :param float timeout: Seconds to stop writing after, PROBE_TIMEOUT by default
+    :rtype: ProbeResult
+
+    The data is random so that compression doesn't flatter the result, and
+    it is synced before the time is taken. Everything is removed afterwards.
+    """
+    size = PROBE_SIZE if size is None else size
+    files = PROBE_FILES if files is None else files
+    timeout = timeout or PROBE_TIMEOUT
+
+    chunk = os.urandom(PROBE_CHUNK)
+    small = chunk[:PROBE_FILE_SIZE]
+    directory = tempfile.mkdtemp(prefix=".docker-addon-probe-", dir=path)
+    written = 0
+    start = time.monotonic()
+    deadline = start + timeout
+    try:
+        with open(os.path.join(directory, "blob"), "wb") as fp:
+            while written < size and time.monotonic() < deadline:
+                fp.write(chunk[:size - written])
+                written = fp.tell()
+            fp.flush()
+            os.fsync(fp.fileno())
+        for n in range(files):
+            if time.monotonic() >= deadline:
+                break
+            layer = os.path.join(directory, "layer", "%02x" % (n % 64))
+            os.makedirs(layer, exist_ok=True)
+            with open(os.path.join(layer, str(n)), "wb") as fp:
+                fp.write(small)
+            written += len(small)
+        os.sync()
+        elapsed = time.monotonic() - start
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return ProbeResult(written, elapsed, written / elapsed if elapsed else 0.0)
+
+def probe_filesystem(device_path, fstype, **kwargs):
+    """ Mount an existing filesystem on a scratch directory and probe it
+
+    :param str device_path: Path of the device holding the filesystem
+    :param str fstype: Type of the filesystem
+    :param kwargs: Passed to probe
+    :returns: The result, or None if it could not be probed
+    :rtype: ProbeResult or None
+    """
+    mountpoint = tempfile.mkdtemp(prefix="docker-addon-probe-")
+    try:
+        if execWithRedirect("mount", ["-t", fstype, device_path, mountpoint]) != 0:
+            log.warning("Could not mount %s to probe it", device_path)
+            return None
+        try:
+            return probe(mountpoint, **kwargs)
+        finally:
+            execWithRedirect("umount", [mountpoint])
+    except OSError as e:
+        log.warning("Probing %s failed: %s", device_path, e)
+        return None
+    finally:
+        try:
+            os.rmdir(mountpoint)
+        except OSError:
+            pass
+
+def probe_pool(vgname, fstype, **kwargs):
+    """ Probe an existing docker-pool through a scratch thin LV
+
+    :param str vgname: Name of the VG holding the docker-pool
+    :param str fstype: Filesystem docker puts on its thin devices
+    :param kwargs: Passed to probe
+    :returns: The result, or None if it could not be probed
+    :rtype: ProbeResult or None
+    """
+    lv = "%s/%s" % (vgname, POOL_PROBE_LV)
+    if execWithRedirect("lvcreate", ["-y", "-q", "-T", "%s/docker-pool" % vgname,
+                                     "-V", POOL_PROBE_SIZE, "-n", POOL_PROBE_LV]) != 0:
+        log.warning("Could not create a thin LV in %s/docker-pool to probe it", vgname)
+        return None
+    try:
+        if execWithRedirect("mkfs." + fstype, ["-q", "/dev/" + lv]) != 0:
+            log.warning("Could not make a %s filesystem on %s to probe it", fstype, lv)
+            return None
+        return probe_filesystem("/dev/" + lv, fstype, **kwargs)
+    finally:
+        execWithRedirect("lvremove", ["-y", "-q", lv])
@@ -0,0 +1,115 @@
+#pylint: disable=missing-docstring
+'''
+Throttled progress reporting of image pulls and loads
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import threading
+import time
+
+from com_redhat_docker.i18n import _
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["PROGRESS_INTERVAL", "ProgressReporter"]
+
+# Seconds between progress messages
+PROGRESS_INTERVAL = 2.0
+
+class ProgressReporter(object):
+    """ Aggregate the progress of concurrent pulls or loads into progress messages
+
+    The workers call pull, read and done as they go. A message is only
+    formatted and sent when interval seconds have passed since the last one,
+    the calls in between just store the latest counts. Byte totals for pulls
+    grow as the daemon reports more layers.
+    """
+    def __init__(self, action, count, interval=None, ui=True):
+        """ :param str action: What is being done, eg. "Pulling docker images"
+            :param int count: Number of images or archives, may be set once they are found
+            :param float interval: Seconds between messages, PROGRESS_INTERVAL by default
+            :param bool ui: Send the messages to anaconda's progress hub as well as the log
+        """
+        self.action = action
+        self.count = count
+        self.interval = interval or PROGRESS_INTERVAL
+        self.ui = ui
+        self.finished = 0
+        self.messages = 0
+        self._items = {}
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._next = self._start + self.interval
+
+    def pull(self, progress):
+        """ Update the progress of a pull
+
+        :param progress: The pull's api.PullProgress
+        """
+        self._update(progress.image, (progress.downloaded, progress.total, progress.layers))
+
+    def read(self, name, done, total):
+        """ Update the progress of a load
+
+        :param str name: The archive being loaded
+        :param int done: Bytes sent to the daemon so far
+        :param int total: Size of the archive
+        """
+        self._update(name, (done, total, 0))
+
+    def done(self, name):
+        """ Count an image or archive as finished, whether it worked or not
+
+        :param str name: The image or archive
+        """
+        with self._lock:
+            self.finished += 1
+        self._tick()
+
+    def finish(self):
+        """ Send a last message with the final counts """
+        self._tick(force=True)
+
+    def _update(self, name, counts):
+        with self._lock:
+            self._items[name] = counts
+        self._tick()
+
+    def _tick(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now < self._next:
+                return
+            self._next = now + self.interval
+            counts = list(self._items.values())
+            finished = self.finished
+            self.messages += 1
+        done = sum(c[0] for c in counts)
+        total = sum(c[1] for c in counts)
+        layers = sum(c[2] for c in counts)
+        rate = done / max(now - self._start, 1e-6)
+        message = _("%s: %d of %d done") % (self.action, finished, self.count)
+        if total:
+            message += _(", %.1f of %.1f MiB, %.1f MiB/s") % (done / 1024**2, total / 1024**2, rate / 1024**2)
+        if layers:
+            message += _(", %d layers") % layers
+        log.info(message)
+        if self.ui:
+            from pyanaconda.progress import progress_message
+            progress_message(message)
@@ -0,0 +1,95 @@
+#pylint: disable=missing-docstring
+'''
+Reuse of the docker storage kept from a previous installation
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+
+from com_redhat_docker import api
+from com_redhat_docker.mirrors import split_reference
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["GRAPH_DRIVERS", "stored_drivers", "normalize_reference", "inventory", "split_present"]
+
+# Storage drivers that keep their image metadata in /var/lib/docker/image/<driver>
+GRAPH_DRIVERS = ["devicemapper", "overlay", "overlay2", "btrfs", "vfs", "zfs", "aufs"]
+
+# Names Docker Hub images may be given with
+DOCKER_HUB = ["docker.io", "index.docker.io", "registry-1.docker.io"]
+
+def stored_drivers(root):
+    """ Return the storage drivers with images under a docker root
+
+    :param str root: Path of the docker root, eg. /mnt/sysimage/var/lib/docker
+    :returns: Driver names
+    :rtype: list of str
+    """
+    return [d for d in GRAPH_DRIVERS
+            if os.path.isfile(os.path.join(root, "image", d, "repositories.json"))]
+
+def normalize_reference(image):
+    """ Return the fully qualified form of an image reference
+
+    :param str image: Image reference, eg. fedora:25 or docker.io/library/fedora@sha256:...
+    :returns: eg. docker.io/library/fedora:25
+    :rtype: str
+
+    References to the same image on Docker Hub compare equal once normalized,
+    however they were written.
+    """
+    (registry, repository, reference) = split_reference(image)
+    if registry is None or registry in DOCKER_HUB:
+        registry = DOCKER_HUB[0]
+        if "/" not in repository:
+            repository = "library/" + repository
+    separator = "@" if ":" in reference else ":"
+    return "%s/%s%s%s" % (registry, repository, separator, reference)
+
+def inventory(socket_path=api.DOCKER_SOCKET):
+    """ Return the tags and digests of the images the daemon already has
+
+    :param str socket_path: Path to the daemon's Unix socket
+    :returns: Normalized references
+    :rtype: set of str
+    """
+    present = set()
+    for image in api.images(socket_path):
+        for ref in (image.get("RepoTags") or []) + (image.get("RepoDigests") or []):
+            if not ref.startswith("<none>"):
+                present.add(normalize_reference(ref))
+    return present
+
+def split_present(images, present):
+    """ Split the images into the ones already present and the ones to pull
+
+    :param list images: Image references, in kickstart order
+    :param set present: Normalized references from inventory
+    :returns: (reused, missing) lists of image references
+    :rtype: tuple
+
+    A tag that is present is reused as it is, it is not checked against the
+    registry. Pin images by digest to be sure of getting a given version.
+    """
+    reused = [i for i in images if normalize_reference(i) in present]
+    missing = [i for i in images if normalize_reference(i) not in present]
+    for image in reused:
+        log.info("%s is already present, not pulling it", image)
+    return (reused, missing)
@@ -0,0 +1,155 @@
+#pylint: disable=missing-docstring
+'''
+CPU and I/O scheduling of the install-time daemon and script
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import shutil
+
+from pyanaconda.iutil import execWithCapture
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["IONICE_CLASSES", "Scheduling", "effective"]
+
+# ionice classes, by the names ionice accepts
+IONICE_CLASSES = ["idle", "best-effort", "realtime"]
+
+# Name of the transient systemd scope the daemon is run in
+SCOPE_UNIT = "docker-anaconda-addon"
+
+class Scheduling(object):
+    """ CPU and I/O priorities, and cgroup weights, to run commands with
+
+    Priorities are applied by running the command under nice and ionice, so
+    they are inherited by everything the command starts. The cgroup settings
+    put the command in a transient systemd scope.
+    """
+    def __init__(self, nice=None, ionice_class=None, ionice_level=None,
+                 cpu_weight=None, io_weight=None, cpu_quota=None):
+        """ :param int nice: Niceness, -20 to 19
+            :param str ionice_class: One of IONICE_CLASSES
+            :param int ionice_level: Priority within the ionice class, 0 to 7
+            :param int cpu_weight: Scope's CPUWeight, 1 to 10000
+            :param int io_weight: Scope's IOWeight, 1 to 10000
+            :param str cpu_quota: Scope's CPUQuota, eg. 200%
+        """
+        self.nice = nice
+        self.ionice_class = ionice_class
+        self.ionice_level = ionice_level
+        self.cpu_weight = cpu_weight
+        self.io_weight = io_weight
+        self.cpu_quota = cpu_quota
+
+    @property
+    def used(self):
+        """ True if any of the settings are used """
+        return any(v is not None for v in [self.nice, self.ionice_class, self.ionice_level,
+                                           self.cpu_weight, self.io_weight, self.cpu_quota])
+
+    @property
+    def cgroup(self):
+        """ True if any of the cgroup settings are used """
+        return any(v is not None for v in [self.cpu_weight, self.io_weight, self.cpu_quota])
+
+    def priority_prefix(self):
+        """ Return the nice and ionice commands to run a command with
+
+        :rtype: list of str
+        """
+        prefix = []
+        if self.nice is not None:
+            prefix += ["nice", "-n", str(self.nice)]
+        if self.ionice_class or self.ionice_level is not None:
+            prefix += ["ionice", "-c", self.ionice_class or "best-effort"]
+            if self.ionice_level is not None:
+                prefix += ["-n", str(self.ionice_level)]
+        return prefix
+
+    def prefix(self, unit=SCOPE_UNIT):
+        """ Return the commands to run a command with all of the settings
+
+        :param str unit: Name of the systemd scope
+        :rtype: list of str
+
+        Without systemd-run the cgroup settings are skipped with a warning.
+        """
+        prefix = []
+        if self.cgroup:
+            if shutil.which("systemd-run"):
+                prefix = ["systemd-run", "--scope", "--quiet", "--unit=%s" % unit]
+                for prop, value in [("CPUWeight", self.cpu_weight), ("IOWeight", self.io_weight),
+                                    ("CPUQuota", self.cpu_quota)]:
+                    if value is not None:
+                        prefix += ["-p", "%s=%s" % (prop, value)]
+                prefix += ["--"]
+            else:
+                log.warning("systemd-run is missing, not using the docker cgroup settings")
+        return prefix + self.priority_prefix()
+
+    def script_prelude(self):
+        """ Return shell commands setting the priorities of the shell running them
+
+        :rtype: str
+        """
+        lines = []
+        if self.nice is not None:
+            lines.append("renice -n %d -p $$ >/dev/null" % self.nice)
+        if self.ionice_class or self.ionice_level is not None:
+            lines.append("ionice -c %s%s -p $$" % (self.ionice_class or "best-effort",
+                                                   "" if self.ionice_level is None else " -n %d" % self.ionice_level))
+        return "".join(l + "\n" for l in lines)
+
+    def __str__(self):
+        settings = []
+        if self.nice is not None:
+            settings.append("nice %d" % self.nice)
+        if self.ionice_class or self.ionice_level is not None:
+            settings.append("ionice %s%s" % (self.ionice_class or "best-effort",
+                                             "" if self.ionice_level is None else " level %d" % self.ionice_level))
+        for name, value in [("CPUWeight", self.cpu_weight), ("IOWeight", self.io_weight),
+                            ("CPUQuota", self.cpu_quota)]:
+            if value is not None:
+                settings.append("%s=%s" % (name, value))
+        return ", ".join(settings) or "defaults"
+
+def effective(pid):
+    """ Return the scheduling a process is actually running with
+
+    :param int pid: Process ID
+    :returns: Description of its niceness, I/O priority and cgroup
+    :rtype: str
+    """
+    try:
+        nice = str(os.getpriority(os.PRIO_PROCESS, pid))
+    except OSError:
+        nice = "unknown"
+    ionice = (execWithCapture("ionice", ["-p", str(pid)]) or "").strip() or "unknown"
+    cgroup = "unknown"
+    try:
+        with open("/proc/%d/cgroup" % pid) as fp:
+            for line in fp:
+                (hierarchy, controllers, path) = line.rstrip("\n").split(":", 2)
+                if hierarchy == "0" or "cpu" in controllers.split(","):
+                    cgroup = path
+                    break
+    except (OSError, ValueError):
+        pass
+    return "nice %s, ionice %s, cgroup %s" % (nice, ionice, cgroup)
@@ -0,0 +1,249 @@
+#pylint: disable=missing-docstring
+'''
+Capture and restore of a populated docker root
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from pyanaconda.iutil import startProgram
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["SNAPSHOT_DRIVERS", "SnapshotError", "snapshot_name", "read_manifest", "capture", "restore"]
+
+# Storage drivers whose whole state is the files under /var/lib/docker. The
+# btrfs driver keeps its layers in nested subvolumes and devicemapper in the
+# thin-pool, neither survives a tar of the directory.
+SNAPSHOT_DRIVERS = ["overlay", "overlay2"]
+
+# Snapshots are named after their driver and the sha256 of the compressed archive
+SNAPSHOT_RE = re.compile(r"^docker-(?P<driver>[a-z0-9]+)-(?P<sha256>[0-9a-f]{64})\.tar\.gz$")
+
+# Everything docker needs is kept: owners by number, the overlay xattrs,
+# whiteout devices, ACLs and SELinux labels.
+TAR_ARGS = ["--numeric-owner", "--xattrs", "--xattrs-include=*", "--acls", "--selinux"]
+
+BLOCKSIZE = 1024 * 1024
+
+class SnapshotError(Exception):
+    """ A snapshot could not be captured or restored """
+    pass
+
+def snapshot_name(driver, sha256):
+    """ Return the file name of a snapshot
+
+    :param str driver: Storage driver of the docker root
+    :param str sha256: Hex digest of the compressed archive
+    :rtype: str
+    """
+    return "docker-%s-%s.tar.gz" % (driver, sha256)
+
+def _compressor(decompress=False):
+    """ Return the command to compress stdin to stdout, pigz with a thread per CPU if it is installed
+
+    pigz only compresses in parallel, it decompresses in a single thread
+    whatever -p says, so it is left out when decompressing.
+    """
+    if shutil.which("pigz"):
+        return ["pigz", "-d"] if decompress else ["pigz", "-p", str(os.cpu_count() or 1)]
+    return ["gzip"] + (["-d"] if decompress else [])
+
+def read_manifest(path):
+    """ Return the details of a snapshot
+
+    :param str path: Path of the snapshot archive
+    :returns: driver, sha256 and, if its manifest is there, unpacked_bytes and the rest
+    :rtype: dict
+    :raises: SnapshotError if the name isn't a snapshot name
+    """
+    match = SNAPSHOT_RE.match(os.path.basename(path))
+    if not match:
+        raise SnapshotError("%s is not named docker-DRIVER-SHA256.tar.gz" % path)
+    manifest = {"driver": match.group("driver"), "sha256": match.group("sha256")}
+    try:
+        with open(re.sub(r"\.tar\.gz$", ".json", path)) as fp:
+            manifest.update(json.load(fp))
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        log.warning("Ignoring the manifest of %s: %s", path, e)
+    if (manifest["driver"], manifest["sha256"]) != (match.group("driver"), match.group("sha256")):
+        raise SnapshotError("The manifest of %s does not match its name" % path)
+    return manifest
+
+def _relay(src, dst, counter):
+    """ Copy src to dst counting the bytes, then close dst """
+    try:
+        for data in iter(lambda: src.read(BLOCKSIZE), b""):
+            counter[0] += len(data)
+            dst.write(data)
+    except OSError as e:
+        log.error("Error streaming the docker root: %s", e)
+    finally:
+        try:
+            dst.close()
+        except OSError:
+            pass
+
+def capture(root, directory, driver):
+    """ Capture a docker root as a compressed, content addressed snapshot
+
+    :param str root: Path of the docker root, the daemon must not be running
+    :param str directory: Directory to write the snapshot and its manifest to
+    :param str driver: Storage driver of the docker root
+    :returns: The manifest, with the path of the snapshot
+    :rtype: dict
+    :raises: SnapshotError if tar or the compressor fail
+
+    The archive is hashed as it is written and renamed after its digest once
+    it is complete, so an existing snapshot is never partial.
+    """
+    os.makedirs(directory, exist_ok=True)
+    start = time.monotonic()
+    (fd, tmp) = tempfile.mkstemp(".tmp", ".docker-snapshot-", directory)
+    digest = hashlib.sha256()
+    unpacked = [0]
+    try:
+        with os.fdopen(fd, "wb") as out:
+            tar = startProgram(["tar", "--create", "--file=-", "--directory=%s" % root, "--sparse"] + TAR_ARGS + ["."],
+                               stdout=subprocess.PIPE, stderr=None)
+            comp = startProgram(_compressor(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=None)
+            relay = threading.Thread(target=_relay, args=(tar.stdout, comp.stdin, unpacked), daemon=True)
+            relay.start()
+            for data in iter(lambda: comp.stdout.read(BLOCKSIZE), b""):
+                digest.update(data)
+                out.write(data)
+            relay.join()
+            if tar.wait() != 0 or comp.wait() != 0:
+                raise SnapshotError("Archiving %s failed: tar exited with %s, %s with %s"
+                                    % (root, tar.returncode, comp.args[0], comp.returncode))
+            out.flush()
+            os.fsync(out.fileno())
+        path = os.path.join(directory, snapshot_name(driver, digest.hexdigest()))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    elapsed = time.monotonic() - start
+    manifest = {"driver": driver, "sha256": digest.hexdigest(),
+                "compressed_bytes": os.path.getsize(path), "unpacked_bytes": unpacked[0],
+                "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+    with open(re.sub(r"\.tar\.gz$", ".json", path), "w") as fp:
+        json.dump(manifest, fp, indent=4, sort_keys=True)
+        fp.write("\n")
+    log.info("Captured %s as %s: %d bytes, %d compressed, in %.2fs", root, path,
+             unpacked[0], manifest["compressed_bytes"], elapsed)
+    manifest["path"] = path
+    return manifest
+
+def _extract(path, staging, manifest):
+    """ Stream a snapshot into tar extracting in staging, returning its size
+
+    :raises: SnapshotError if the size or digest don't match or the extraction failed
+
+    The whole archive is read into the digest even when tar stops reading
+    early, so what was extracted is only kept if all of the archive matches.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    comp = startProgram(_compressor(decompress=True), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=None)
+    tar = startProgram(["tar", "--extract", "--file=-", "--directory=%s" % staging, "--preserve-permissions"] + TAR_ARGS,
+                       stdin=comp.stdout, stdout=subprocess.DEVNULL, stderr=None)
+    # tar holds the only reading end of the pipe, so the decompressor sees tar exit
+    comp.stdout.close()
+    with open(path, "rb") as fp:
+        try:
+            for data in iter(lambda: fp.read(BLOCKSIZE), b""):
+                digest.update(data)
+                size += len(data)
+                comp.stdin.write(data)
+        except BrokenPipeError:
+            for data in iter(lambda: fp.read(BLOCKSIZE), b""):
+                digest.update(data)
+                size += len(data)
+        finally:
+            try:
+                comp.stdin.close()
+            except BrokenPipeError:
+                pass
+    comp.wait()
+    tar.wait()
+
+    expected = manifest.get("compressed_bytes")
+    if expected is not None and size != expected:
+        raise SnapshotError("%s is %d bytes, its manifest says %d" % (path, size, expected))
+    if digest.hexdigest() != manifest["sha256"]:
+        raise SnapshotError("%s is corrupt, its sha256 is %s" % (path, digest.hexdigest()))
+    if comp.returncode != 0 or tar.returncode != 0:
+        raise SnapshotError("Extracting %s failed: %s exited with %s, tar with %s"
+                            % (path, comp.args[0], comp.returncode, tar.returncode))
+    return size
+
+def restore(path, root):
+    """ Restore a snapshot into a docker root
+
+    :param str path: Path of the snapshot archive
+    :param str root: Path of the docker root to extract it into
+    :returns: compressed_bytes, unpacked_bytes (None if there is no manifest) and elapsed seconds
+    :rtype: dict
+    :raises: SnapshotError if the archive is corrupt or cannot be extracted
+
+    The archive is streamed through the decompressor into tar, which run
+    alongside the reading, and its digest is checked against its name as it
+    is read. tar extracts into a staging directory in the root, which is only
+    moved into place once all of the archive has been read and its size and
+    digest match, and is removed otherwise, so the root never holds a partial
+    or tampered snapshot.
+    """
+    manifest = read_manifest(path)
+    os.makedirs(root, exist_ok=True)
+    if os.listdir(root):
+        log.warning("%s is not empty, the snapshot replaces what it has of the same names", root)
+
+    start = time.monotonic()
+    staging = tempfile.mkdtemp(prefix=".snapshot-restore-", dir=root)
+    try:
+        size = _extract(path, staging, manifest)
+        for name in os.listdir(staging):
+            target = os.path.join(root, name)
+            if os.path.isdir(target) and not os.path.islink(target):
+                shutil.rmtree(target)
+            elif os.path.lexists(target):
+                os.unlink(target)
+            os.rename(os.path.join(staging, name), target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    elapsed = time.monotonic() - start
+
+    unpacked = manifest.get("unpacked_bytes")
+    log.info("Restored %s into %s: %d bytes in %.2fs (%.1f MiB/s compressed%s)", path, root, size, elapsed,
+             size / max(elapsed, 1e-6) / 1024**2,
+             ", %.1f MiB/s unpacked" % (unpacked / max(elapsed, 1e-6) / 1024**2) if unpacked else "")
+    return {"compressed_bytes": size, "unpacked_bytes": unpacked, "elapsed": elapsed}
@@ -0,0 +1,85 @@
+#pylint: disable=missing-docstring
+'''
+Phase timing for the addon
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import os
+import time
+
+__all__ = ["PhaseTimer"]
+
+# Version of the JSON written by PhaseTimer.write
+TIMING_VERSION = 1
+
+class PhaseTimer(object):
+    """ Collect the durations of the addon's phases
+
+    Durations are measured with the monotonic clock, in seconds. A phase that
+    runs more than once accumulates its time.
+    """
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.values = OrderedDict()
+
+    @contextmanager
+    def phase(self, name):
+        """ Time the body of the with statement as phase name
+
+        :param str name: Name of the phase
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.monotonic() - start
+
+    def record(self, name, value):
+        """ Record a measurement that is not a phase duration
+
+        :param str name: Name of the measurement
+        :param value: The value, or None if it could not be measured
+        """
+        self.values[name] = value
+
+    def summary(self):
+        """ Return the timings as a single line
+
+        :rtype: str
+        """
+        phases = ", ".join("%s %.2fs" % (name, secs) for name, secs in self.phases.items())
+        values = ", ".join("%s %s" % (name, "%.2fs" % v if isinstance(v, float) else v)
+                           for name, v in self.values.items())
+        return "docker addon timing: " + "; ".join(s for s in [phases, values] if s)
+
+    def write(self, path):
+        """ Write the timings as JSON
+
+        :param str path: Path of the file to write
+        """
+        data = OrderedDict([("version", TIMING_VERSION),
+                            ("clock", "monotonic"),
+                            ("phases", self.phases),
+                            ("values", self.values)])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as fp:
+            json.dump(data, fp, indent=2)
+            fp.write("\n")
@@ -0,0 +1,156 @@
+#pylint: disable=missing-docstring
+'''
+Per-command tracing of the addon script
+'''
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from collections import namedtuple
+import os
+import subprocess
+import tempfile
+import time
+
+from pyanaconda.iutil import startProgram
+
+import logging
+log = logging.getLogger("anaconda")
+
+__all__ = ["CommandStat", "TracedScript"]
+
+CommandStat = namedtuple("CommandStat", ["lineno", "command", "elapsed", "status", "output"])
+
+# Trace records are written by the shell as RS lineno US status US command RS
+RS = b"\x1e"
+US = b"\x1f"
+
+# bash runs the DEBUG trap before every simple command with $? still holding
+# the status of the one before it, and the EXIT trap reports the status of the
+# last one. The records go to a copy of stdout on fd 3 so they stay in order
+# with the output even if the script redirects its own stdout. The prelude is
+# kept on the first line so $LINENO - 1 is the line in the script body.
+PRELUDE = ("exec 3>&1 2>&1; "
+           "trap 'printf \"\\036%s\\037%s\\037%s\\036\" \"$((LINENO-1))\" \"$?\" \"$BASH_COMMAND\" >&3' DEBUG; "
+           "trap 'printf \"\\036\\037%s\\037\\036\" \"$?\" >&3' EXIT\n")
+
+READ_SIZE = 64 * 1024
+
+class TracedScript(object):
+    """ Run the addon script under bash, timing every command
+
+    The script is run as a whole so multi-line constructs keep their normal
+    shell semantics. Each command's wall time is taken when its trace record
+    and the next one are read from the shell's output, and the bytes of output
+    between them are attributed to it.
+    """
+    def __init__(self, script, logfile, prefix=None):
+        """ :param str script: The script body
+            :param str logfile: Path to write the script's output to
+            :param list prefix: Command to run bash under, eg. ["nice", "-n", "10"]
+        """
+        self.script = script
+        self.logfile = logfile
+        self.prefix = prefix or []
+        self.commands = []
+        self.rc = None
+
+    def run(self):
+        """ Run the script
+
+        :returns: The exit status of the script
+        :rtype: int
+        """
+        (fd, path) = tempfile.mkstemp("", "ks-script-", "/tmp")
+        os.write(fd, (PRELUDE + self.script).encode("utf-8"))
+        os.close(fd)
+        os.chmod(path, 0o700)
+
+        try:
+            proc = startProgram(self.prefix + ["/bin/bash", path], stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, reset_lang=True)
+            with open(self.logfile, "wb") as out:
+                self._read(proc.stdout, out)
+            self.rc = proc.wait()
+        finally:
+            os.unlink(path)
+
+        if self.rc != 0:
+            log.error("Error code %s running the docker addon script", self.rc)
+        return self.rc
+
+    def _read(self, stdout, out):
+        current = None          # [lineno, command, start, output bytes]
+        pending = b""
+        in_record = False
+        fd = stdout.fileno()
+        while True:
+            data = os.read(fd, READ_SIZE)
+            if not data:
+                break
+            now = time.monotonic()
+            pending += data
+            while pending:
+                idx = pending.find(RS)
+                if idx == -1:
+                    if not in_record:
+                        out.write(pending)
+                        if current:
+                            current[3] += len(pending)
+                        pending = b""
+                    break
+                if not in_record:
+                    out.write(pending[:idx])
+                    if current:
+                        current[3] += idx
+                    in_record = True
+                else:
+                    current = self._record(pending[:idx], current, now)
+                    in_record = False
+                pending = pending[idx+1:]
+        if current:
+            # The shell died without running its EXIT trap
+            self._finish(current, None, time.monotonic())
+        stdout.close()
+
+    def _record(self, record, current, now):
+        """ Handle a trace record and return the new current command """
+        (lineno, status, command) = record.split(US, 2)
+        status = int(status) if status else None
+        if current:
+            self._finish(current, status, now)
+        if not lineno or int(lineno) < 1:
+            # EXIT trap, or the prelude
+            return None
+        command = command.decode("utf-8", "replace")
+        return [int(lineno), command, now, 0]
+
+    def _finish(self, current, status, now):
+        (lineno, command, start, output) = current
+        self.commands.append(CommandStat(lineno, command, now - start, status, output))
+
+    def write_report(self, path):
+        """ Write the commands, slowest first
+
+        :param str path: Path of the report to write
+        """
+        with open(path, "w") as fp:
+            fp.write("# docker addon script commands, slowest first\n")
+            fp.write("# %9s %6s %10s %5s  %s\n" % ("seconds", "status", "bytes", "line", "command"))
+            for c in sorted(self.commands, key=lambda c: c.elapsed, reverse=True):
+                status = "-" if c.status is None else str(c.status)
+                fp.write("%11.3f %6s %10d %5d  %s\n" % (c.elapsed, status, c.output, c.lineno,
+                                                        c.command.replace("\n", "\\n")))
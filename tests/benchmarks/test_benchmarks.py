@@ -0,0 +1,159 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+'''
+Benchmarks of the addon's overhead
+
+Each measurement is compared to its budget in budgets.json and the test fails
+when it goes over, scaled by $BENCH_TOLERANCE (default 1.0). The fake docker
+latencies, and the time it takes the fake docker binary to start, are
+subtracted so the measurements are the addon's own cost. Set
+$BENCH_OUTPUT to a path to also write the measurements as JSON.
+
+The budgets are wall-clock times and depend on how loaded the machine is, so
+the benchmarks are not part of 'make test' and 'make ci'. Run them with
+'make bench'.
+'''
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from harness import AddonHarness, make_addon, make_ksdata, lvm_storage, plain_storage
+
+BUDGETS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "budgets.json")
+
+STARTUP = 0.2
+SHUTDOWN = 0.2
+PULL_LATENCY = 0.2
+
+SCRIPT = "".join("true image%d\n" % i for i in range(20))
+
+HEADER = ["--vgname=docker", "--fstype=xfs", "--save-args", "--pull=a:1,a:2,b", "--pull=c",
+          "--parallel-pulls=8", "--load-dir=/run/install/repo/images", "--parallel-loads=4",
+          "--trace-commands", "--", "-D", "-l", "debug"]
+
+# Imports the addon the way anaconda does at startup, with what anaconda has
+# already loaded imported first, and prints the time or memory it took
+IMPORT_SCRIPT = """
+import sys
+sys.path[:0] = %r
+import gettext, logging, pyanaconda.addons, pykickstart.options, pykickstart.errors
+import time, tracemalloc
+if sys.argv[1] == "memory":
+    tracemalloc.start()
+start = time.perf_counter()
+import com_redhat_docker.ks.docker
+elapsed = time.perf_counter() - start
+print(tracemalloc.get_traced_memory()[0] if sys.argv[1] == "memory" else elapsed)
+"""
+
+with open(BUDGETS_FILE) as _fp:
+    BUDGETS = json.load(_fp)
+
+RESULTS = {}
+
+class BenchmarkTestCase(unittest.TestCase):
+    cli_startup = 0.0
+
+    @classmethod
+    def setUpClass(cls):
+        with AddonHarness():
+            runs = []
+            for _i in range(3):
+                start = time.monotonic()
+                subprocess.check_call(["docker", "version"], stdout=subprocess.DEVNULL)
+                runs.append(time.monotonic() - start)
+        cls.cli_startup = min(runs)
+
+    @classmethod
+    def tearDownClass(cls):
+        output = os.environ.get("BENCH_OUTPUT")
+        if output:
+            with open(output, "w") as fp:
+                json.dump(RESULTS, fp, indent=2, sort_keys=True)
+
+    def check(self, name, value):
+        RESULTS[name] = value
+        budget = BUDGETS[name]["budget"] * float(os.environ.get("BENCH_TOLERANCE", "1.0"))
+        unit = BUDGETS[name].get("unit", "s")
+        print("%-24s %8.4f%s (budget %.4f%s)" % (name, value, unit, budget, unit))
+        self.assertLessEqual(value, budget, "%s regressed: %.4f%s > %.4f%s (%s)" %
+                             (name, value, unit, budget, unit, BUDGETS[name]["description"]))
+
+    def test_execute(self):
+        with AddonHarness(startup=STARTUP, shutdown=SHUTDOWN):
+            addon = make_addon(["--vgname=docker"], SCRIPT)
+            storage = lvm_storage()
+            ksdata = make_ksdata()
+            addon.setup(storage, ksdata, None, None)
+            start = time.monotonic()
+            addon.execute(storage, ksdata, None, None, None)
+            elapsed = time.monotonic() - start
+
+        phases = addon.timer.phases
+        self.check("execute_overhead", elapsed - STARTUP - SHUTDOWN - self.cli_startup)
+        self.check("daemon_start_overhead", phases["daemon_start"] - STARTUP - self.cli_startup)
+        self.check("daemon_stop_overhead", phases["daemon_stop"] - SHUTDOWN)
+        self.check("script_overhead", phases["script"])
+
+    def test_trace_script(self):
+        with AddonHarness() as h:
+            addon = make_addon(["--overlay", "--trace-commands"], SCRIPT)
+            h.run(addon, plain_storage())
+        self.check("trace_script_overhead", addon.timer.phases["script"])
+
+    def test_pull(self):
+        with AddonHarness(latency=PULL_LATENCY) as h:
+            addon = make_addon(["--overlay", "--parallel-pulls=4",
+                                "--pull=a,b,c,d,e,f,g,h"])
+            h.run(addon, plain_storage())
+        self.check("pull_overhead", addon.timer.phases["pull"] - 2 * PULL_LATENCY)
+
+    def test_setup_large_lvm(self):
+        storage = lvm_storage(vgs=50, lvs_per_vg=200)
+        addon = make_addon(["--vgname=docker"])
+        start = time.monotonic()
+        addon.setup(storage, make_ksdata(), None, None)
+        self.check("setup_large_lvm", time.monotonic() - start)
+
+    def test_handle_header(self):
+        rounds = 200
+        start = time.monotonic()
+        for _i in range(rounds):
+            make_addon(HEADER)
+        self.check("handle_header", (time.monotonic() - start) / rounds)
+
+    def test_import(self):
+        tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = IMPORT_SCRIPT % [os.path.join(tests, "fakes"), os.path.dirname(tests)]
+        with tempfile.TemporaryDirectory(prefix="docker-addon-pyc-") as pycache:
+            # Use compiled bytecode like the installer image does
+            env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+            env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+            def run(what):
+                return float(subprocess.check_output([sys.executable, "-c", script, what], env=env))
+            run("time")
+            self.check("import_time", min(run("time") for _i in range(5)))
+            self.check("import_memory", run("memory") / 1024)
+
+if __name__ == "__main__":
+    unittest.main()
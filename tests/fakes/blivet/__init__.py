@@ -0,0 +1,45 @@
+'''
+Stand-in for blivet used by the tests
+'''
+from blivet.devices import LVMVolumeGroupDevice, LVMLogicalVolumeDevice, LVMThinPoolDevice
+from blivet.devices import BTRFSSubVolumeDevice
+from blivet.formats import get_format
+from blivet.size import Size
+
+__all__ = ["Blivet"]
+
+class Blivet(object):
+    """ The parts of the blivet storage object used by the addon """
+    def __init__(self, devices=None):
+        self.devices = list(devices or [])
+        # (action, device) for every create_device and resize_device call
+        self.actions = []
+
+    @property
+    def vgs(self):
+        return [d for d in self.devices if isinstance(d, LVMVolumeGroupDevice)]
+
+    @property
+    def lvs(self):
+        return [d for d in self.devices if isinstance(d, LVMLogicalVolumeDevice)]
+
+    @property
+    def mountpoints(self):
+        return {d.format.mountpoint: d for d in self.devices
+                if getattr(d.format, "mountpoint", None)}
+
+    def new_lv(self, *args, **kwargs):
+        if kwargs.pop("thin_pool", False):
+            return LVMThinPoolDevice(*args, **kwargs)
+        return LVMLogicalVolumeDevice(*args, **kwargs)
+
+    def new_btrfs_sub_volume(self, name=None, parents=None, mountpoint=None, **kwargs):
+        return BTRFSSubVolumeDevice(name, parents=parents, fmt=get_format("btrfs", mountpoint=mountpoint))
+
+    def create_device(self, device):
+        self.devices.append(device)
+        self.actions.append(("create", device))
+
+    def resize_device(self, device, new_size):
+        device.size = Size(new_size)
+        self.actions.append(("resize", device))
@@ -0,0 +1,62 @@
+'''
+Stand-in for blivet.devices
+'''
+from blivet.formats import get_format
+from blivet.size import Size
+
+__all__ = ["StorageDevice", "LVMVolumeGroupDevice", "LVMLogicalVolumeDevice", "LVMThinPoolDevice",
+           "BTRFSDevice", "BTRFSVolumeDevice", "BTRFSSubVolumeDevice"]
+
+class StorageDevice(object):
+    def __init__(self, name, size=0, fmt=None, parents=None, exists=False):
+        self.name = name
+        self.size = size
+        self.format = fmt or get_format(None)
+        self.parents = list(parents or [])
+        self.exists = exists
+
+    @property
+    def path(self):
+        return "/dev/" + self.name
+
+class LVMVolumeGroupDevice(StorageDevice):
+    def __init__(self, name, size=0, fmt=None, parents=None, exists=False):
+        StorageDevice.__init__(self, name, size, fmt, parents, exists)
+        self.lvs = []
+
+    @property
+    def free_space(self):
+        return Size(self.size - sum(lv.size + getattr(lv, "metadata_size", 0) for lv in self.lvs))
+
+class LVMLogicalVolumeDevice(StorageDevice):
+    """ name is the VG name and LV name joined with '-', as in blivet """
+    def __init__(self, name, size=0, fmt=None, parents=None, exists=False, seg_type="linear"):
+        vg = parents[0] if parents else None
+        StorageDevice.__init__(self, "%s-%s" % (vg.name, name) if vg else name,
+                               size, fmt, parents, exists)
+        self.lvname = name
+        self.seg_type = seg_type
+        if vg:
+            vg.lvs.append(self)
+
+    @property
+    def vg(self):
+        return self.parents[0]
+
+class LVMThinPoolDevice(LVMLogicalVolumeDevice):
+    def __init__(self, name, size=0, fmt=None, parents=None, exists=False,
+                 metadata_size=None, chunk_size=None):
+        LVMLogicalVolumeDevice.__init__(self, name, size, fmt, parents, exists, seg_type="thin-pool")
+        self.metadata_size = metadata_size or 0
+        self.chunk_size = chunk_size
+
+class BTRFSDevice(StorageDevice):
+    pass
+
+class BTRFSVolumeDevice(BTRFSDevice):
+    pass
+
+class BTRFSSubVolumeDevice(BTRFSDevice):
+    @property
+    def volume(self):
+        return self.parents[0]
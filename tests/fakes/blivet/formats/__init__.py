@@ -0,0 +1,17 @@
+'''
+Stand-in for blivet.formats
+'''
+__all__ = ["DeviceFormat", "get_format"]
+
+class DeviceFormat(object):
+    def __init__(self, fmt_type=None, mountpoint=None, exists=False, **kwargs):
+        self.type = fmt_type
+        self.mountpoint = mountpoint
+        self.exists = exists
+        self.options = kwargs.get("options", "defaults")
+        self.create_options = kwargs.get("create_options")
+
+_FORMATS = ["xfs", "ext2", "ext3", "ext4", "btrfs", "vfat", "swap", "lvmpv"]
+
+def get_format(fmt_type, **kwargs):
+    return DeviceFormat(fmt_type if fmt_type in _FORMATS else None, **kwargs)
@@ -0,0 +1,40 @@
+'''
+Stand-in for blivet.size
+'''
+import re
+
+__all__ = ["Size"]
+
+_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1000, "KIB": 1024, "M": 1024**2, "MB": 1000**2,
+          "MIB": 1024**2, "G": 1024**3, "GB": 1000**3, "GIB": 1024**3, "T": 1024**4,
+          "TB": 1000**4, "TIB": 1024**4}
+
+class Size(int):
+    """ Size in bytes, parsed from strings like "512 KiB" """
+    def __new__(cls, value=0):
+        if isinstance(value, str):
+            match = re.match(r"^\s*([0-9.]+)\s*([a-zA-Z]*)\s*$", value)
+            if not match or match.group(2).upper() not in _UNITS:
+                raise ValueError("invalid size specification: %s" % value)
+            value = float(match.group(1)) * _UNITS[match.group(2).upper()]
+        return int.__new__(cls, int(value))
+
+    def __add__(self, other):
+        return Size(int(self) + int(other))
+
+    def __sub__(self, other):
+        return Size(int(self) - int(other))
+
+    def __mul__(self, other):
+        return Size(int(self) * other)
+
+    def __floordiv__(self, other):
+        if isinstance(other, Size):
+            return int(self) // int(other)
+        return Size(int(self) // other)
+
+    def __str__(self):
+        for unit in ["TiB", "GiB", "MiB", "KiB"]:
+            if self >= _UNITS[unit.upper()]:
+                return "%.2f %s" % (self / _UNITS[unit.upper()], unit)
+        return "%d B" % int(self)
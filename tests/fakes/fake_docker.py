@@ -0,0 +1,260 @@
+'''
+Fake docker daemon and CLI
+
+FakeDockerServer answers the Engine API endpoints used by the addon on a Unix
+socket, with configurable latency. Run as a program (see bin/docker) it stands
+in for the docker binary and is configured with environment variables:
+
+    FAKE_DOCKER_SOCKET      socket the daemon listens on
+    FAKE_DOCKER_STARTUP     seconds before the daemon starts listening
+    FAKE_DOCKER_SHUTDOWN    seconds the daemon takes to exit after SIGTERM
+    FAKE_DOCKER_LATENCY     seconds added to every API request and CLI pull
+    FAKE_DOCKER_STATE       directory where pulls and daemon API requests are recorded
+    FAKE_DOCKER_IMAGES      comma separated tags or digests of the images the daemon already has
+'''
+import http.server
+import json
+import os
+import re
+import signal
+import socketserver
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, unquote
+
+__all__ = ["FakeDockerServer", "main"]
+
+# Requests for a named image or container, eg. GET /containers/db/json
+_OBJECT_RE = re.compile(r"^/(images|containers)/(.+)/(json|start|stop)$")
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def address_string(self):
+        return "unix"
+
+    def _body(self):
+        self.data = b""
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            size = 0
+            while True:
+                chunk = int(self.rfile.readline().strip(), 16)
+                if chunk == 0:
+                    self.rfile.readline()
+                    return size
+                size += len(self.rfile.read(chunk))
+                self.rfile.readline()
+        self.data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        return len(self.data)
+
+    def _query(self):
+        query = parse_qs(self.path.split("?", 1)[1]) if "?" in self.path else {}
+        return {k: v[0] for k, v in query.items()}
+
+    def _reply(self, status, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        server = self.server
+        size = self._body() if method == "POST" else 0
+        server.requests.append((method, self.path, size))
+        if server.state:
+            with open(os.path.join(server.state, "requests"), "a") as fp:
+                fp.write("%s %s\n" % (method, self.path))
+        if server.latency:
+            time.sleep(server.latency)
+        path = self.path.split("?", 1)[0]
+        match = _OBJECT_RE.match(path)
+        if match:
+            self.target = unquote(match.group(2))
+            path = "/%s/%s/target" % (match.group(1), match.group(3))
+        handler = getattr(self, "%s_%s" % (method, path.strip("/").replace("/", "_")), None)
+        if handler is None:
+            self._reply(404, {"message": "page not found"})
+        else:
+            handler(size)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def GET__ping(self, size):
+        self._reply(200, b"OK", "text/plain")
+
+    def POST_images_create(self, size):
+        query = self._query()
+        tag = query.get("tag", "latest")
+        image = query["fromImage"] + ("@" if ":" in tag else ":") + tag
+        if self.server.state:
+            with open(os.path.join(self.server.state, "pulls"), "a") as fp:
+                fp.write(image + "\n")
+        if "missing" in image:
+            self._reply(200, b'{"status":"Pulling from %s"}\n{"error":"manifest for %s not found"}\n'
+                        % (image.encode(), image.encode()))
+            return
+        self.server.images.append(image)
+        messages = [{"status": "Pulling from %s" % query["fromImage"], "id": tag},
+                    {"status": "Already exists", "id": "base"},
+                    {"status": "Pulling fs layer", "id": "top"},
+                    {"status": "Downloading", "id": "top", "progressDetail": {"current": 512, "total": 1024}},
+                    {"status": "Download complete", "id": "top", "progressDetail": {}},
+                    {"status": "Pull complete", "id": "top", "progressDetail": {}},
+                    {"status": "Digest: sha256:" + "0" * 64},
+                    {"status": "Status: Downloaded newer image for %s" % image}]
+        self._reply(200, b"".join(json.dumps(m).encode("utf-8") + b"\n" for m in messages))
+
+    def GET_images_json(self, size):
+        images = []
+        for ref in self.server.images:
+            key = "RepoDigests" if "@" in ref else "RepoTags"
+            images.append({"Id": "sha256:%064x" % len(images), "RepoTags": [], "RepoDigests": [], key: [ref]})
+        self._reply(200, images)
+
+    def GET_images_json_target(self, size):
+        if self.target not in self.server.images:
+            self._reply(404, {"message": "No such image: %s" % self.target})
+        else:
+            self._reply(200, {"Id": "sha256:%064x" % self.server.images.index(self.target),
+                              "RepoTags": [self.target]})
+
+    def POST_containers_create(self, size):
+        config = json.loads(self.data.decode("utf-8"))
+        if config.get("Image") not in self.server.images:
+            self._reply(404, {"message": "No such image: %s" % config.get("Image")})
+            return
+        cid = "%064x" % (len(self.server.containers) + 1)
+        self.server.containers[cid] = {"Id": cid, "Name": "/" + self._query().get("name", cid[:12]),
+                                       "Config": config, "State": {"Running": False}}
+        self._reply(201, {"Id": cid, "Warnings": []})
+
+    def _container(self):
+        for container in self.server.containers.values():
+            if self.target in (container["Id"], container["Name"][1:]):
+                return container
+        self._reply(404, {"message": "No such container: %s" % self.target})
+        return None
+
+    def GET_containers_json_target(self, size):
+        container = self._container()
+        if container:
+            self._reply(200, container)
+
+    def _set_running(self, running):
+        container = self._container()
+        if container:
+            changed = container["State"]["Running"] != running
+            container["State"]["Running"] = running
+            self._reply(204 if changed else 304, b"")
+
+    def POST_containers_start_target(self, size):
+        self._set_running(True)
+
+    def POST_containers_stop_target(self, size):
+        self._set_running(False)
+
+    def POST_containers_prune(self, size):
+        self._reply(200, {"ContainersDeleted": ["c0ffee"], "SpaceReclaimed": 1000})
+
+    def POST_images_prune(self, size):
+        reclaimed = 50000 if "false" in self.path else 20000
+        self._reply(200, {"ImagesDeleted": [{"Deleted": "sha256:0123"}], "SpaceReclaimed": reclaimed})
+
+    def POST_volumes_prune(self, size):
+        self._reply(200, {"VolumesDeleted": ["dbdata"], "SpaceReclaimed": 300})
+
+    def POST_build_prune(self, size):
+        self._reply(200, {"SpaceReclaimed": 0})
+
+    def POST_images_load(self, size):
+        if size == 0:
+            self._reply(200, b'{"errorDetail":{"message":"empty archive"},"error":"empty archive"}\n')
+        elif self.data.startswith(b"corrupt"):
+            self._reply(200, b'{"errorDetail":{"message":"invalid tar header"},"error":"invalid tar header"}\n')
+        else:
+            self._reply(200, b'{"stream":"Loaded image: fake:%d\\n"}\n' % size)
+
+class FakeDockerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ Fake Engine API server on a Unix socket """
+    daemon_threads = True
+
+    def __init__(self, socket_path, latency=0.0, state=None, images=None):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path, _Handler)
+        self.socket_path = socket_path
+        self.latency = latency
+        self.state = state
+        self.images = list(images or [])
+        self.containers = {}
+        self.requests = []
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+def _env_float(name):
+    return float(os.environ.get(name, "0") or 0)
+
+def _daemon(args):
+    print("fake docker daemon %s" % " ".join(args), flush=True)
+    time.sleep(_env_float("FAKE_DOCKER_STARTUP"))
+    server = FakeDockerServer(os.environ["FAKE_DOCKER_SOCKET"], _env_float("FAKE_DOCKER_LATENCY"),
+                              os.environ.get("FAKE_DOCKER_STATE"),
+                              [i for i in os.environ.get("FAKE_DOCKER_IMAGES", "").split(",") if i])
+
+    def terminate(signum, frame):
+        time.sleep(_env_float("FAKE_DOCKER_SHUTDOWN"))
+        server.server_close()
+        os.unlink(server.socket_path)
+        print("fake docker daemon exiting", flush=True)
+        os._exit(0)
+    signal.signal(signal.SIGTERM, terminate)
+    server.serve_forever()
+    return 0
+
+def _pull(args):
+    image = args[-1]
+    time.sleep(_env_float("FAKE_DOCKER_LATENCY"))
+    state = os.environ.get("FAKE_DOCKER_STATE")
+    if state:
+        with open(os.path.join(state, "pulls"), "a") as fp:
+            fp.write(image + "\n")
+    if "missing" in image:
+        print("Error: image %s not found" % image)
+        return 1
+    print("Status: Downloaded newer image for %s" % image)
+    return 0
+
+def main(argv):
+    if len(argv) > 1 and argv[1] == "daemon":
+        return _daemon(argv[2:])
+    if len(argv) > 1 and argv[1] == "pull":
+        return _pull(argv[2:])
+    print("fake docker %s" % " ".join(argv[1:]))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
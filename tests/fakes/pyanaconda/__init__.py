@@ -0,0 +1,3 @@
+'''
+Stand-in for pyanaconda used by the tests
+'''
@@ -0,0 +1,29 @@
+'''
+Stand-in for pyanaconda.addons
+'''
+__all__ = ["AddonData"]
+
+class AddonData(object):
+    """ Base class of the addon data, as in anaconda """
+    def __init__(self, name):
+        self.name = name
+        self.content = ""
+        self.header_args = ""
+
+    def __str__(self):
+        return "%%addon %s %s\n%s%%end\n" % (self.name, self.header_args, self.content)
+
+    def setup(self, storage, ksdata, instClass, payload):
+        pass
+
+    def execute(self, storage, ksdata, instClass, users, payload):
+        pass
+
+    def handle_header(self, lineno, args):
+        self.header_args += " ".join(args)
+
+    def handle_line(self, line):
+        self.content += line
+
+    def finalize(self):
+        pass
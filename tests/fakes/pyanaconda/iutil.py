@@ -0,0 +1,42 @@
+'''
+Stand-in for pyanaconda.iutil
+
+Programs are run for real, with the tests' fake binaries first in $PATH.
+mount and umount are only recorded in mounts so the tests don't need root.
+'''
+import os
+import subprocess
+
+__all__ = ["getSysroot", "setSysroot", "execWithRedirect", "execWithCapture", "startProgram"]
+
+_sysroot = "/mnt/sysimage"
+
+# (command, argv) of every mount and umount call
+mounts = []
+
+def getSysroot():
+    return _sysroot
+
+def setSysroot(path):
+    global _sysroot
+    _sysroot = path
+
+def startProgram(argv, root='/', stdin=None, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                 env_prune=None, env_add=None, reset_handlers=True, reset_lang=True, **kwargs):
+    return subprocess.Popen(argv, stdin=stdin, stdout=stdout, stderr=stderr, **kwargs)
+
+def execWithRedirect(command, argv, stdin=None, stdout=None, root='/', env_prune=None,
+                     log_output=True, binary_output=False):
+    if command in ("mount", "umount"):
+        mounts.append((command, argv))
+        return 0
+    if stdout is None:
+        stdout = subprocess.DEVNULL
+    return subprocess.call([command] + argv, stdin=stdin, stdout=stdout, stderr=subprocess.STDOUT)
+
+def execWithCapture(command, argv, stdin=None, root='/', log_output=True, filter_stderr=False):
+    try:
+        return subprocess.check_output([command] + argv, stdin=stdin, universal_newlines=True,
+                                       stderr=subprocess.DEVNULL if filter_stderr else subprocess.STDOUT)
+    except subprocess.CalledProcessError as e:
+        return e.output
@@ -0,0 +1,9 @@
+'''
+Stand-in for pyanaconda.progress, messages are kept in messages
+'''
+__all__ = ["progress_message"]
+
+messages = []
+
+def progress_message(message):
+    messages.append(message)
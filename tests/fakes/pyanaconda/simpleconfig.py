@@ -0,0 +1,42 @@
+'''
+Stand-in for pyanaconda.simpleconfig
+'''
+import shlex
+
+__all__ = ["SimpleConfigFile"]
+
+class SimpleConfigFile(object):
+    """ KEY=value shell style config file """
+    def __init__(self, filename):
+        self.filename = filename
+        self.lines = []
+        self.info = {}
+
+    def read(self):
+        with open(self.filename) as fp:
+            for line in fp:
+                self.lines.append(line)
+                key, sep, value = line.strip().partition("=")
+                if sep and not key.startswith("#"):
+                    self.info[key.strip()] = " ".join(shlex.split(value))
+
+    def get(self, key):
+        return self.info.get(key, "")
+
+    def set(self, *args):
+        for key, value in args:
+            self.info[key] = value
+
+    def write(self):
+        written = set()
+        with open(self.filename, "w") as fp:
+            for line in self.lines:
+                key = line.strip().partition("=")[0].strip()
+                if key in self.info and not key.startswith("#"):
+                    fp.write("%s=%s\n" % (key, shlex.quote(self.info[key])))
+                    written.add(key)
+                else:
+                    fp.write(line)
+            for key in self.info:
+                if key not in written:
+                    fp.write("%s=%s\n" % (key, shlex.quote(self.info[key])))
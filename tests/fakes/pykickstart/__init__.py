@@ -0,0 +1,3 @@
+'''
+Stand-in for pykickstart used by the tests
+'''
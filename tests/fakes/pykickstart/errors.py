@@ -0,0 +1,13 @@
+'''
+Stand-in for pykickstart.errors
+'''
+__all__ = ["KickstartParseError", "formatErrorMsg"]
+
+class KickstartParseError(Exception):
+    pass
+
+def formatErrorMsg(lineno, msg=""):
+    if msg:
+        return "The following problem occurred on line %(lineno)s of the kickstart file:\n\n%(msg)s\n" % \
+               {"lineno": lineno, "msg": msg}
+    return "There was a problem reading from line %s of the kickstart file" % lineno
@@ -0,0 +1,24 @@
+'''
+Stand-in for pykickstart.options
+'''
+from optparse import OptionParser
+
+from pykickstart.errors import KickstartParseError, formatErrorMsg
+
+__all__ = ["KSOptionParser"]
+
+class KSOptionParser(OptionParser):
+    """ optparse based option parser raising KickstartParseError """
+    def __init__(self, *args, **kwargs):
+        OptionParser.__init__(self, *args, add_help_option=False, **kwargs)
+        self.lineno = None
+
+    def error(self, msg):
+        raise KickstartParseError(formatErrorMsg(self.lineno, msg=msg))
+
+    def exit(self, status=0, msg=None):
+        pass
+
+    def parse_args(self, args=None, values=None, lineno=None):
+        self.lineno = lineno
+        return OptionParser.parse_args(self, args=args, values=values)
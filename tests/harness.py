@@ -0,0 +1,167 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+'''
+Test harness running the addon against the fakes in tests/fakes
+'''
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+from blivet import Blivet
+from blivet.devices import LVMVolumeGroupDevice, LVMLogicalVolumeDevice, LVMThinPoolDevice, StorageDevice
+from blivet.devices import BTRFSVolumeDevice, BTRFSSubVolumeDevice
+from blivet.formats import get_format
+from blivet.size import Size
+from pyanaconda import iutil
+
+from com_redhat_docker import api
+from com_redhat_docker.ks.docker import DockerData
+
+FAKE_BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fakes", "bin")
+
+DOCKER_SYSCONFIG = "OPTIONS='--selinux-enabled --log-driver=journald'\n"
+
+def make_addon(args, content="", lineno=1):
+    """ Return a DockerData set up from a %addon header and section body """
+    addon = DockerData("com_redhat_docker")
+    addon.handle_header(lineno, args)
+    for line in content.splitlines(True):
+        addon.handle_line(line)
+    return addon
+
+def make_ksdata(packages=("docker",), selinux=True):
+    return SimpleNamespace(packages=SimpleNamespace(packageList=list(packages)),
+                           selinux=SimpleNamespace(selinux=selinux))
+
+def lvm_storage(vgname="docker", pool=True, vgs=1, lvs_per_vg=0, vg_size="100 GiB", exists=False):
+    """ Storage with vgs VGs, the first named vgname, each holding lvs_per_vg LVs """
+    devices = []
+    for i in range(vgs):
+        vg = LVMVolumeGroupDevice(vgname if i == 0 else "vg%d" % i, size=Size(vg_size), exists=exists)
+        devices.append(vg)
+        devices.extend(LVMLogicalVolumeDevice("lv%d" % j, size=Size("100 MiB"), parents=[vg], exists=exists)
+                       for j in range(lvs_per_vg))
+    if pool:
+        devices.append(LVMThinPoolDevice("docker-pool", size=Size("8 GiB"), parents=[devices[0]],
+                                         metadata_size=Size("8 MiB"), exists=exists))
+    return Blivet(devices)
+
+def btrfs_storage(mountpoint="/var/lib/docker", subvol=True):
+    """ A btrfs volume, or a subvolume on it when subvol is True, mounted at mountpoint """
+    if not subvol:
+        return Blivet([BTRFSVolumeDevice("btrfs.10", size=Size("10 GiB"),
+                                         fmt=get_format("btrfs", mountpoint=mountpoint))])
+    volume = BTRFSVolumeDevice("btrfs.10", size=Size("10 GiB"), fmt=get_format("btrfs"))
+    sub = BTRFSSubVolumeDevice("root", parents=[volume],
+                               fmt=get_format("btrfs", mountpoint=mountpoint))
+    return Blivet([volume, sub])
+
+def plain_storage(fstype="xfs", mountpoint="/", exists=False):
+    return Blivet([StorageDevice("sda1", size=Size("20 GiB"), exists=exists,
+                                 fmt=get_format(fstype, mountpoint=mountpoint, exists=exists))])
+
+class AddonHarness(object):
+    """ A sysroot, fake docker binary and daemon socket for running the addon
+
+    Use as a context manager. The fake docker binary is first in $PATH and is
+    configured with the startup, shutdown and request latencies given here,
+    and the fake daemon starts out with the images given here.
+    """
+    def __init__(self, startup=0.0, shutdown=0.0, latency=0.0, images=()):
+        self.startup = startup
+        self.shutdown = shutdown
+        self.latency = latency
+        self.images = images
+        self.tmpdir = None
+        self.sysroot = None
+        self.socket_path = None
+        self._saved = {}
+
+    def __enter__(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+        self.sysroot = os.path.join(self.tmpdir, "sysimage")
+        for d in ["etc/sysconfig", "etc/docker", "var/lib/docker", "var/log"]:
+            os.makedirs(os.path.join(self.sysroot, d))
+        with open(self.path("/etc/sysconfig/docker"), "w") as fp:
+            fp.write(DOCKER_SYSCONFIG)
+        self.socket_path = os.path.join(self.tmpdir, "docker.sock")
+
+        env = {"PATH": FAKE_BIN + os.pathsep + os.environ.get("PATH", ""),
+               "FAKE_DOCKER_SOCKET": self.socket_path,
+               "FAKE_DOCKER_STARTUP": str(self.startup),
+               "FAKE_DOCKER_SHUTDOWN": str(self.shutdown),
+               "FAKE_DOCKER_LATENCY": str(self.latency),
+               "FAKE_DOCKER_STATE": self.tmpdir,
+               "FAKE_DOCKER_IMAGES": ",".join(self.images)}
+        self._saved = {k: os.environ.get(k) for k in env}
+        os.environ.update(env)
+        self._saved_socket = api.DOCKER_SOCKET
+        api.DOCKER_SOCKET = self.socket_path
+        self._saved_sysroot = iutil.getSysroot()
+        iutil.setSysroot(self.sysroot)
+        del iutil.mounts[:]
+        return self
+
+    def __exit__(self, *exc):
+        iutil.setSysroot(self._saved_sysroot)
+        api.DOCKER_SOCKET = self._saved_socket
+        for k, v in self._saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def path(self, path):
+        """ Return the location of a target system path """
+        return self.sysroot + path
+
+    def read(self, path):
+        with open(self.path(path)) as fp:
+            return fp.read()
+
+    def pulls(self):
+        """ Images pulled with the fake docker CLI, in order """
+        try:
+            with open(os.path.join(self.tmpdir, "pulls")) as fp:
+                return fp.read().split()
+        except FileNotFoundError:
+            return []
+
+    def requests(self):
+        """ Engine API requests made to the fake daemon, as "METHOD path", in order """
+        try:
+            with open(os.path.join(self.tmpdir, "requests")) as fp:
+                return fp.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def commands(self):
+        """ Command lines run through the fake system tools, in order """
+        try:
+            with open(os.path.join(self.tmpdir, "commands")) as fp:
+                return fp.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def run(self, addon, storage, ksdata=None):
+        """ Run setup and execute like anaconda does """
+        ksdata = ksdata or make_ksdata()
+        addon.setup(storage, ksdata, None, None)
+        addon.execute(storage, ksdata, None, None, None)
@@ -0,0 +1,109 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import shutil
+import tempfile
+import unittest
+
+from com_redhat_docker.api import DockerClient, DockerAPIError, ping
+
+from fake_docker import FakeDockerServer
+
+class DockerClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+        self.server = FakeDockerServer(os.path.join(self.tmpdir, "docker.sock"), images=["busybox:latest"]).start()
+        self.client = DockerClient(self.server.socket_path)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_persistent_connection(self):
+        self.assertTrue(self.client.ping())
+        self.assertEqual(len(self.client.images()), 1)
+        self.client.prune("volumes")
+        sock = self.client._conn.sock
+        self.assertIsNotNone(sock)
+        self.assertTrue(self.client.ping())
+        self.assertIs(self.client._conn.sock, sock)
+
+    def test_reconnect(self):
+        self.assertTrue(self.client.ping())
+        # The daemon drops the idle connection
+        self.client._conn.sock.shutdown(2)
+        self.assertEqual(len(self.client.images()), 1)
+
+    def test_pull(self):
+        seen = []
+        progress = self.client.pull("registry:5000/app:1", lambda p: seen.append(p.downloaded))
+        self.assertEqual(self.server.requests[-1][1], "/images/create?fromImage=registry%3A5000%2Fapp&tag=1")
+        self.assertEqual((progress.layers, progress.downloaded, progress.total, progress.existing), (1, 1024, 1024, 1))
+        self.assertEqual(progress.digest, "sha256:" + "0" * 64)
+        self.assertEqual(progress.status, "Status: Downloaded newer image for registry:5000/app:1")
+        self.assertIn(512, seen)
+
+        self.client.pull("fedora")
+        self.assertIn("fedora:latest", self.server.images)
+        self.client.pull("fedora@sha256:abcd")
+        self.assertIn("fedora@sha256:abcd", self.server.images)
+
+        with self.assertRaises(DockerAPIError) as cm:
+            self.client.pull("missing")
+        self.assertIn("not found", str(cm.exception))
+        # The connection is still usable after an error in the stream
+        self.assertTrue(self.client.ping())
+
+    def test_load(self):
+        seen = []
+        messages = self.client.load(b"x" * 100, length=100, progress=seen.append)
+        self.assertEqual(messages, [{"stream": "Loaded image: fake:100\n"}])
+        self.assertEqual(seen, messages)
+        with self.assertRaises(DockerAPIError):
+            self.client.load(b"", length=0)
+
+    def test_inspect_image(self):
+        self.assertEqual(self.client.inspect_image("busybox:latest")["RepoTags"], ["busybox:latest"])
+        with self.assertRaises(DockerAPIError) as cm:
+            self.client.inspect_image("nope")
+        self.assertEqual(cm.exception.status, 404)
+        self.assertIn("No such image: nope", str(cm.exception))
+
+    def test_containers(self):
+        cid = self.client.create_container({"Image": "busybox:latest", "Cmd": ["true"]}, name="db")
+        self.assertFalse(self.client.inspect_container("db")["State"]["Running"])
+        self.client.start_container(cid)
+        self.client.start_container("db")
+        self.assertTrue(self.client.inspect_container(cid)["State"]["Running"])
+        self.client.stop_container("db", timeout=5)
+        self.assertEqual(self.server.requests[-1][1], "/containers/db/stop?t=5")
+        self.assertFalse(self.client.inspect_container("db")["State"]["Running"])
+        with self.assertRaises(DockerAPIError):
+            self.client.create_container({"Image": "nope"})
+        with self.assertRaises(DockerAPIError):
+            self.client.stop_container("nope")
+
+    def test_no_daemon(self):
+        self.assertFalse(ping(os.path.join(self.tmpdir, "nope.sock")))
+        with DockerClient(os.path.join(self.tmpdir, "nope.sock")) as client:
+            with self.assertRaises(OSError):
+                client.images()
+
+if __name__ == "__main__":
+    unittest.main()
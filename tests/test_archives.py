@@ -0,0 +1,96 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import gzip
+import os
+import tarfile
+import tempfile
+import shutil
+import unittest
+
+from com_redhat_docker.archives import find_archives, load_archives, estimate_archive_size
+from com_redhat_docker.archives import COMPRESSION_RATIO
+
+from fake_docker import FakeDockerServer
+
+class ArchivesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+        self.images = os.path.join(self.tmpdir, "images")
+        os.makedirs(os.path.join(self.images, "layout", "blobs", "sha256"))
+        with open(os.path.join(self.images, "layout", "oci-layout"), "w") as fp:
+            fp.write('{"imageLayoutVersion": "1.0.0"}')
+        with open(os.path.join(self.images, "layout", "blobs", "sha256", "0123"), "wb") as fp:
+            fp.write(os.urandom(2 * 1024 * 1024))
+        with open(os.path.join(self.images, "busybox.tar"), "wb") as fp:
+            fp.write(os.urandom(300 * 1024))
+        open(os.path.join(self.images, "empty.tar.gz"), "w").close()
+        with open(os.path.join(self.images, "corrupt.tar"), "wb") as fp:
+            fp.write(b"corrupt".ljust(1024, b"\0"))
+        open(os.path.join(self.images, "README"), "w").close()
+        os.makedirs(os.path.join(self.images, "other"))
+        self.server = FakeDockerServer(os.path.join(self.tmpdir, "docker.sock")).start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_find(self):
+        self.assertEqual([os.path.basename(a) for a in find_archives(self.images)],
+                         ["busybox.tar", "corrupt.tar", "empty.tar.gz", "layout"])
+        self.assertEqual([os.path.basename(a) for a in find_archives(self.images, layouts=False)],
+                         ["busybox.tar", "corrupt.tar", "empty.tar.gz"])
+
+    def test_load(self):
+        results = {os.path.basename(r.path): r for r in
+                   load_archives(self.images, 3, self.server.socket_path)}
+        self.assertTrue(results["busybox.tar"].ok)
+        self.assertEqual(results["busybox.tar"].size, 300 * 1024)
+        self.assertEqual(results["busybox.tar"].images, ["fake:307200"])
+        # The daemon cannot load OCI layouts, they are left to podman
+        self.assertNotIn("layout", results)
+        # The daemon rejects the empty and the corrupt archives, the bytes sent are still counted
+        self.assertFalse(results["empty.tar.gz"].ok)
+        self.assertFalse(results["corrupt.tar"].ok)
+        self.assertEqual(results["corrupt.tar"].size, 1024)
+
+        loads = [r for r in self.server.requests if r[1].startswith("/images/load")]
+        self.assertEqual(sorted(r[2] for r in loads), [0, 1024, 300 * 1024])
+
+    def test_estimate(self):
+        layout = os.path.join(self.images, "layout")
+        with open(os.path.join(layout, "blobs", "sha256", "4567"), "wb") as fp:
+            fp.write(gzip.compress(os.urandom(1000)))
+        gz_size = os.path.getsize(os.path.join(layout, "blobs", "sha256", "4567"))
+        expected = 2 * 1024 * 1024 + gz_size * COMPRESSION_RATIO + os.path.getsize(os.path.join(layout, "oci-layout"))
+        self.assertEqual(estimate_archive_size(layout), expected)
+
+        archive = os.path.join(self.tmpdir, "oci.tar")
+        with tarfile.open(archive, "w") as tar:
+            tar.add(layout, arcname=".")
+        self.assertEqual(estimate_archive_size(archive), expected)
+
+        with gzip.open(archive + ".gz", "wb") as fp:
+            fp.write(b"x" * 100)
+        self.assertEqual(estimate_archive_size(archive + ".gz"),
+                         os.path.getsize(archive + ".gz") * COMPRESSION_RATIO)
+
+    def test_missing_dir(self):
+        self.assertEqual(load_archives(os.path.join(self.tmpdir, "nope"), 1, self.server.socket_path), [])
+
+if __name__ == "__main__":
+    unittest.main()
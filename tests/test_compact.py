@@ -0,0 +1,50 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import shutil
+import tempfile
+import unittest
+from urllib.parse import unquote
+
+from com_redhat_docker.compact import compact
+
+from fake_docker import FakeDockerServer
+
+class CompactTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+        self.server = FakeDockerServer(os.path.join(self.tmpdir, "docker.sock")).start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_order(self):
+        reclaimed = compact(["volumes", "dangling-images", "containers"], self.server.socket_path)
+        self.assertEqual(reclaimed, 21300)
+        self.assertEqual([unquote(r[1]) for r in self.server.requests],
+                         ['/containers/prune', '/images/prune?filters={"dangling": ["true"]}', '/volumes/prune'])
+
+    def test_unused_images(self):
+        self.assertEqual(compact(["unused-images"], self.server.socket_path), 50000)
+
+    def test_no_daemon(self):
+        self.assertEqual(compact(["containers"], os.path.join(self.tmpdir, "nope.sock")), 0)
+
+if __name__ == "__main__":
+    unittest.main()
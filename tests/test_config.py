@@ -0,0 +1,62 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from com_redhat_docker.config import merge_daemon_json
+
+class MergeDaemonJsonTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+        self.path = os.path.join(self.tmpdir, "etc", "docker", "daemon.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self):
+        with open(self.path) as fp:
+            return json.load(fp)
+
+    def test_new(self):
+        merge_daemon_json(self.path, {"live-restore": True})
+        self.assertEqual(self.read(), {"live-restore": True})
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["daemon.json"])
+
+    def test_merge(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as fp:
+            json.dump({"debug": True, "max-concurrent-downloads": 3,
+                       "log-opts": {"max-size": "1m", "labels": "a"}}, fp)
+        merge_daemon_json(self.path, {"max-concurrent-downloads": 10,
+                                      "log-opts": {"max-size": "10m", "max-file": "3"}})
+        self.assertEqual(self.read(), {"debug": True, "max-concurrent-downloads": 10,
+                                       "log-opts": {"max-size": "10m", "labels": "a", "max-file": "3"}})
+
+    def test_invalid(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as fp:
+            fp.write("{not json")
+        merge_daemon_json(self.path, {"shutdown-timeout": 30})
+        self.assertEqual(self.read(), {"shutdown-timeout": 30})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import sys
+import time
+import unittest
+
+from com_redhat_docker import api
+from com_redhat_docker.daemon import DockerDaemon
+
+from fake_docker import FakeDockerServer
+from harness import AddonHarness
+
+class PingTestCase(unittest.TestCase):
+    def test_ping(self):
+        with AddonHarness() as h:
+            self.assertFalse(api.ping(h.socket_path))
+            server = FakeDockerServer(h.socket_path).start()
+            try:
+                self.assertTrue(api.ping(h.socket_path))
+            finally:
+                server.stop()
+
+class DaemonTestCase(unittest.TestCase):
+    def _daemon(self, h, cmd=None, **kwargs):
+        return DockerDaemon(cmd or ["docker", "daemon"], os.path.join(h.tmpdir, "daemon.log"), **kwargs)
+
+    def test_waits_for_ready(self):
+        with AddonHarness(startup=0.3) as h:
+            daemon = self._daemon(h)
+            self.assertTrue(daemon.start())
+            self.assertTrue(api.ping(h.socket_path))
+            self.assertGreaterEqual(daemon.startup_time, 0.3)
+            daemon.stop()
+            self.assertFalse(daemon.running)
+            self.assertFalse(os.path.exists(h.socket_path))
+
+    def test_exits_early(self):
+        with AddonHarness() as h:
+            daemon = self._daemon(h, cmd=["false"])
+            self.assertFalse(daemon.start())
+            self.assertIsNone(daemon.startup_time)
+            daemon.stop()
+
+    def test_ready_timeout(self):
+        with AddonHarness(startup=5) as h:
+            daemon = self._daemon(h, ready_timeout=0.2)
+            start = time.monotonic()
+            self.assertFalse(daemon.start())
+            self.assertLess(time.monotonic() - start, 2)
+            daemon.stop()
+
+    def test_graceful_stop(self):
+        with AddonHarness(shutdown=0.2) as h:
+            daemon = self._daemon(h)
+            daemon.start()
+            daemon.stop()
+            with open(daemon.logfile) as fp:
+                self.assertIn("fake docker daemon exiting", fp.read())
+
+    def test_kill_after_timeout(self):
+        with AddonHarness() as h:
+            cmd = [sys.executable, "-c", "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(30)"]
+            daemon = self._daemon(h, cmd=cmd, ready_timeout=0.1, stop_timeout=0.2)
+            daemon.start()
+            start = time.monotonic()
+            daemon.stop()
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertFalse(daemon.running)
+
+if __name__ == "__main__":
+    unittest.main()
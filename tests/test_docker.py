@@ -0,0 +1,980 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from contextlib import contextmanager
+import gzip
+import json
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from blivet import Blivet
+from blivet.size import Size
+from pyanaconda import iutil, progress
+from pykickstart.errors import KickstartParseError
+
+from com_redhat_docker import early, probe
+from com_redhat_docker.ks.docker import DockerData, LVMStorage, OverlayStorage, Overlay2Storage, BTRFSStorage
+
+from harness import AddonHarness, make_addon, make_ksdata
+from harness import lvm_storage, btrfs_storage, plain_storage
+
+class HandleHeaderTestCase(unittest.TestCase):
+    def test_disabled(self):
+        addon = DockerData("com_redhat_docker")
+        self.assertFalse(addon.enabled)
+        self.assertEqual(str(addon), "")
+
+    def test_storage_choice(self):
+        self.assertIsInstance(make_addon(["--vgname=docker"]).storage, LVMStorage)
+        self.assertIsInstance(make_addon(["--overlay"]).storage, OverlayStorage)
+        self.assertIsInstance(make_addon(["--btrfs"]).storage, BTRFSStorage)
+
+    def test_storage_required(self):
+        for args in [[], ["--overlay", "--btrfs"], ["--overlay", "--vgname=docker"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+
+    def test_bad_fstype(self):
+        with self.assertRaises(KickstartParseError):
+            make_addon(["--vgname=docker", "--fstype=nosuchfs"])
+
+    def test_bad_parallel(self):
+        with self.assertRaises(KickstartParseError):
+            make_addon(["--overlay", "--parallel-pulls=0"])
+        with self.assertRaises(KickstartParseError):
+            make_addon(["--overlay", "--parallel-loads=0"])
+
+    def test_extra_args(self):
+        addon = make_addon(["--btrfs", "--save-args", "--", "-D", "-l", "debug"])
+        self.assertEqual(addon.extra_args, ["-D", "-l", "debug"])
+        self.assertTrue(addon.save_args)
+
+    def test_pull_list(self):
+        addon = make_addon(["--overlay", "--pull=fedora:24,fedora:25", "--pull=busybox"])
+        self.assertEqual(addon.images, ["fedora:24", "fedora:25", "busybox"])
+
+    def test_str_round_trip(self):
+        args = ["--vgname=docker", "--fstype=ext4", "--create-pool", "--pool-size=50",
+                "--pool-chunk-size=1MiB", "--pool-zero=y", "--save-args", "--pull=busybox",
+                "--parallel-pulls=2", "--load-dir=/run/install/repo/images",
+                "--trace-commands", "--", "-D"]
+        addon = make_addon(args, "docker images\n")
+        ks = str(addon)
+        self.assertTrue(ks.endswith("docker images\n%end\n"))
+
+        header = ks.splitlines()[0].split()[2:]
+        again = make_addon([a.replace('"', '') for a in header])
+        self.assertEqual(str(again).splitlines()[0], ks.splitlines()[0])
+
+class DaemonJsonTestCase(unittest.TestCase):
+    def test_bad_options(self):
+        for args in [["--overlay", "--max-concurrent-downloads=0"], ["--overlay", "--max-concurrent-uploads=0"],
+                     ["--overlay", "--container-log-max-file=0"], ["--overlay", "--container-log-max-size=big"],
+                     ["--overlay", "--shutdown-timeout=-1"],
+                     ["--overlay", "--live-restore", "--", "--live-restore"],
+                     ["--overlay", "--container-log-max-size=10m", "--", "--log-driver=journald"],
+                     ["--overlay", "--max-concurrent-downloads=4", "--", "--max-concurrent-downloads", "2"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+
+    def test_round_trip(self):
+        args = ["--overlay", "--max-concurrent-downloads=8", "--max-concurrent-uploads=2",
+                '--container-log-max-size="10m"', "--container-log-max-file=3", "--live-restore",
+                "--shutdown-timeout=30"]
+        self.assertEqual(str(make_addon([a.replace('"', '') for a in args])).splitlines()[0],
+                         "%%addon com_redhat_docker %s" % " ".join(args))
+
+    def test_execute(self):
+        with AddonHarness() as h:
+            with open(h.path("/etc/docker/daemon.json"), "w") as fp:
+                json.dump({"debug": True, "max-concurrent-downloads": 1}, fp)
+            h.run(make_addon(["--overlay", "--max-concurrent-downloads=8", "--container-log-max-size=10m",
+                              "--container-log-max-file=3", "--live-restore"]), plain_storage())
+            self.assertEqual(json.loads(h.read("/etc/docker/daemon.json")),
+                             {"debug": True, "max-concurrent-downloads": 8, "log-driver": "json-file",
+                              "log-opts": {"max-size": "10m", "max-file": "3"}, "live-restore": True})
+            self.assertNotIn("--log-driver", h.read("/etc/sysconfig/docker"))
+
+    def test_broken(self):
+        with AddonHarness() as h:
+            # daemon.json cannot be read or replaced
+            os.makedirs(h.path("/etc/docker/daemon.json"))
+            with self.assertLogs("anaconda", "ERROR"):
+                h.run(make_addon(["--overlay", "--live-restore"], "docker images\n"), plain_storage())
+            self.assertIn("fake docker images", h.read("/var/log/anaconda/docker-addon.log"))
+
+    def test_unmanaged(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--overlay"]), plain_storage())
+            self.assertFalse(os.path.exists(h.path("/etc/docker/daemon.json")))
+            self.assertIn("--log-driver=journald", h.read("/etc/sysconfig/docker"))
+
+class MirrorTestCase(unittest.TestCase):
+    def test_bad_options(self):
+        for args in [["--overlay", "--registry-mirror=ftp://mirror"], ["--overlay", "--registry-mirror=mirror:5000"],
+                     ["--overlay", "--insecure-registry=http://mirror"], ["--overlay", "--persist-mirrors"],
+                     ["--overlay", "--registry-mirror=http://m", "--persist-mirrors", "--", "--registry-mirror=http://n"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+
+    def test_round_trip(self):
+        args = ["--overlay", '--registry-mirror="http://mirror:5000"', '--registry-mirror="https://m2"',
+                '--insecure-registry="mirror:5000"', "--persist-mirrors"]
+        self.assertEqual(str(make_addon([a.replace('"', '') for a in args])).splitlines()[0],
+                         "%%addon com_redhat_docker %s" % " ".join(args))
+
+    def test_install_only(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--overlay", "--registry-mirror=http://localhost:1",
+                              "--insecure-registry=localhost:1", "--pull=busybox"]), plain_storage())
+            self.assertIn("--registry-mirror=http://localhost:1 --insecure-registry=localhost:1",
+                          h.read("/var/log/anaconda/docker-daemon.log"))
+            self.assertFalse(os.path.exists(h.path("/etc/docker/daemon.json")))
+            with open(h.path("/var/log/anaconda/docker-addon-timing.json")) as fp:
+                values = json.load(fp)["values"]
+            self.assertEqual((values["mirror_images"], values["mirror_bytes"],
+                              values["upstream_images"], values["upstream_bytes"]),
+                             (0, 0, 1, 1024))
+
+    def test_lookup_fails(self):
+        # The pulls and the rest of the install go on without the mirror metrics
+        class BrokenLookup(object):
+            def result(self):
+                raise AttributeError("'list' object has no attribute 'get'")
+
+        addon = make_addon(["--overlay", "--registry-mirror=http://mirror:5000", "--pull=busybox"])
+        with self.assertLogs("anaconda", "ERROR") as cm:
+            addon._report_sources(BrokenLookup(), [])
+        self.assertIn("registry mirrors failed", cm.output[0])
+        self.assertNotIn("mirror_images", addon.timer.values)
+
+    def test_persist(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--overlay", "--registry-mirror=http://mirror:5000",
+                              "--insecure-registry=mirror:5000", "--persist-mirrors"]), plain_storage())
+            self.assertNotIn("--registry-mirror", h.read("/var/log/anaconda/docker-daemon.log"))
+            self.assertEqual(json.loads(h.read("/etc/docker/daemon.json")),
+                             {"registry-mirrors": ["http://mirror:5000"], "insecure-registries": ["mirror:5000"]})
+
+class CompactTestCase(unittest.TestCase):
+    def test_bad_options(self):
+        for args in [["--overlay", "--compact=everything"], ["--overlay", "--compact=,"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+        self.assertIn("--compact=containers,volumes", str(make_addon(["--overlay", "--compact=containers,volumes"])))
+
+    def test_overlay(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--overlay", "--compact=volumes,containers"]), plain_storage())
+            self.assertEqual([r for r in h.requests() if "prune" in r],
+                             ["POST /containers/prune", "POST /volumes/prune"])
+            self.assertEqual(h.commands(), ["fstrim -v %s" % h.path("/var/lib/docker")])
+            with open(h.path("/var/log/anaconda/docker-addon-timing.json")) as fp:
+                timing = json.load(fp)
+            self.assertIn("compact", timing["phases"])
+            self.assertEqual(timing["values"]["compact_reclaimed_bytes"], 1300)
+
+    def test_lvm(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--vgname=docker", "--compact=dangling-images"]), lvm_storage())
+            self.assertEqual([r for r in h.requests() if "prune" in r],
+                             ["POST /images/prune?filters=%7B%22dangling%22%3A%20%5B%22true%22%5D%7D"])
+            self.assertFalse([c for c in h.commands() if c.startswith("fstrim")])
+
+def kept_pool(root_exists):
+    """ An existing docker-pool with a root filesystem that is kept or reformatted """
+    return Blivet(lvm_storage(exists=True).devices + plain_storage(exists=root_exists).devices)
+
+class ReuseTestCase(unittest.TestCase):
+    def test_pulls_missing(self):
+        with AddonHarness(images=["a:1", "docker.io/library/b:latest"]) as h:
+            addon = make_addon(["--overlay", "--reuse", "--pull=a:1,b,c"])
+            self.assertIn("--reuse", str(addon))
+            h.run(addon, plain_storage(exists=True))
+            self.assertEqual(h.pulls(), ["c:latest"])
+            self.assertIn("GET /images/json", h.requests())
+            with open(h.path("/var/log/anaconda/docker-addon-timing.json")) as fp:
+                timing = json.load(fp)
+            self.assertEqual(timing["values"]["reused_images"], 2)
+            self.assertEqual(timing["values"]["pulled_images"], 1)
+
+    def test_without_reuse(self):
+        with AddonHarness(images=["a:1"]) as h:
+            h.run(make_addon(["--overlay", "--pull=a:1"]), plain_storage(exists=True))
+            self.assertEqual(h.pulls(), ["a:1"])
+            self.assertNotIn("GET /images/json", h.requests())
+
+    def test_preserved(self):
+        self.assertTrue(make_addon(["--overlay"]).storage.preserved(plain_storage(exists=True)))
+        self.assertFalse(make_addon(["--overlay"]).storage.preserved(plain_storage()))
+        addon = make_addon(["--vgname=docker"])
+        self.assertTrue(addon.storage.preserved(kept_pool(root_exists=True)))
+        self.assertFalse(addon.storage.preserved(kept_pool(root_exists=False)))
+        self.assertFalse(addon.storage.preserved(lvm_storage(exists=True)))
+        self.assertFalse(addon.storage.preserved(lvm_storage()))
+        self.assertFalse(make_addon(["--btrfs"]).storage.preserved(btrfs_storage()))
+
+    def test_pool_without_root(self):
+        # devicemapper's metadata went with the reformatted root filesystem
+        addon = make_addon(["--vgname=docker", "--reuse"])
+        with self.assertRaisesRegex(KickstartParseError, "--reuse needs the filesystem"):
+            addon.setup(kept_pool(root_exists=False), make_ksdata(), None, None)
+        make_addon(["--vgname=docker", "--reuse"]).setup(kept_pool(root_exists=True), make_ksdata(), None, None)
+
+    def test_pool_without_metadata(self):
+        with AddonHarness() as h:
+            with self.assertLogs("anaconda", "ERROR") as cm:
+                h.run(make_addon(["--vgname=docker", "--reuse"]), kept_pool(root_exists=True))
+            self.assertIn("image/devicemapper is missing", "\n".join(cm.output))
+
+        with AddonHarness() as h:
+            os.makedirs(h.path("/var/lib/docker/image/devicemapper"))
+            with open(h.path("/var/lib/docker/image/devicemapper/repositories.json"), "w") as fp:
+                fp.write("{}")
+            with self.assertLogs("anaconda") as cm:
+                h.run(make_addon(["--vgname=docker", "--reuse"]), kept_pool(root_exists=True))
+            self.assertFalse([m for m in cm.output if m.startswith("ERROR")])
+
+class SchedulingTestCase(unittest.TestCase):
+    def test_bad_options(self):
+        for args in [["--nice=20"], ["--nice=-21"], ["--ionice-class=fast"], ["--ionice-level=8"],
+                     ["--ionice-class=idle", "--ionice-level=1"], ["--cpu-weight=0"], ["--io-weight=10001"],
+                     ["--cpu-quota=50"], ["--cpu-quota=0%"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(["--overlay"] + args)
+
+    def test_daemon_and_script(self):
+        args = ["--nice=5", "--ionice-class=best-effort", "--ionice-level=7",
+                "--cpu-weight=50", "--io-weight=20", "--cpu-quota=200%"]
+        with AddonHarness() as h:
+            addon = make_addon(["--overlay"] + args, "docker images\n")
+            self.assertIn('--nice=5 --ionice-class=best-effort --ionice-level=7 --cpu-weight=50 --io-weight=20 '
+                          '--cpu-quota="200%"', str(addon))
+            with self.assertLogs("anaconda", "INFO") as cm:
+                h.run(addon, plain_storage())
+            commands = h.commands()
+            self.assertTrue(commands[0].startswith("systemd-run --scope --quiet --unit=docker-anaconda-addon "
+                                                   "-p CPUWeight=50 -p IOWeight=20 -p CPUQuota=200% -- "
+                                                   "nice -n 5 ionice -c best-effort -n 7 docker daemon "))
+            self.assertTrue(commands[-2].startswith("renice -n 5 -p "))
+            self.assertTrue(commands[-1].startswith("ionice -c best-effort -n 7 -p "))
+            self.assertIn("fake docker images", h.read("/var/log/anaconda/docker-addon.log"))
+            sched = [m for m in cm.output if "scheduling" in m]
+            self.assertEqual(len(sched), 1)
+            self.assertIn("requested nice 5, ionice best-effort level 7, CPUWeight=50, IOWeight=20, CPUQuota=200%", sched[0])
+            self.assertIn("effective nice 5, ionice best-effort: prio 4", sched[0])
+
+    def test_traced_script(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--overlay", "--nice=3", "--trace-commands"], "docker images\n"), plain_storage())
+            self.assertTrue(h.commands()[-1].startswith("nice -n 3 /bin/bash "))
+            self.assertIn("fake docker images", h.read("/var/log/anaconda/docker-addon.log"))
+
+class SnapshotTestCase(unittest.TestCase):
+    def test_bad_options(self):
+        for args in [["--overlay2", "--snapshot-capture=/snaps", "--snapshot-restore=/snaps/s.tar.gz"],
+                     ["--vgname=docker", "--snapshot-capture=/snaps"], ["--btrfs", "--snapshot-restore=/s.tar.gz"],
+                     ["--overlay2", "--snapshot-restore=/s.tar.gz", "--pull=busybox"],
+                     ["--overlay2", "--snapshot-restore=/s.tar.gz", "--early-start"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+
+    def test_capture_and_restore(self):
+        with AddonHarness() as h:
+            os.makedirs(h.path("/var/lib/docker/overlay2/abc/diff"))
+            with open(h.path("/var/lib/docker/overlay2/abc/diff/motd"), "w") as fp:
+                fp.write("hello\n")
+            snaps = os.path.join(h.tmpdir, "snaps")
+            addon = make_addon(["--overlay2", '--snapshot-capture=%s' % snaps], "docker images\n")
+            self.assertIn('--snapshot-capture="%s"' % snaps, str(addon))
+            h.run(addon, plain_storage())
+            snapshot = os.path.join(snaps, next(f for f in os.listdir(snaps) if f.endswith(".tar.gz")))
+
+            with AddonHarness() as h2:
+                addon = make_addon(["--overlay2", "--snapshot-restore=%s" % snapshot, "--live-restore"], "docker images\n")
+                h2.run(addon, plain_storage())
+                self.assertEqual(h2.read("/var/lib/docker/overlay2/abc/diff/motd"), "hello\n")
+                # The daemon and commands are not run, the configs are still written
+                self.assertFalse(os.path.exists(h2.path("/var/log/anaconda/docker-daemon.log")))
+                self.assertFalse(os.path.exists(h2.path("/var/log/anaconda/docker-addon.log")))
+                self.assertEqual(h2.read("/etc/sysconfig/docker-storage-setup"), "STORAGE_DRIVER=overlay2\n")
+                self.assertEqual(json.loads(h2.read("/etc/docker/daemon.json")), {"live-restore": True})
+                with open(h2.path("/var/log/anaconda/docker-addon-timing.json")) as fp:
+                    timing = json.load(fp)
+                self.assertIn("snapshot_restore", timing["phases"])
+                self.assertGreater(timing["values"]["snapshot_restore_rate"], 0)
+
+    def test_corrupt(self):
+        with AddonHarness() as h:
+            os.makedirs(h.path("/var/lib/docker/overlay2/abc/diff"))
+            snaps = os.path.join(h.tmpdir, "snaps")
+            h.run(make_addon(["--overlay2", '--snapshot-capture=%s' % snaps]), plain_storage())
+            snapshot = os.path.join(snaps, next(f for f in os.listdir(snaps) if f.endswith(".tar.gz")))
+            with open(snapshot, "r+b") as fp:
+                fp.seek(-20, os.SEEK_END)
+                data = fp.read(8)
+                fp.seek(-20, os.SEEK_END)
+                fp.write(bytes(b ^ 0xff for b in data))
+
+            with AddonHarness() as h2:
+                with self.assertLogs("anaconda", "ERROR"):
+                    h2.run(make_addon(["--overlay2", "--snapshot-restore=%s" % snapshot], "docker images\n"),
+                           plain_storage())
+                # Nothing is left from the snapshot, the commands are run instead
+                self.assertEqual(os.listdir(h2.path("/var/lib/docker")), [])
+                self.assertIn("fake docker images", h2.read("/var/log/anaconda/docker-addon.log"))
+
+    def test_wrong_driver(self):
+        with AddonHarness() as h:
+            snapshot = os.path.join(h.tmpdir, "docker-overlay-%s.tar.gz" % ("0" * 64))
+            open(snapshot, "w").close()
+            with self.assertRaises(KickstartParseError):
+                h.run(make_addon(["--overlay2", "--snapshot-restore=%s" % snapshot]), plain_storage())
+            with self.assertRaises(KickstartParseError):
+                h.run(make_addon(["--overlay2", "--snapshot-restore=%s" % snapshot.replace("overlay", "overlay2")]),
+                      plain_storage())
+
+@contextmanager
+def small_probes():
+    saved = (probe.PROBE_SIZE, probe.PROBE_FILES)
+    probe.PROBE_SIZE = 1024**2
+    probe.PROBE_FILES = 16
+    try:
+        yield
+    finally:
+        (probe.PROBE_SIZE, probe.PROBE_FILES) = saved
+
+class AutoTestCase(unittest.TestCase):
+    def test_bad_options(self):
+        for args in [["--auto", "--overlay"], ["--auto", "--vgname=docker"], ["--overlay", "--auto-probe"],
+                     ["--auto", "--overlay2-size=10G"], ["--auto", "--fstype=bogus"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+
+    def select(self, args, storage):
+        addon = make_addon(args)
+        addon.setup(storage, make_ksdata(["docker", "podman"]), None, None)
+        return addon
+
+    def test_choice(self):
+        self.assertEqual(str(make_addon(["--auto", "--auto-probe"])).splitlines()[0],
+                         "%addon com_redhat_docker --auto --auto-probe")
+
+        addon = self.select(["--auto"], lvm_storage())
+        self.assertIsInstance(addon.storage, LVMStorage)
+        self.assertEqual(str(addon).splitlines()[:2],
+                         ["# com_redhat_docker --auto chose devicemapper",
+                          '%addon com_redhat_docker --vgname="docker" --fstype="xfs"'])
+        addon = self.select(["--auto", "--fstype=ext4"], lvm_storage())
+        self.assertEqual(str(addon).splitlines()[1], '%addon com_redhat_docker --vgname="docker" --fstype="ext4"')
+        self.assertEqual(str(make_addon(["--auto", "--fstype=ext4"])).splitlines()[0],
+                         '%addon com_redhat_docker --auto --fstype="ext4"')
+        self.assertIsInstance(self.select(["--auto"], btrfs_storage()).storage, BTRFSStorage)
+        self.assertIsInstance(self.select(["--auto"], plain_storage("ext4")).storage, Overlay2Storage)
+        # podman has no devicemapper
+        storage = Blivet(lvm_storage().devices + plain_storage().devices)
+        addon = self.select(["--auto", "--backend=podman"], storage)
+        self.assertIsInstance(addon.storage, Overlay2Storage)
+        self.assertEqual(addon.timer.values["auto_driver"], "overlay2")
+
+    def test_no_candidates(self):
+        with self.assertRaisesRegex(KickstartParseError, "found no storage"):
+            self.select(["--auto"], plain_storage("vfat"))
+        with AddonHarness():
+            self.assertIsInstance(self.select(["--auto"], plain_storage("xfs", exists=True)).storage, Overlay2Storage)
+            os.environ["FAKE_XFS_FTYPE"] = "0"
+            try:
+                with self.assertRaisesRegex(KickstartParseError, "found no storage"):
+                    self.select(["--auto"], plain_storage("xfs", exists=True))
+            finally:
+                del os.environ["FAKE_XFS_FTYPE"]
+
+    def test_probe(self):
+        with AddonHarness() as h, small_probes():
+            # New storage can't be probed
+            addon = self.select(["--auto", "--auto-probe"], lvm_storage())
+            self.assertIsInstance(addon.storage, LVMStorage)
+            self.assertEqual(h.commands(), [])
+
+            storage = Blivet(lvm_storage(exists=True).devices + plain_storage(exists=True).devices)
+            addon = self.select(["--auto", "--auto-probe"], storage)
+            rates = addon.timer.values
+            self.assertEqual(set(rates), {"auto_probe_devicemapper", "auto_probe_overlay2",
+                                          "auto_probe_overlay", "auto_driver"})
+            self.assertEqual(rates["auto_probe_overlay2"], rates["auto_probe_overlay"])
+            fastest = "devicemapper" if rates["auto_probe_devicemapper"] > rates["auto_probe_overlay2"] else "overlay2"
+            self.assertEqual(addon.storage.driver, fastest)
+            self.assertIn("(probed devicemapper ", str(addon).splitlines()[0])
+            self.assertEqual([c.split()[0] for c in h.commands()], ["lvcreate", "mkfs.xfs", "lvremove"])
+            self.assertEqual([m[0] for m in iutil.mounts], ["mount", "umount", "mount", "umount"])
+            self.assertEqual(iutil.mounts[2][1][:3], ["-t", "xfs", "/dev/sda1"])
+
+            # The pool is probed with the filesystem docker will put on it
+            self.select(["--auto", "--auto-probe", "--fstype=ext4"], storage)
+            self.assertEqual([c.split()[0] for c in h.commands()[3:]], ["lvcreate", "mkfs.ext4", "lvremove"])
+
+class PodmanTestCase(unittest.TestCase):
+    def test_bad_options(self):
+        for args in [["--backend=rkt"], ["--vgname=docker", "--backend=podman"],
+                     ["--overlay", "--backend=podman", "--early-start"],
+                     ["--overlay", "--backend=podman", "--reuse"],
+                     ["--overlay", "--backend=podman", "--compact=containers"],
+                     ["--overlay", "--backend=podman", "--live-restore"],
+                     ["--overlay", "--backend=podman", "--registry-mirror=http://mirror:5000"],
+                     ["--overlay", "--backend=podman", "--cpu-weight=50"],
+                     ["--overlay", "--backend=podman", "--", "-D"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+
+    def test_missing_package(self):
+        addon = make_addon(["--overlay", "--backend=podman"])
+        with self.assertRaisesRegex(KickstartParseError, "missing podman"):
+            addon.setup(plain_storage(), make_ksdata(), None, None)
+
+    def test_overlay2(self):
+        args = ["--overlay2", "--overlay2-size=10G", "--backend=podman", "--pull=a:1,b", "--nice=5"]
+        with AddonHarness() as h:
+            addon = make_addon(args, "podman images\n")
+            self.assertEqual(str(addon).splitlines()[0],
+                             '%addon com_redhat_docker --overlay2 --overlay2-size="10G" --backend=podman '
+                             '--pull="a:1" --pull="b" --nice=5')
+            h.run(addon, plain_storage("xfs", mountpoint="/var/lib/containers"), make_ksdata(["podman"]))
+
+            self.assertEqual(h.read("/etc/containers/storage.conf"),
+                             "# Written by the docker anaconda addon\n"
+                             "[storage]\n"
+                             'driver = "overlay"\n'
+                             'runroot = "/run/containers/storage"\n'
+                             'graphroot = "/var/lib/containers/storage"\n'
+                             "\n"
+                             "[storage.options.overlay]\n"
+                             'size = "10G"\n')
+            self.assertEqual(sorted(h.pulls()), ["a:1", "b"])
+
+        with AddonHarness() as h:
+            os.makedirs(h.path("/etc/containers"))
+            with open(h.path("/etc/containers/storage.conf"), "w") as fp:
+                fp.write('[storage]\ndriver = ""\n\n[storage.options.overlay]\nmountopt = "nodev"\n')
+            h.run(make_addon(args, "podman images\n"), plain_storage("xfs", mountpoint="/var/lib/containers"),
+                  make_ksdata(["podman"]))
+            self.assertEqual(h.read("/etc/containers/storage.conf"),
+                             "[storage]\n"
+                             'driver = "overlay"\n'
+                             'graphroot = "/var/lib/containers/storage"\n'
+                             "\n"
+                             "[storage.options.overlay]\n"
+                             'size = "10G"\n'
+                             'mountopt = "nodev"\n')
+            self.assertIn("nice -n 5 podman pull --quiet a:1", h.commands())
+            self.assertIn("fake podman images", h.read("/var/log/anaconda/docker-addon.log"))
+            self.assertEqual(iutil.mounts,
+                             [("mount", ["-o", "bind", h.path("/var/lib/containers"), "/var/lib/containers"]),
+                              ("mount", ["-o", "bind", h.path("/etc/containers"), "/etc/containers"]),
+                              ("umount", ["/etc/containers"]),
+                              ("umount", ["/var/lib/containers"])])
+            # No daemon and none of docker's configuration
+            self.assertEqual(h.requests(), [])
+            self.assertFalse(os.path.exists(h.path("/var/log/anaconda/docker-daemon.log")))
+            self.assertFalse(os.path.exists(h.path("/etc/sysconfig/docker-storage")))
+
+class LazyImportTestCase(unittest.TestCase):
+    def test_unused_addon(self):
+        tests = os.path.dirname(os.path.abspath(__file__))
+        script = ("import sys; sys.path[:0] = %r\n"
+                  "from com_redhat_docker.ks.docker import DockerData\n"
+                  "str(DockerData('com_redhat_docker'))\n"
+                  "print(' '.join(sorted(sys.modules)))" % [os.path.join(tests, "fakes"), os.path.dirname(tests)])
+        modules = subprocess.check_output([sys.executable, "-c", script], universal_newlines=True).split()
+        loaded = [m for m in modules if m.split(".")[0] in ("blivet", "tarfile", "http", "concurrent")
+                  or m.startswith(("pyanaconda.iutil", "pyanaconda.simpleconfig"))
+                  or m.startswith("com_redhat_docker.") and m not in ("com_redhat_docker.ks",
+                                                                       "com_redhat_docker.ks.docker",
+                                                                       "com_redhat_docker.i18n")]
+        self.assertEqual(loaded, [])
+
+class SetupTestCase(unittest.TestCase):
+    def test_missing_package(self):
+        addon = make_addon(["--overlay"])
+        with self.assertRaises(KickstartParseError):
+            addon.setup(plain_storage(), make_ksdata(packages=[]), None, None)
+
+    def test_lvm(self):
+        make_addon(["--vgname=docker"]).setup(lvm_storage(), make_ksdata(), None, None)
+
+    def test_lvm_missing_vg(self):
+        with self.assertRaises(KickstartParseError):
+            make_addon(["--vgname=other"]).setup(lvm_storage(), make_ksdata(), None, None)
+
+    def test_lvm_missing_pool(self):
+        with self.assertRaises(KickstartParseError):
+            make_addon(["--vgname=docker"]).setup(lvm_storage(pool=False), make_ksdata(), None, None)
+
+    def test_btrfs(self):
+        make_addon(["--btrfs"]).setup(btrfs_storage(), make_ksdata(), None, None)
+        make_addon(["--btrfs"]).setup(btrfs_storage("/var"), make_ksdata(), None, None)
+
+    def test_not_btrfs(self):
+        with self.assertRaises(KickstartParseError):
+            make_addon(["--btrfs"]).setup(plain_storage(), make_ksdata(), None, None)
+
+    def test_setup_timed(self):
+        addon = make_addon(["--overlay"])
+        addon.setup(plain_storage(), make_ksdata(), None, None)
+        self.assertIn("setup", addon.timer.phases)
+        self.assertIn("check_setup", addon.timer.phases)
+
+class ThinPoolTestCase(unittest.TestCase):
+    def test_options_need_vgname(self):
+        with self.assertRaises(KickstartParseError):
+            make_addon(["--overlay", "--create-pool"])
+
+    def test_options_need_create(self):
+        for arg in ["--pool-size=50", "--pool-chunk-size=512KiB", "--pool-metadata-size=1GiB"]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(["--vgname=docker", arg])
+
+    def test_bad_options(self):
+        for arg in ["--pool-size=0", "--pool-size=101", "--pool-chunk-size=100KiB",
+                    "--pool-chunk-size=2GiB", "--pool-metadata-size=1KiB",
+                    "--pool-metadata-size=lots", "--pool-autoextend-threshold=200"]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(["--vgname=docker", "--create-pool", arg])
+
+    def test_create(self):
+        storage = lvm_storage(pool=False)
+        addon = make_addon(["--vgname=docker", "--create-pool", "--pool-size=50",
+                            "--pool-chunk-size=1MiB", "--pool-metadata-size=1GiB"])
+        addon.setup(storage, make_ksdata(), None, None)
+
+        (action, pool) = storage.actions[0]
+        self.assertEqual(action, "create")
+        self.assertEqual(pool.name, "docker-docker-pool")
+        self.assertEqual(pool.seg_type, "thin-pool")
+        self.assertEqual(pool.size + pool.metadata_size, Size("50 GiB"))
+        self.assertEqual(pool.metadata_size, Size("1 GiB"))
+        self.assertEqual(pool.chunk_size, Size("1 MiB"))
+
+    def test_create_defaults(self):
+        storage = lvm_storage(pool=False)
+        make_addon(["--vgname=docker", "--create-pool"]).setup(storage, make_ksdata(), None, None)
+        pool = storage.actions[0][1]
+        self.assertEqual(pool.size + pool.metadata_size, Size("40 GiB"))
+        self.assertEqual(pool.chunk_size, Size("512 KiB"))
+        self.assertGreaterEqual(pool.metadata_size, Size("64 MiB"))
+
+    def test_resize(self):
+        storage = lvm_storage()
+        make_addon(["--vgname=docker", "--create-pool", "--pool-size=25"]).setup(storage, make_ksdata(), None, None)
+        self.assertEqual(storage.actions[0][0], "resize")
+        self.assertEqual(storage.actions[0][1].size, Size("25 GiB") - Size("8 MiB"))
+
+    def test_no_shrink(self):
+        storage = lvm_storage()
+        make_addon(["--vgname=docker", "--create-pool", "--pool-size=5"]).setup(storage, make_ksdata(), None, None)
+        self.assertEqual(storage.actions, [])
+
+    def test_existing_pool_kept(self):
+        storage = lvm_storage()
+        make_addon(["--vgname=docker", "--create-pool"]).setup(storage, make_ksdata(), None, None)
+        self.assertEqual(storage.actions, [])
+
+    def test_configs(self):
+        with AddonHarness() as h:
+            addon = make_addon(["--vgname=docker", "--create-pool", "--pool-autoextend-threshold=70"])
+            h.run(addon, lvm_storage(pool=False))
+            self.assertEqual(h.read("/etc/sysconfig/docker-storage-setup"),
+                             "VG=docker\nCHUNK_SIZE=512K\nAUTO_EXTEND_POOL=yes\n"
+                             "POOL_AUTOEXTEND_THRESHOLD=70\nPOOL_AUTOEXTEND_PERCENT=20\n")
+            self.assertIn("lvchange --zero n docker/docker-pool", h.commands())
+
+    def test_zero_untouched(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--vgname=docker"]), lvm_storage())
+            self.assertEqual([c for c in h.commands() if c.startswith("lvchange")], [])
+
+class DeviceMapperOptionsTestCase(unittest.TestCase):
+    ARGS = ["--vgname=docker", "--dm-deferred-removal", "--dm-deferred-deletion", "--dm-blkdiscard=false",
+            "--dm-basesize=20G", "--dm-mountopt=nodiscard", "--dm-min-free-space=10%"]
+    OPTS = ["dm.fs=xfs", "dm.thinpooldev=/dev/mapper/docker-docker--pool",
+            "dm.use_deferred_removal=true", "dm.use_deferred_deletion=true", "dm.blkdiscard=false",
+            "dm.basesize=20G", "dm.mountopt=nodiscard", "dm.min_free_space=10%"]
+
+    def test_bad_options(self):
+        for args in [["--overlay", "--dm-deferred-removal"],
+                     ["--vgname=docker", "--dm-deferred-deletion"],
+                     ["--vgname=docker", "--dm-basesize=big"],
+                     ["--vgname=docker", "--dm-mountopt=a b"],
+                     ["--vgname=docker", "--dm-min-free-space=10"],
+                     ["--vgname=docker", "--dm-min-free-space=100%"],
+                     ["--vgname=docker", "--dm-blkdiscard=maybe"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+
+    def test_storage_opts(self):
+        self.assertEqual(make_addon(self.ARGS).storage.storage_opts, self.OPTS)
+
+    def test_round_trip(self):
+        addon = make_addon(self.ARGS)
+        header = str(addon).splitlines()[0].split()[2:]
+        self.assertEqual(make_addon([a.replace('"', '') for a in header]).storage.storage_opts, self.OPTS)
+
+    def test_daemon_and_config_match(self):
+        with AddonHarness() as h:
+            h.run(make_addon(self.ARGS), lvm_storage())
+            expected = " ".join("--storage-opt %s" % o for o in self.OPTS)
+            self.assertIn(expected, h.read("/var/log/anaconda/docker-daemon.log"))
+            self.assertEqual(h.read("/etc/sysconfig/docker-storage"),
+                             'DOCKER_STORAGE_OPTIONS="--storage-driver devicemapper %s"\n' % expected)
+
+class Overlay2TestCase(unittest.TestCase):
+    def test_header(self):
+        self.assertIsInstance(make_addon(["--overlay2"]).storage, Overlay2Storage)
+        for args in [["--overlay", "--overlay2"], ["--overlay", "--overlay2-size=10G"],
+                     ["--overlay2", "--overlay2-size=lots"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+
+    def test_new_xfs(self):
+        storage = plain_storage("xfs")
+        make_addon(["--overlay2"]).setup(storage, make_ksdata(), None, None)
+        self.assertEqual(storage.mountpoints["/"].format.create_options, "-n ftype=1")
+
+    def test_existing_xfs(self):
+        with AddonHarness():
+            make_addon(["--overlay2"]).setup(plain_storage("xfs", exists=True), make_ksdata(), None, None)
+            os.environ["FAKE_XFS_FTYPE"] = "0"
+            try:
+                with self.assertRaises(KickstartParseError):
+                    make_addon(["--overlay2"]).setup(plain_storage("xfs", exists=True), make_ksdata(), None, None)
+            finally:
+                del os.environ["FAKE_XFS_FTYPE"]
+
+    def test_filesystems(self):
+        make_addon(["--overlay2"]).setup(plain_storage("ext4"), make_ksdata(), None, None)
+        for storage in [plain_storage("ext3"), btrfs_storage(), lvm_storage()]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(["--overlay2"]).setup(storage, make_ksdata(), None, None)
+
+    def test_size(self):
+        storage = plain_storage("xfs", mountpoint="/var/lib/docker")
+        make_addon(["--overlay2", "--overlay2-size=10G"]).setup(storage, make_ksdata(), None, None)
+        self.assertEqual(storage.mountpoints["/var/lib/docker"].format.options, "defaults,pquota")
+
+        for storage in [plain_storage("xfs"), plain_storage("ext4", mountpoint="/var/lib/docker")]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(["--overlay2", "--overlay2-size=10G"]).setup(storage, make_ksdata(), None, None)
+
+    def test_configs(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--overlay2", "--overlay2-size=10G"]),
+                  plain_storage("xfs", mountpoint="/var/lib/docker"))
+            self.assertEqual(h.read("/etc/sysconfig/docker-storage"),
+                             'DOCKER_STORAGE_OPTIONS="--storage-driver overlay2 --storage-opt overlay2.size=10G"\n')
+            self.assertEqual(h.read("/etc/sysconfig/docker-storage-setup"), "STORAGE_DRIVER=overlay2\n")
+            self.assertIn("--storage-driver overlay2 --storage-opt overlay2.size=10G",
+                          h.read("/var/log/anaconda/docker-daemon.log"))
+            self.assertNotIn("--selinux-enabled", h.read("/etc/sysconfig/docker"))
+
+class BTRFSTestCase(unittest.TestCase):
+    def test_bad_options(self):
+        for args in [["--overlay", "--btrfs-subvol"], ["--btrfs", "--btrfs-compress=zstd:20"],
+                     ["--btrfs", "--btrfs-compress=gzip"], ["--btrfs", "--btrfs-compress=lzo", "--btrfs-nodatacow"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+
+    def test_create_subvol(self):
+        storage = btrfs_storage("/")
+        make_addon(["--btrfs", "--btrfs-subvol", "--btrfs-compress=zstd:3", "--btrfs-noatime",
+                    "--btrfs-space-cache-v2"]).setup(storage, make_ksdata(), None, None)
+        (action, sub) = storage.actions[0]
+        self.assertEqual(action, "create")
+        self.assertIs(storage.mountpoints["/var/lib/docker"], sub)
+        self.assertEqual(sub.volume.name, "btrfs.10")
+        self.assertEqual(sub.format.options, "compress=zstd:3,noatime,space_cache=v2")
+        self.assertEqual(storage.mountpoints["/"].format.options, "defaults")
+
+    def test_existing_subvol(self):
+        storage = btrfs_storage()
+        storage.mountpoints["/var/lib/docker"].format.options = "compress=lzo,ssd"
+        make_addon(["--btrfs", "--btrfs-subvol", "--btrfs-compress=zlib:9"]).setup(storage, make_ksdata(), None, None)
+        self.assertEqual(storage.actions, [])
+        self.assertEqual(storage.mountpoints["/var/lib/docker"].format.options, "ssd,compress=zlib:9")
+
+    def test_volume(self):
+        storage = btrfs_storage("/var", subvol=False)
+        make_addon(["--btrfs", "--btrfs-noatime"]).setup(storage, make_ksdata(), None, None)
+        self.assertEqual(storage.mountpoints["/var"].format.options, "noatime")
+
+    def test_nodatacow(self):
+        storage = btrfs_storage("/", subvol=False)
+        addon = make_addon(["--btrfs", "--btrfs-subvol", "--btrfs-nodatacow"])
+        addon.setup(storage, make_ksdata(), None, None)
+        # nodatacow would turn off copy-on-write for / as well
+        for path in ["/", "/var/lib/docker"]:
+            self.assertNotIn("nodatacow", storage.mountpoints[path].format.options or "")
+        with AddonHarness() as h:
+            addon.storage.prepare(storage, make_ksdata(), None, None)
+            self.assertEqual(h.commands(), ["chattr +C %s" % h.path("/var/lib/docker")])
+
+    def test_round_trip(self):
+        args = ["--btrfs", "--btrfs-subvol", "--btrfs-compress=zstd:3", "--btrfs-noatime",
+                "--btrfs-space-cache-v2"]
+        self.assertEqual(str(make_addon(args)).splitlines()[0],
+                         "%%addon com_redhat_docker %s" % " ".join(args))
+
+class CapacityTestCase(unittest.TestCase):
+    def setup(self, args, storage):
+        make_addon(args).setup(storage, make_ksdata(), None, None)
+
+    def test_image_size_options(self):
+        for args in [["--overlay", "--image-size=busybox=5MiB"],
+                     ["--overlay", "--pull=busybox", "--image-size=busybox=lots"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+        addon = make_addon(["--overlay", "--pull=fedora:25", "--image-size=fedora:25=250MiB"])
+        self.assertEqual(addon.image_sizes, {"fedora:25": "250MiB"})
+        self.assertIn('--image-size="fedora:25=250MiB"', str(addon))
+
+    def test_pool(self):
+        self.setup(["--vgname=docker", "--pull=a,b", "--image-size=a=7GiB"], lvm_storage())
+        with self.assertRaises(KickstartParseError):
+            self.setup(["--vgname=docker", "--pull=a,b", "--image-size=a=7.5GiB"], lvm_storage())
+        with self.assertRaises(KickstartParseError):
+            self.setup(["--vgname=docker", "--dm-min-free-space=20%", "--pull=a", "--image-size=a=7GiB"],
+                       lvm_storage())
+
+    def test_created_pool(self):
+        # 40% of 100GiB
+        self.setup(["--vgname=docker", "--create-pool", "--pull=a", "--image-size=a=30GiB"],
+                   lvm_storage(pool=False))
+        with self.assertRaises(KickstartParseError):
+            self.setup(["--vgname=docker", "--create-pool", "--pull=a", "--image-size=a=40GiB"],
+                       lvm_storage(pool=False))
+
+    def test_btrfs(self):
+        self.setup(["--btrfs", "--pull=a", "--image-size=a=9GiB"], btrfs_storage())
+        with self.assertRaises(KickstartParseError):
+            self.setup(["--btrfs", "--pull=a", "--image-size=a=10GiB"], btrfs_storage())
+
+    def test_overlay(self):
+        self.setup(["--overlay", "--pull=a", "--image-size=a=18GiB"], plain_storage())
+        with self.assertRaises(KickstartParseError):
+            self.setup(["--overlay", "--pull=a", "--image-size=a=19GiB"], plain_storage())
+
+    def test_load_dir(self):
+        with AddonHarness() as h:
+            os.makedirs(h.path("/images"))
+            with open(h.path("/images/big.tar.xz"), "wb") as fp:
+                fp.truncate(8 * 1024**3)
+            with self.assertRaises(KickstartParseError):
+                self.setup(["--overlay", "--load-dir=%s" % h.path("/images")], plain_storage())
+
+@contextmanager
+def fast_early_poll():
+    saved = early.POLL_INTERVAL
+    early.POLL_INTERVAL = 0.02
+    try:
+        yield
+    finally:
+        early.POLL_INTERVAL = saved
+
+class ExecuteTestCase(unittest.TestCase):
+    def test_lvm(self):
+        with AddonHarness() as h:
+            addon = make_addon(["--vgname=docker", "--save-args", "--", "-D"], "docker images\n")
+            h.run(addon, lvm_storage())
+
+            self.assertEqual(h.read("/etc/sysconfig/docker-storage"),
+                             'DOCKER_STORAGE_OPTIONS="--storage-driver devicemapper '
+                             '--storage-opt dm.fs=xfs --storage-opt dm.thinpooldev=/dev/mapper/docker-docker--pool"\n')
+            self.assertEqual(h.read("/etc/sysconfig/docker-storage-setup"), "VG=docker\n")
+            self.assertIn("OPTIONS='--selinux-enabled --log-driver=journald -D'", h.read("/etc/sysconfig/docker"))
+
+            daemon_log = h.read("/var/log/anaconda/docker-daemon.log")
+            self.assertIn("fake docker daemon --selinux-enabled --storage-driver devicemapper", daemon_log)
+            # The daemon was stopped with SIGTERM, not killed
+            self.assertIn("fake docker daemon exiting", daemon_log)
+            self.assertIn("fake docker images", h.read("/var/log/anaconda/docker-addon.log"))
+
+    def test_script_status(self):
+        with AddonHarness() as h:
+            addon = make_addon(["--overlay"], "echo broken image\nexit 3\n")
+            with self.assertLogs("anaconda", "ERROR") as logs:
+                h.run(addon, plain_storage())
+            self.assertEqual(addon._script_status, 3)
+            self.assertTrue(any("broken image" in line for line in logs.output))
+
+    def test_overlay_options(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--overlay"]), plain_storage())
+            self.assertEqual(h.read("/etc/sysconfig/docker-storage"),
+                             'DOCKER_STORAGE_OPTIONS="--storage-driver overlay"\n')
+            self.assertEqual(h.read("/etc/sysconfig/docker-storage-setup"), "STORAGE_DRIVER=overlay\n")
+            self.assertNotIn("--selinux-enabled", h.read("/etc/sysconfig/docker"))
+
+    def test_mounts(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--btrfs"]), btrfs_storage())
+            self.assertEqual(iutil.mounts,
+                             [("mount", ["-o", "bind", h.path("/var/lib/docker"), "/var/lib/docker"]),
+                              ("mount", ["-o", "bind", h.path("/etc/docker"), "/etc/docker"]),
+                              ("umount", ["/etc/docker"]),
+                              ("umount", ["/var/lib/docker"])])
+
+    def test_pulls(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--overlay", "--pull=a:1,b,a:2"]), plain_storage())
+            self.assertEqual(sorted(h.pulls()), ["a:1", "a:2", "b:latest"])
+
+    def test_progress(self):
+        del progress.messages[:]
+        with AddonHarness() as h:
+            h.run(make_addon(["--overlay", "--pull=a:1,b,a:2"]), plain_storage())
+        self.assertEqual(progress.messages[0], "Starting the docker daemon")
+        self.assertRegex(progress.messages[-2],
+                         r"^Pulling docker images: 3 of 3 done, 0\.0 of 0\.0 MiB, [0-9.]+ MiB/s, 3 layers$")
+        self.assertEqual(progress.messages[-1], "Running the docker addon commands")
+
+    def test_metrics(self):
+        with self.assertRaises(KickstartParseError):
+            make_addon(["--overlay", "--metrics-file=docker.prom"])
+
+        with AddonHarness() as h:
+            h.run(make_addon(["--vgname=docker", "--pull=a:1,b"], "exit 3\n"), lvm_storage())
+            metrics = h.read("/var/log/anaconda/docker-addon.prom")
+            for line in ['docker_anaconda_addon_info{driver="devicemapper",backend="docker"} 1',
+                         'docker_anaconda_addon_images{source="pull"} 2',
+                         'docker_anaconda_addon_image_pulled_bytes{image="b"} 1024',
+                         "docker_anaconda_addon_thin_pool_data_usage_ratio 0.125",
+                         "docker_anaconda_addon_thin_pool_metadata_size_bytes 8388608",
+                         "docker_anaconda_addon_script_exit_status 3"]:
+                self.assertIn(line + "\n", metrics)
+            self.assertRegex(metrics, r'phase_duration_seconds\{phase="daemon_start"\} [0-9.e-]+\n')
+            self.assertRegex(metrics, r"daemon_startup_latency_seconds [0-9.e-]+\n")
+
+        with AddonHarness() as h:
+            addon = make_addon(["--overlay2", "--metrics-file=/var/lib/node_exporter/docker.prom"])
+            self.assertIn('--metrics-file="/var/lib/node_exporter/docker.prom"', str(addon))
+            h.run(addon, plain_storage())
+            metrics = h.read("/var/lib/node_exporter/docker.prom")
+            self.assertIn('driver="overlay2"', metrics)
+            self.assertIn("docker_anaconda_addon_script_exit_status 0\n", metrics)
+            self.assertNotIn("thin_pool", metrics)
+
+        with AddonHarness() as h:
+            h.run(make_addon(["--overlay2", "--trace-commands"], "exit 4\n"), plain_storage())
+            self.assertIn("docker_anaconda_addon_script_exit_status 4\n",
+                          h.read("/var/log/anaconda/docker-addon.prom"))
+
+    def test_timing(self):
+        with AddonHarness(startup=0.1) as h:
+            h.run(make_addon(["--overlay"]), plain_storage())
+            with open(h.path("/var/log/anaconda/docker-addon-timing.json")) as fp:
+                timing = json.load(fp)
+            for phase in ["setup", "check_setup", "mount", "daemon_start", "script",
+                          "daemon_stop", "umount", "close_logs", "write_configs", "options"]:
+                self.assertIn(phase, timing["phases"])
+            self.assertGreaterEqual(timing["values"]["daemon_startup_latency"], 0.1)
+
+    def test_log_options(self):
+        for args in [["--overlay", "--log-cap=10KiB"], ["--overlay", "--log-cap=lots"],
+                     ["--overlay", "--log-rotate=-1"]]:
+            with self.assertRaises(KickstartParseError):
+                make_addon(args)
+
+        with AddonHarness() as h:
+            addon = make_addon(["--overlay", "--log-cap=1MiB", "--log-rotate=0", "--log-compress"],
+                               "docker images\n")
+            self.assertIn('--log-cap="1MiB" --log-rotate=0 --log-compress', str(addon))
+            h.run(addon, plain_storage())
+            with gzip.open(h.path("/var/log/anaconda/docker-addon.log.gz"), "rt") as fp:
+                self.assertIn("fake docker images", fp.read())
+            with gzip.open(h.path("/var/log/anaconda/docker-daemon.log.gz"), "rt") as fp:
+                self.assertIn("fake docker daemon exiting", fp.read())
+            self.assertFalse(os.path.exists("/tmp/docker-addon.log"))
+
+    def test_early_start(self):
+        with AddonHarness() as h, fast_early_poll():
+            unmounted = os.path.join(h.tmpdir, "unmounted")
+            open(unmounted, "w").close()
+            addon = make_addon(["--overlay", "--early-start", "--pull=a,b"], "docker images\n")
+            self.assertIn("--early-start", str(addon))
+            ksdata = make_ksdata()
+            addon.setup(plain_storage(), ksdata, None, None)
+            time.sleep(0.2)
+            self.assertEqual(h.pulls(), [])
+
+            # The target is mounted while the payload is installed
+            os.unlink(unmounted)
+            deadline = time.monotonic() + 10
+            while len(h.pulls()) < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(sorted(h.pulls()), ["a:latest", "b:latest"])
+
+            addon.execute(plain_storage(), ksdata, None, None, None)
+            self.assertEqual(sorted(h.pulls()), ["a:latest", "b:latest"])
+            self.assertIn("fake docker images", h.read("/var/log/anaconda/docker-addon.log"))
+            self.assertIn("fake docker daemon exiting", h.read("/var/log/anaconda/docker-daemon.log"))
+            with open(h.path("/var/log/anaconda/docker-addon-timing.json")) as fp:
+                self.assertIn("early_start_lead", json.load(fp)["values"])
+
+    def test_early_start_daemon_fails(self):
+        with AddonHarness() as h, fast_early_poll():
+            # Only the early start finds this docker, it can't run
+            broken = os.path.join(h.tmpdir, "broken")
+            os.makedirs(broken)
+            with open(os.path.join(broken, "docker"), "w") as fp:
+                fp.write("#!/bin/sh\necho broken docker >&2\nexit 1\n")
+            os.chmod(os.path.join(broken, "docker"), 0o755)
+            path = os.environ["PATH"]
+            os.environ["PATH"] = broken + os.pathsep + path
+            try:
+                addon = make_addon(["--overlay", "--early-start", "--pull=a"], "docker images\n")
+                ksdata = make_ksdata()
+                addon.setup(plain_storage(), ksdata, None, None)
+                deadline = time.monotonic() + 10
+                while addon._early.started is None and time.monotonic() < deadline:
+                    time.sleep(0.05)
+            finally:
+                os.environ["PATH"] = path
+
+            addon.execute(plain_storage(), ksdata, None, None, None)
+            self.assertEqual(h.pulls(), ["a:latest"])
+            self.assertIn("fake docker images", h.read("/var/log/anaconda/docker-addon.log"))
+            self.assertIn("fake docker daemon exiting", h.read("/var/log/anaconda/docker-daemon.log"))
+            self.assertEqual(h.read("/var/log/anaconda/docker-daemon-early.log"), "broken docker\n")
+            self.assertEqual(iutil.mounts[-1], ("umount", ["/var/lib/docker"]))
+
+    def test_early_start_never_ready(self):
+        with AddonHarness() as h, fast_early_poll():
+            open(os.path.join(h.tmpdir, "unmounted"), "w").close()
+            h.run(make_addon(["--overlay", "--early-start", "--pull=a"]), plain_storage())
+            self.assertEqual(h.pulls(), ["a:latest"])
+
+    def test_trace_commands(self):
+        with AddonHarness() as h:
+            h.run(make_addon(["--overlay", "--trace-commands"], "docker images\ntrue\n"), plain_storage())
+            self.assertIn("fake docker images", h.read("/var/log/anaconda/docker-addon.log"))
+            report = h.read("/var/log/anaconda/docker-addon-commands.log")
+            self.assertIn("docker images", report)
+            self.assertTrue(os.path.exists(h.path("/var/log/anaconda/docker-addon-commands.log")))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import unittest
+
+from com_redhat_docker.images import repository, schedule_images, pull_images
+
+from fake_docker import FakeDockerServer
+from harness import AddonHarness
+
+class ImagesTestCase(unittest.TestCase):
+    def test_repository(self):
+        self.assertEqual(repository("busybox"), "busybox")
+        self.assertEqual(repository("fedora:25"), "fedora")
+        self.assertEqual(repository("registry:5000/fedora"), "registry:5000/fedora")
+        self.assertEqual(repository("registry:5000/fedora:25"), "registry:5000/fedora")
+        self.assertEqual(repository("busybox@sha256:abcd"), "busybox")
+
+    def test_schedule(self):
+        groups = schedule_images(["fedora:24", "busybox", "fedora:25", "fedora:24", "centos:7"])
+        self.assertEqual(groups, [["fedora:24", "fedora:25"], ["busybox"], ["centos:7"]])
+
+    def test_pull_results(self):
+        with AddonHarness() as h, FakeDockerServer(h.socket_path, state=h.tmpdir).start() as server:
+            results = pull_images(["b", "a:1", "missing", "a:2"], 3, server.socket_path)
+            self.assertEqual([r.image for r in results], ["b", "a:1", "missing", "a:2"])
+            self.assertEqual([r.error is None for r in results], [True, True, False, True])
+            self.assertIn("manifest for missing:latest not found", results[2].error)
+            self.assertEqual(results[0].size, 1024)
+            # Tags of a repository are pulled in order by the same worker
+            pulls = h.pulls()
+            self.assertLess(pulls.index("a:1"), pulls.index("a:2"))
+
+    def test_pulls_overlap(self):
+        with AddonHarness() as h, FakeDockerServer(h.socket_path, latency=0.3).start() as server:
+            results = pull_images(["a", "b", "c", "d"], 4, server.socket_path)
+            self.assertLess(max(r.elapsed for r in results), 1.0)
+
+if __name__ == "__main__":
+    unittest.main()
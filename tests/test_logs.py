@@ -0,0 +1,112 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import gzip
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from com_redhat_docker.logs import LogSink, LogPipe, LogFifo
+
+class LogSinkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+        self.path = os.path.join(self.tmpdir, "log", "docker-daemon.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_rotate(self):
+        sink = LogSink(self.path, cap=10, rotate=2, ring_size=8)
+        for i in range(4):
+            sink.write(b"%d" % i * 10)
+        sink.close()
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.path))),
+                         ["docker-daemon.log", "docker-daemon.log.1", "docker-daemon.log.2"])
+        with open(self.path, "rb") as fp:
+            self.assertEqual(fp.read(), b"3" * 10)
+        with open(self.path + ".2", "rb") as fp:
+            self.assertEqual(fp.read(), b"1" * 10)
+        self.assertEqual(sink.written, 40)
+        self.assertEqual(sink.rotations, 3)
+        self.assertEqual(sink.tail(), "33333333")
+
+    def test_no_rotate(self):
+        sink = LogSink(self.path, cap=4, rotate=0)
+        sink.write(b"abcdefghij")
+        sink.close()
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["docker-daemon.log"])
+        with open(self.path, "rb") as fp:
+            self.assertEqual(fp.read(), b"ij")
+
+    def test_compress(self):
+        sink = LogSink(self.path, cap=None, compress=True)
+        sink.write(b"hello\n" * 1000)
+        sink.close()
+        self.assertEqual(sink.path, self.path + ".gz")
+        with gzip.open(sink.path, "rb") as fp:
+            self.assertEqual(fp.read(), b"hello\n" * 1000)
+
+    def test_move(self):
+        sink = LogSink(self.path, cap=10, rotate=2, compress=True)
+        sink.write(b"a" * 15)
+        sink.close()
+        early = os.path.join(self.tmpdir, "log", "docker-daemon-early.log")
+        sink.move(early)
+        self.assertEqual(sink.path, early + ".gz")
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.path))),
+                         ["docker-daemon-early.log.1.gz", "docker-daemon-early.log.gz"])
+        with gzip.open(sink.path, "rb") as fp:
+            self.assertEqual(fp.read(), b"a" * 5)
+
+    def test_empty(self):
+        LogSink(self.path).close()
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+class LogPumpTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+        self.path = os.path.join(self.tmpdir, "docker-addon.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_pipe(self):
+        pipe = LogPipe(LogSink(self.path))
+        subprocess.check_call(["echo", "from the daemon"], stdout=pipe)
+        pipe.close()
+        with open(self.path) as fp:
+            self.assertEqual(fp.read(), "from the daemon\n")
+
+    def test_fifo(self):
+        fifo = LogFifo(LogSink(self.path), os.path.join(self.tmpdir, "fifo"))
+        with open(fifo.path, "w") as fp:
+            subprocess.check_call(["echo", "from the script"], stdout=fp)
+        fifo.close()
+        self.assertFalse(os.path.exists(fifo.path))
+        with open(self.path) as fp:
+            self.assertEqual(fp.read(), "from the script\n")
+
+    def test_fifo_unused(self):
+        fifo = LogFifo(LogSink(self.path), os.path.join(self.tmpdir, "fifo"))
+        fifo.close()
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import shutil
+import tempfile
+import unittest
+
+from com_redhat_docker.archives import LoadResult
+from com_redhat_docker.images import PullResult
+from com_redhat_docker.metrics import Metrics, install_metrics, thin_pool_usage
+from com_redhat_docker.timing import PhaseTimer
+
+from harness import AddonHarness
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_text(self):
+        metrics = Metrics("test_")
+        metrics.add("phase_seconds", "Phase time", 1.5, {"phase": "pull"})
+        metrics.add("images", "Images", 3)
+        metrics.add("phase_seconds", "Phase time", 0.25, {"phase": 'a "b"\\c\n'})
+        metrics.add("missing", "Not measured", None)
+        self.assertEqual(metrics.text(),
+                         "# HELP test_phase_seconds Phase time\n"
+                         "# TYPE test_phase_seconds gauge\n"
+                         'test_phase_seconds{phase="pull"} 1.5\n'
+                         'test_phase_seconds{phase="a \\"b\\"\\\\c\\n"} 0.25\n'
+                         "# HELP test_images Images\n"
+                         "# TYPE test_images gauge\n"
+                         "test_images 3\n")
+
+    def test_write(self):
+        path = os.path.join(self.tmpdir, "collector", "docker.prom")
+        metrics = Metrics()
+        metrics.add("images", "Images", 1)
+        metrics.write(path)
+        metrics.write(path)
+        self.assertEqual(os.listdir(os.path.dirname(path)), ["docker.prom"])
+        with open(path) as fp:
+            self.assertEqual(fp.read(), metrics.text())
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o644)
+
+    def test_thin_pool_usage(self):
+        with AddonHarness() as h:
+            usage = thin_pool_usage("docker")
+            self.assertEqual(h.commands(), ["lvs --noheadings --nosuffix --units b -o "
+                                            "data_percent,metadata_percent,lv_size,lv_metadata_size docker/docker-pool"])
+        self.assertEqual(list(usage.items()), [("data_ratio", 0.125), ("metadata_ratio", 0.04),
+                                               ("data_bytes", 8589934592), ("metadata_bytes", 8388608)])
+
+    def test_install_metrics(self):
+        timer = PhaseTimer()
+        timer.phases["pull"] = 2.0
+        timer.record("daemon_startup_latency", 0.5)
+        pulls = [PullResult("a:1", None, 1.0, 100), PullResult("b", "404 Not Found", 0.1, 0)]
+        loads = [LoadResult("/images/app.tar", True, 200, 1.0, ["app:1", "app:2"])]
+        text = install_metrics(timer, "overlay2", "docker", pulls, loads, None, 0).text()
+        for line in ['docker_anaconda_addon_info{driver="overlay2",backend="docker"} 1',
+                     'docker_anaconda_addon_phase_duration_seconds{phase="pull"} 2.0',
+                     "docker_anaconda_addon_daemon_startup_latency_seconds 0.5",
+                     'docker_anaconda_addon_images{source="pull"} 1',
+                     'docker_anaconda_addon_images{source="load"} 2',
+                     "docker_anaconda_addon_image_failures 1",
+                     'docker_anaconda_addon_image_pulled_bytes{image="a:1"} 100',
+                     "docker_anaconda_addon_script_exit_status 0"]:
+            self.assertIn(line + "\n", text)
+        self.assertNotIn('image="b"', text)
+        self.assertNotIn('source="reuse"', text)
+        self.assertNotIn("thin_pool", text)
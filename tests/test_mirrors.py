@@ -0,0 +1,103 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import threading
+import unittest
+
+from com_redhat_docker.images import PullResult
+from com_redhat_docker.mirrors import PullSource, split_reference, manifest_size, pull_sources, source_totals
+
+BUSYBOX = {"schemaVersion": 2,
+           "mediaType": "application/vnd.docker.distribution.manifest.v2+json",
+           "config": {"size": 1000, "digest": "sha256:c0"},
+           "layers": [{"size": 700000, "digest": "sha256:l0"}, {"size": 300, "digest": "sha256:l1"}]}
+FEDORA_LIST = {"schemaVersion": 2,
+               "mediaType": "application/vnd.docker.distribution.manifest.list.v2+json",
+               "manifests": [{"digest": "sha256:arm", "platform": {"architecture": "arm64", "os": "linux"}},
+                             {"digest": "sha256:amd", "platform": {"architecture": "amd64", "os": "linux"}}]}
+FEDORA = {"schemaVersion": 2, "config": {"size": 2000}, "layers": [{"size": 80000000}]}
+
+MANIFESTS = {"/v2/library/busybox/manifests/latest": BUSYBOX,
+             "/v2/library/fedora/manifests/25": FEDORA_LIST,
+             "/v2/library/fedora/manifests/sha256:amd": FEDORA,
+             # Valid JSON that isn't a manifest
+             "/v2/library/list/manifests/latest": ["sha256:l0"],
+             "/v2/library/text/manifests/latest": "manifest",
+             "/v2/library/entries/manifests/latest": {"manifests": ["sha256:amd"]},
+             "/v2/library/sizes/manifests/latest": {"config": {"size": "big"}}}
+
+class FakeRegistry(BaseHTTPRequestHandler):
+    """ A registry mirror serving the manifests in MANIFESTS """
+    def do_GET(self):
+        manifest = MANIFESTS.get(self.path)
+        if manifest is None:
+            self.send_error(404)
+            return
+        body = json.dumps(manifest).encode("utf-8")
+        self.send_response(200)
+        media_type = manifest.get("mediaType") if isinstance(manifest, dict) else None
+        self.send_header("Content-Type", media_type or "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class MirrorsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("localhost", 0), FakeRegistry)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.mirror = "http://localhost:%d" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_split_reference(self):
+        self.assertEqual(split_reference("busybox"), (None, "library/busybox", "latest"))
+        self.assertEqual(split_reference("fedora/httpd:2.4"), (None, "fedora/httpd", "2.4"))
+        self.assertEqual(split_reference("localhost:5000/app"), ("localhost:5000", "app", "latest"))
+        self.assertEqual(split_reference("quay.io/org/app@sha256:ab"), ("quay.io", "org/app", "sha256:ab"))
+
+    def test_manifest_size(self):
+        self.assertEqual(manifest_size(self.mirror, "busybox"), 701300)
+        self.assertEqual(manifest_size(self.mirror, "fedora:25"), 80002000)
+        self.assertIsNone(manifest_size(self.mirror, "centos"))
+        self.assertIsNone(manifest_size("http://localhost:1", "busybox", timeout=1))
+        for image in ["list", "text", "entries", "sizes"]:
+            self.assertIsNone(manifest_size(self.mirror, image))
+
+    def test_pull_sources(self):
+        sources = pull_sources(["busybox", "centos", "quay.io/org/app", "fedora:25"],
+                               ["http://localhost:1", self.mirror])
+        self.assertEqual([(s.image, s.mirror, s.size) for s in sources],
+                         [("busybox", self.mirror, 701300), ("centos", None, None),
+                          ("quay.io/org/app", None, None), ("fedora:25", self.mirror, 80002000)])
+
+    def test_source_totals(self):
+        sources = [PullSource("busybox", self.mirror, 701300), PullSource("fedora:25", self.mirror, 80002000),
+                   PullSource("centos", None, None), PullSource("quay.io/org/app", None, None)]
+        # fedora:25 shares its layers with an image that is already there
+        results = [PullResult("busybox", None, 1.0, 701300), PullResult("fedora:25", None, 1.0, 2000),
+                   PullResult("centos", None, 1.0, 5000), PullResult("quay.io/org/app", "not found", 0.1, 0)]
+        self.assertEqual(tuple(source_totals(sources, results)), (2, 703300, 1, 5000))
+
+if __name__ == "__main__":
+    unittest.main()
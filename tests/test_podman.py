@@ -0,0 +1,105 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import unittest
+
+from com_redhat_docker.podman import Podman, storage_conf, merge_storage_conf
+
+from harness import AddonHarness
+
+class StorageConfTestCase(unittest.TestCase):
+    def test_no_options(self):
+        self.assertEqual(storage_conf("btrfs", {}),
+                         "# Written by the docker anaconda addon\n"
+                         "[storage]\n"
+                         'driver = "btrfs"\n'
+                         'runroot = "/run/containers/storage"\n'
+                         'graphroot = "/var/lib/containers/storage"\n')
+
+    def test_merge(self):
+        # Trimmed from the containers-common storage.conf
+        existing = ('# This file is the configuration file for all tools\n'
+                    '[storage]\n'
+                    '# Default Storage Driver\n'
+                    'driver = ""\n'
+                    'runroot = "/run/containers/storage"\n'
+                    'graphroot = "/var/lib/containers/storage"\n'
+                    '\n'
+                    '[storage.options]\n'
+                    'additionalimagestores = [\n'
+                    '  "/usr/lib/containers/storage",\n'
+                    ']\n'
+                    '\n'
+                    '[storage.options.overlay]\n'
+                    'mountopt = "nodev,metacopy=on"\n'
+                    'size = "5G"\n'
+                    '\n'
+                    '[storage.options.thinpool]\n'
+                    '# size = ""\n')
+        self.assertEqual(merge_storage_conf(existing, "overlay", {"size": "10G"}),
+                         '# This file is the configuration file for all tools\n'
+                         '[storage]\n'
+                         'driver = "overlay"\n'
+                         'graphroot = "/var/lib/containers/storage"\n'
+                         '# Default Storage Driver\n'
+                         'runroot = "/run/containers/storage"\n'
+                         '\n'
+                         '[storage.options]\n'
+                         'additionalimagestores = [\n'
+                         '  "/usr/lib/containers/storage",\n'
+                         ']\n'
+                         '\n'
+                         '[storage.options.overlay]\n'
+                         'size = "10G"\n'
+                         'mountopt = "nodev,metacopy=on"\n'
+                         '\n'
+                         '[storage.options.thinpool]\n'
+                         '# size = ""\n')
+        self.assertEqual(merge_storage_conf("[storage.options]\nmountopt = \"nodev\"\n", "btrfs", {"size": "1G"}),
+                         '[storage.options]\n'
+                         'mountopt = "nodev"\n'
+                         '\n'
+                         '[storage]\n'
+                         'driver = "btrfs"\n'
+                         'graphroot = "/var/lib/containers/storage"\n'
+                         '\n'
+                         '[storage.options.btrfs]\n'
+                         'size = "1G"\n')
+
+class PodmanTestCase(unittest.TestCase):
+    def test_pull(self):
+        with AddonHarness() as h:
+            results = Podman().pull_images(["a:1", "missing", "a:2"], 4)
+            self.assertEqual([r.image for r in results], ["a:1", "missing", "a:2"])
+            self.assertEqual([r.error for r in results], [None, "podman pull exited with 125", None])
+            self.assertEqual(sorted(h.pulls()), ["a:1", "a:2", "missing"])
+
+    def test_load(self):
+        with AddonHarness() as h:
+            os.makedirs(os.path.join(h.tmpdir, "images", "layout"))
+            open(os.path.join(h.tmpdir, "images", "layout", "oci-layout"), "w").close()
+            with open(os.path.join(h.tmpdir, "images", "app.tar"), "w") as fp:
+                fp.write("1234")
+            results = Podman(["nice", "-n", "5"]).load_archives(os.path.join(h.tmpdir, "images"), 2)
+            self.assertTrue(all(r.ok for r in results))
+            self.assertEqual(results[0].size, 4)
+            self.assertEqual(results[0].images, ["localhost/app:latest", "localhost/app:1"])
+            self.assertEqual(results[1].images, ["oci:%s/images/layout" % h.tmpdir])
+            self.assertEqual(sorted(c for c in h.commands() if c.startswith("nice")),
+                             ["nice -n 5 podman load --quiet --input %s/images/app.tar" % h.tmpdir,
+                              "nice -n 5 podman pull --quiet oci:%s/images/layout" % h.tmpdir])
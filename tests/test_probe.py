@@ -0,0 +1,57 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyanaconda import iutil
+
+from com_redhat_docker.probe import probe, probe_pool
+
+from harness import AddonHarness
+
+class ProbeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_probe(self):
+        result = probe(self.tmpdir, size=1024**2 + 10, files=8)
+        self.assertEqual(result.written, 1024**2 + 10 + 8 * 16 * 1024)
+        self.assertGreater(result.rate, 0)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_timeout(self):
+        result = probe(self.tmpdir, size=1024**4, files=8, timeout=0.2)
+        self.assertLess(result.written, 1024**4)
+        self.assertLess(result.elapsed, 5)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_pool(self):
+        with AddonHarness() as h:
+            result = probe_pool("docker", "xfs", size=1024**2, files=8)
+            self.assertEqual(result.written, 1024**2 + 8 * 16 * 1024)
+            self.assertEqual(h.commands(),
+                             ["lvcreate -y -q -T docker/docker-pool -V 1G -n docker-addon-probe",
+                              "mkfs.xfs -q /dev/docker/docker-addon-probe",
+                              "lvremove -y -q docker/docker-addon-probe"])
+            self.assertEqual(iutil.mounts[0][1][:3], ["-t", "xfs", "/dev/docker/docker-addon-probe"])
+            self.assertEqual(iutil.mounts[1][0], "umount")
@@ -0,0 +1,61 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import unittest
+
+from pyanaconda import progress
+
+from com_redhat_docker.api import PullProgress
+from com_redhat_docker.progress import ProgressReporter
+
+def pull_progress(image, current, total):
+    state = PullProgress(image)
+    state.update({"status": "Downloading", "id": "layer", "progressDetail": {"current": current, "total": total}})
+    return state
+
+class ProgressReporterTestCase(unittest.TestCase):
+    def setUp(self):
+        del progress.messages[:]
+
+    def test_throttled(self):
+        reporter = ProgressReporter("Pulling docker images", 2, interval=3600)
+        for n in range(1, 101):
+            reporter.pull(pull_progress("a", n * 1024**2, 100 * 1024**2))
+            reporter.pull(pull_progress("b", 0, 50 * 1024**2))
+        reporter.done("a")
+        self.assertEqual(progress.messages, [])
+        reporter.finish()
+        self.assertEqual(len(progress.messages), 1)
+        self.assertRegex(progress.messages[0],
+                         r"^Pulling docker images: 1 of 2 done, 100\.0 of 150\.0 MiB, [0-9.]+ MiB/s, 2 layers$")
+
+    def test_every_update(self):
+        reporter = ProgressReporter("Loading docker images", 0, interval=1e-9, ui=False)
+        reporter.count = 1
+        with self.assertLogs("anaconda", "INFO") as cm:
+            reporter.read("app.tar", 1024**2, 2 * 1024**2)
+            reporter.read("app.tar", 2 * 1024**2, 2 * 1024**2)
+            reporter.done("app.tar")
+        self.assertEqual(reporter.messages, 3)
+        self.assertIn("Loading docker images: 1 of 1 done, 2.0 of 2.0 MiB", cm.output[-1])
+        self.assertEqual(progress.messages, [])
+
+    def test_counts_only(self):
+        reporter = ProgressReporter("Pulling container images", 1)
+        reporter.done("a")
+        reporter.finish()
+        self.assertEqual(progress.messages, ["Pulling container images: 1 of 1 done"])
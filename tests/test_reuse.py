@@ -0,0 +1,63 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import shutil
+import tempfile
+import unittest
+
+from com_redhat_docker.reuse import stored_drivers, normalize_reference, inventory, split_present
+
+from fake_docker import FakeDockerServer
+
+DIGEST = "sha256:" + "ab" * 32
+
+class ReuseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_normalize(self):
+        for image in ["fedora", "fedora:latest", "library/fedora", "docker.io/fedora:latest",
+                      "index.docker.io/library/fedora"]:
+            self.assertEqual(normalize_reference(image), "docker.io/library/fedora:latest")
+        self.assertEqual(normalize_reference("user/app:1"), "docker.io/user/app:1")
+        self.assertEqual(normalize_reference("fedora@" + DIGEST), "docker.io/library/fedora@" + DIGEST)
+        self.assertEqual(normalize_reference("registry:5000/app"), "registry:5000/app:latest")
+
+    def test_inventory(self):
+        server = FakeDockerServer(os.path.join(self.tmpdir, "docker.sock"),
+                                  images=["fedora:25", "busybox@" + DIGEST, "<none>:<none>"]).start()
+        try:
+            present = inventory(server.socket_path)
+        finally:
+            server.stop()
+        self.assertEqual(present, {"docker.io/library/fedora:25", "docker.io/library/busybox@" + DIGEST})
+        self.assertEqual(split_present(["docker.io/fedora:25", "fedora:26", "busybox@" + DIGEST, "busybox"], present),
+                         (["docker.io/fedora:25", "busybox@" + DIGEST], ["fedora:26", "busybox"]))
+
+    def test_stored_drivers(self):
+        self.assertEqual(stored_drivers(self.tmpdir), [])
+        for driver in ["overlay2", "devicemapper"]:
+            os.makedirs(os.path.join(self.tmpdir, "image", driver))
+            open(os.path.join(self.tmpdir, "image", driver, "repositories.json"), "w").close()
+        self.assertEqual(stored_drivers(self.tmpdir), ["devicemapper", "overlay2"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import unittest
+
+from com_redhat_docker.sched import Scheduling, effective
+
+class SchedulingTestCase(unittest.TestCase):
+    def test_prefix(self):
+        self.assertEqual(Scheduling().prefix(), [])
+        self.assertEqual(Scheduling(ionice_level=2).priority_prefix(), ["ionice", "-c", "best-effort", "-n", "2"])
+        self.assertEqual(Scheduling(ionice_class="idle").script_prelude(), "ionice -c idle -p $$\n")
+        self.assertEqual(str(Scheduling()), "defaults")
+
+    def test_no_systemd_run(self):
+        saved = os.environ["PATH"]
+        os.environ["PATH"] = "/nonexistent"
+        try:
+            with self.assertLogs("anaconda", "WARNING"):
+                self.assertEqual(Scheduling(nice=10, cpu_weight=10).prefix(), ["nice", "-n", "10"])
+        finally:
+            os.environ["PATH"] = saved
+
+    def test_effective(self):
+        self.assertTrue(effective(os.getpid()).startswith("nice %d, " % os.getpriority(os.PRIO_PROCESS, 0)))
+
+if __name__ == "__main__":
+    unittest.main()
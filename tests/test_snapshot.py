@@ -0,0 +1,100 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from com_redhat_docker.snapshot import SnapshotError, snapshot_name, read_manifest, capture, restore
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+        self.root = os.path.join(self.tmpdir, "docker")
+        os.makedirs(os.path.join(self.root, "overlay2", "abc", "diff", "etc"))
+        with open(os.path.join(self.root, "overlay2", "abc", "diff", "etc", "motd"), "w") as fp:
+            fp.write("hello\n" * 1000)
+        os.symlink("../abc/diff", os.path.join(self.root, "overlay2", "l"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+        manifest = capture(self.root, os.path.join(self.tmpdir, "snaps"), "overlay2")
+        self.assertEqual(os.path.basename(manifest["path"]), snapshot_name("overlay2", manifest["sha256"]))
+        self.assertGreater(manifest["unpacked_bytes"], manifest["compressed_bytes"])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmpdir, "snaps"))),
+                         [os.path.basename(manifest["path"])[:-len(".tar.gz")] + ".json",
+                          os.path.basename(manifest["path"])])
+        self.assertEqual(read_manifest(manifest["path"])["unpacked_bytes"], manifest["unpacked_bytes"])
+
+        target = os.path.join(self.tmpdir, "target")
+        stats = restore(manifest["path"], target)
+        self.assertEqual(stats["compressed_bytes"], manifest["compressed_bytes"])
+        with open(os.path.join(target, "overlay2", "abc", "diff", "etc", "motd")) as fp:
+            self.assertEqual(fp.read(), "hello\n" * 1000)
+        self.assertEqual(os.readlink(os.path.join(target, "overlay2", "l")), "../abc/diff")
+
+    def test_corrupt(self):
+        manifest = capture(self.root, self.tmpdir, "overlay")
+        with open(manifest["path"], "r+b") as fp:
+            fp.seek(-20, os.SEEK_END)
+            data = fp.read(8)
+            fp.seek(-20, os.SEEK_END)
+            fp.write(bytes(b ^ 0xff for b in data))
+        target = os.path.join(self.tmpdir, "target")
+        os.makedirs(target)
+        open(os.path.join(target, "kept"), "w").close()
+        with self.assertRaises(SnapshotError):
+            restore(manifest["path"], target)
+        # Nothing from the corrupt snapshot is left behind
+        self.assertEqual(os.listdir(target), ["kept"])
+
+    def test_truncated(self):
+        manifest = capture(self.root, self.tmpdir, "overlay")
+        with open(manifest["path"], "r+b") as fp:
+            fp.truncate(manifest["compressed_bytes"] // 2)
+        target = os.path.join(self.tmpdir, "target")
+        with self.assertRaisesRegex(SnapshotError, "its manifest says"):
+            restore(manifest["path"], target)
+        self.assertEqual(os.listdir(target), [])
+
+    def test_trailing_data(self):
+        # tar stops reading at the end of the archive, the rest still counts
+        manifest = capture(self.root, self.tmpdir, "overlay")
+        os.unlink(manifest["path"][:-len(".tar.gz")] + ".json")
+        with open(manifest["path"], "ab") as fp:
+            fp.write(b"\0" * 4 * 1024 * 1024)
+        target = os.path.join(self.tmpdir, "target")
+        with self.assertRaisesRegex(SnapshotError, "is corrupt"):
+            restore(manifest["path"], target)
+        self.assertEqual(os.listdir(target), [])
+
+    def test_manifest(self):
+        with self.assertRaises(SnapshotError):
+            read_manifest(os.path.join(self.tmpdir, "docker.tar.gz"))
+        path = os.path.join(self.tmpdir, snapshot_name("overlay2", "0" * 64))
+        self.assertEqual(read_manifest(path), {"driver": "overlay2", "sha256": "0" * 64})
+        with open(path[:-len(".tar.gz")] + ".json", "w") as fp:
+            json.dump({"driver": "overlay", "sha256": "0" * 64}, fp)
+        with self.assertRaises(SnapshotError):
+            read_manifest(path)
+
+if __name__ == "__main__":
+    unittest.main()
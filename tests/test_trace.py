@@ -0,0 +1,72 @@
+#
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+import os
+import tempfile
+import shutil
+import unittest
+
+from com_redhat_docker.trace import TracedScript
+
+SCRIPT = """echo hello
+sleep 0.2
+for i in 1 2; do
+  echo loop $i
+done
+false
+if true; then
+  echo err >&2
+fi
+"""
+
+class TraceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="docker-addon-test-")
+        self.logfile = os.path.join(self.tmpdir, "docker-addon.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_trace(self):
+        script = TracedScript(SCRIPT, self.logfile)
+        self.assertEqual(script.run(), 0)
+        with open(self.logfile) as fp:
+            self.assertEqual(fp.read(), "hello\nloop 1\nloop 2\nerr\n")
+
+        commands = {(c.lineno, c.command): c for c in script.commands}
+        self.assertEqual(commands[(1, "echo hello")].output, 6)
+        self.assertGreaterEqual(commands[(2, "sleep 0.2")].elapsed, 0.2)
+        self.assertEqual(commands[(6, "false")].status, 1)
+        self.assertEqual(commands[(8, "echo err 1>&2")].output, 4)
+        self.assertEqual(sum(1 for c in script.commands if c.lineno == 4), 2)
+
+    def test_exit_status(self):
+        script = TracedScript("true\nexit 3\n", self.logfile)
+        self.assertEqual(script.run(), 3)
+
+    def test_report(self):
+        script = TracedScript(SCRIPT, self.logfile)
+        script.run()
+        report = os.path.join(self.tmpdir, "report")
+        script.write_report(report)
+        with open(report) as fp:
+            lines = [l for l in fp if not l.startswith("#")]
+        self.assertTrue(lines[0].rstrip().endswith("sleep 0.2"))
+        self.assertEqual(len(lines), len(script.commands))
+
+if __name__ == "__main__":
+    unittest.main()